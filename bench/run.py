@@ -0,0 +1,298 @@
+"""Offline benchmark: boots main:app on a throwaway SQLite database against tools.fake_openai,
+drives a request mix and compares the results with a stored baseline.
+
+    python -m bench.run                                # default mix, 30 s
+    python -m bench.run --duration 60 --concurrency 16 --chat-sessions 50
+    python -m bench.run --save-baseline                # record bench/baseline.json
+    python -m bench.run --only generate,save --ttft 0.5
+
+Exit status is 1 when any op regresses past --tolerance (p95 latency up or throughput down).
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+from bench.workloads import HTTP_WORKLOADS, Recorder, chat_session, closed_loop, summarise, dumps
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "bench", "baseline.json")
+
+
+# ----------------------------
+# Processes
+# ----------------------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_process(args: list, env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen([sys.executable, *args], cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(client, url: str, proc: subprocess.Popen, timeout: float = 60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"process exited early with {proc.returncode} while waiting for {url}")
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def stop_process(proc: subprocess.Popen):
+    if proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+# ----------------------------
+# Peak RSS of the app and its worker processes (Linux /proc)
+# ----------------------------
+def process_tree(pid: int) -> list:
+    children: dict = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        p = stack.pop()
+        tree.append(p)
+        stack.extend(children.get(p, []))
+    return tree
+
+
+def rss_bytes(pid: int) -> int:
+    total = 0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+async def sample_rss(pid: int, peak: dict, interval: float = 0.25):
+    if not os.path.isdir("/proc"):
+        return
+    while True:
+        peak["bytes"] = max(peak["bytes"], rss_bytes(pid))
+        await asyncio.sleep(interval)
+
+
+# ----------------------------
+# Baseline comparison
+# ----------------------------
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for op, now in result["ops"].items():
+        before = baseline.get("ops", {}).get(op)
+        if not before or not now["count"]:
+            continue
+        if before.get("p95_ms") and now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{op}: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+        if before.get("throughput_rps") and now["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{op}: throughput {before['throughput_rps']} -> {now['throughput_rps']} rps")
+    before_rss, now_rss = baseline.get("peak_rss_mb"), result.get("peak_rss_mb")
+    if before_rss and now_rss and now_rss > before_rss * (1 + tolerance):
+        regressions.append(f"peak RSS {before_rss} -> {now_rss} MB")
+    return regressions
+
+
+def print_report(result: dict, baseline: dict | None):
+    print(f"\n📊 {result['duration_s']} s, concurrency {result['config']['concurrency']}, "
+          f"{result['config']['chat_sessions']} chat sessions, peak RSS {result['peak_rss_mb']} MB")
+    print(f"{'op':<22}{'count':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}   vs baseline p95")
+    for op, s in result["ops"].items():
+        before = (baseline or {}).get("ops", {}).get(op, {})
+        delta = ""
+        if before.get("p95_ms") and s["p95_ms"]:
+            delta = f"{(s['p95_ms'] / before['p95_ms'] - 1) * 100:+.1f}%"
+        print(f"{op:<22}{s['count']:>8}{s['errors']:>6}{s['throughput_rps']:>9}"
+              f"{s['p50_ms'] or '-':>9}{s['p95_ms'] or '-':>9}{s['p99_ms'] or '-':>9}   {delta}")
+
+
+# ----------------------------
+# Run
+# ----------------------------
+async def run(args) -> dict:
+    import httpx
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    llm_port, app_port = free_port(), free_port()
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("HTTP_PROXY", "HTTPS_PROXY"))}
+    env.update({
+        # Empty rather than unset, so a local .env cannot point the run at a real database or bucket
+        "SUPABASE_DB_URL": "",
+        "SUPABASE_URL": "",
+        "SUPABASE_KEY": "",
+        "PYTHONUNBUFFERED": "1",
+        "FAKE_OPENAI_TTFT": str(args.ttft),
+        "FAKE_OPENAI_TOKEN_DELAY": str(args.token_delay),
+        "FAKE_OPENAI_JITTER": str(args.jitter),
+        "FAKE_OPENAI_TOKENS": str(args.tokens),
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "OPENAI_API_KEY": "fake",
+        "SQLITE_DB_URL": f"sqlite+aiosqlite:///{workdir}/bench.db",
+        "ARTIFACT_DIR": os.path.join(workdir, "pdfs"),
+        "STORAGE_BACKEND": "local",
+        "STORAGE_DIR": os.path.join(workdir, "signed"),
+        "UPLOAD_JOB_DB": os.path.join(workdir, "jobs.db"),
+        "UPLOAD_JOB_SPOOL_DIR": os.path.join(workdir, "spool"),
+        "SETTINGS_INVALIDATION": "",
+        "CHAT_ANSWER_CACHE": "0",
+    })
+
+    llm = start_process(["-m", "tools.fake_openai", "--port", str(llm_port)], env, os.path.join(workdir, "fake_openai.log"))
+    app = start_process(
+        ["-m", "uvicorn", "main:app", "--port", str(app_port), "--log-level", "warning"],
+        env,
+        os.path.join(workdir, "app.log"),
+    )
+    base_url = f"http://127.0.0.1:{app_port}"
+    limits = httpx.Limits(max_connections=args.concurrency * 4, max_keepalive_connections=args.concurrency * 4)
+    opts = {
+        "repeat_ratio": args.repeat_ratio,
+        "upload_paragraphs": args.upload_paragraphs,
+        "save_paragraphs": args.save_paragraphs,
+        "users": 20,
+        "chat_turns": args.chat_turns,
+        "think_time": args.think_time,
+    }
+
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+            await wait_ready(client, f"http://127.0.0.1:{llm_port}/v1/models", llm)
+            await wait_ready(client, "/ready", app)
+
+            peak = {"bytes": 0}
+            sampler = asyncio.create_task(sample_rss(app.pid, peak))
+            rec = Recorder()
+            names = [n for n in args.only.split(",") if n] if args.only else list(HTTP_WORKLOADS)
+
+            started = time.perf_counter()
+            stop_at = started + args.duration
+            users = [
+                closed_loop(HTTP_WORKLOADS[name], client, rec, opts, stop_at)
+                for name in names if name in HTTP_WORKLOADS
+                for _ in range(args.concurrency)
+            ]
+            if not args.only or "chat" in names:
+                ws_url = f"ws://127.0.0.1:{app_port}/api/chat"
+                users += [chat_session(ws_url, rec, opts, stop_at) for _ in range(args.chat_sessions)]
+            await asyncio.gather(*users)
+            elapsed = time.perf_counter() - started
+
+            sampler.cancel()
+            peak["bytes"] = max(peak["bytes"], rss_bytes(app.pid) if os.path.isdir("/proc") else 0)
+            server_metrics = {}
+            for path in ("/api/llm/stats", "/api/db/stats", "/api/save/render/stats"):
+                try:
+                    server_metrics[path] = (await client.get(path)).json()
+                except Exception:
+                    pass
+    finally:
+        stop_process(app)
+        stop_process(llm)
+        if args.keep:
+            print(f"🗂️ Logs and data kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "duration_s": round(elapsed, 1),
+        "peak_rss_mb": round(peak["bytes"] / 1024 / 1024, 1) if peak["bytes"] else None,
+        "config": {
+            "concurrency": args.concurrency,
+            "chat_sessions": args.chat_sessions,
+            "ttft": args.ttft,
+            "token_delay": args.token_delay,
+            "tokens": args.tokens,
+            "repeat_ratio": args.repeat_ratio,
+            "only": args.only,
+        },
+        "ops": summarise(rec, elapsed),
+        "server": server_metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the LawHelpZone backend")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=4, help="virtual users per HTTP workload")
+    parser.add_argument("--chat-sessions", type=int, default=10)
+    parser.add_argument("--chat-turns", type=int, default=3)
+    parser.add_argument("--think-time", type=float, default=0.5)
+    parser.add_argument("--only", default="", help="comma list of: " + ", ".join([*HTTP_WORKLOADS, "chat"]))
+    parser.add_argument("--ttft", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--tokens", type=int, default=120)
+    parser.add_argument("--repeat-ratio", type=float, default=0.2)
+    parser.add_argument("--upload-paragraphs", type=int, default=40)
+    parser.add_argument("--save-paragraphs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--output", help="also write the result JSON here")
+    parser.add_argument("--keep", action="store_true", help="keep the temp dir with logs and data")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(dumps(result))
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(dumps(result))
+        print(f"💾 Baseline saved to {args.baseline}")
+        return
+
+    if baseline is not None:
+        if baseline.get("config") != result["config"]:
+            print("⚠️ Baseline was recorded with a different config; comparison is indicative only")
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("❌ Regressions beyond tolerance:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("✅ No regressions beyond tolerance")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Request mixes driven against a running app. Each workload is a coroutine factory that
+performs one logical operation and records its latency under one or more op names."""
+import asyncio
+import json
+import random
+import time
+import uuid
+
+COUNTRIES = ["United Kingdom", "Pakistan", "Australia"]
+AGREEMENT_TYPES = ["employment", "non-disclosure", "lease", "service", "consulting"]
+PARAGRAPH = (
+    "The Contractor shall deliver the services described in Schedule A with due skill and care. "
+    "Payment is due within thirty days of a valid invoice. Either party may terminate this agreement "
+    "on thirty days written notice. Confidential information shall not be disclosed to third parties. "
+)
+QUESTIONS = [
+    "How do I terminate a residential lease in the UK?",
+    "What notice period applies to employees in Pakistan?",
+    "Is a verbal contract enforceable in Australia?",
+    "What should a non-disclosure agreement include?",
+    "Can my landlord keep my deposit for normal wear and tear?",
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: dict = {}
+        self.errors: dict = {}
+
+    def add(self, op: str, seconds: float):
+        self.samples.setdefault(op, []).append(seconds * 1000)
+
+    def fail(self, op: str, reason: str):
+        self.errors.setdefault(op, {}).setdefault(reason, 0)
+        self.errors[op][reason] += 1
+
+    async def timed(self, op: str, coro):
+        start = time.perf_counter()
+        try:
+            result = await coro
+        except Exception as e:
+            self.fail(op, type(e).__name__)
+            return None
+        self.add(op, time.perf_counter() - start)
+        return result
+
+
+def unique(repeat_ratio: float, pool: int = 20) -> str:
+    """Mostly fresh inputs, with `repeat_ratio` drawn from a small pool so caches see realistic reuse."""
+    if random.random() < repeat_ratio:
+        return f"repeat-{random.randrange(pool)}"
+    return uuid.uuid4().hex[:12]
+
+
+def generate_payload(repeat_ratio: float) -> dict:
+    tag = unique(repeat_ratio)
+    return {
+        "type": random.choice(AGREEMENT_TYPES),
+        "partyA": f"Acme {tag}",
+        "partyB": "Globex Ltd",
+        "effectiveDate": "2025-01-01",
+        "country": random.choice(COUNTRIES),
+        "clauses": "confidentiality, termination",
+    }
+
+
+def check(response, op: str):
+    if response.status_code >= 400:
+        raise RuntimeError(f"{op} HTTP {response.status_code}")
+    return response
+
+
+# ----------------------------
+# HTTP workloads
+# ----------------------------
+async def generate(client, rec: Recorder, opts: dict):
+    await rec.timed("generate", _generate(client, opts))
+
+
+async def _generate(client, opts):
+    check(await client.post("/api/generate", json=generate_payload(opts["repeat_ratio"])), "generate")
+
+
+async def generate_stream(client, rec: Recorder, opts: dict):
+    start = time.perf_counter()
+    try:
+        async with client.stream(
+            "POST", "/api/generate", params={"stream": "true"}, json=generate_payload(opts["repeat_ratio"])
+        ) as response:
+            check(response, "generate_stream")
+            first = None
+            async for chunk in response.aiter_bytes():
+                if first is None and chunk:
+                    first = time.perf_counter()
+                    rec.add("generate_stream_ttfb", first - start)
+    except Exception as e:
+        rec.fail("generate_stream", type(e).__name__)
+        return
+    rec.add("generate_stream", time.perf_counter() - start)
+
+
+async def upload(client, rec: Recorder, opts: dict):
+    tag = unique(opts["repeat_ratio"])
+    body = (f"Agreement reference {tag}.\n\n" + PARAGRAPH * opts["upload_paragraphs"]).encode()
+    files = {"file": (f"contract-{tag}.txt", body, "text/plain")}
+    await rec.timed("upload", _check_post(client, "/api/upload/", "upload", files=files))
+
+
+async def _check_post(client, url, op, **kwargs):
+    return check(await client.post(url, **kwargs), op)
+
+
+async def save_list_pdf(client, rec: Recorder, opts: dict):
+    user = f"bench-user-{random.randrange(opts['users'])}"
+    payload = {"title": f"Agreement {uuid.uuid4().hex[:8]}", "content": PARAGRAPH * opts["save_paragraphs"], "user_id": user}
+    saved = await rec.timed("save", _check_post(client, "/api/save/", "save", json=payload))
+    if saved is None:
+        return
+    doc_id = saved.json()["id"]
+    await rec.timed("list", _check_get(client, "/api/save/list", "list", params={"user_id": user}))
+    await rec.timed("pdf", _check_get(client, f"/api/save/pdf/{doc_id}", "pdf"))
+
+
+async def _check_get(client, url, op, **kwargs):
+    return check(await client.get(url, **kwargs), op)
+
+
+# ----------------------------
+# Chat over WebSocket
+# ----------------------------
+async def chat_session(ws_url: str, rec: Recorder, opts: dict, stop_at: float):
+    import websockets
+
+    try:
+        async with websockets.connect(ws_url, max_size=None) as ws:
+            while time.perf_counter() < stop_at:
+                for question in random.sample(QUESTIONS, k=min(opts["chat_turns"], len(QUESTIONS))):
+                    if time.perf_counter() >= stop_at:
+                        return
+                    await chat_turn(ws, question, rec)
+                    await asyncio.sleep(opts["think_time"])
+    except Exception as e:
+        rec.fail("chat_connect", type(e).__name__)
+
+
+async def chat_turn(ws, question: str, rec: Recorder):
+    start = time.perf_counter()
+    first = None
+    await ws.send(question)
+    while True:
+        frame = await asyncio.wait_for(ws.recv(), timeout=120)
+        if frame == "__PING__":
+            continue
+        if frame == "__END__":
+            break
+        if frame == "__CANCELLED__":
+            rec.fail("chat_turn", "cancelled")
+            return
+        if first is None:
+            first = time.perf_counter()
+            rec.add("chat_ttft", first - start)
+    rec.add("chat_turn", time.perf_counter() - start)
+
+
+HTTP_WORKLOADS = {
+    "generate": generate,
+    "generate_stream": generate_stream,
+    "upload": upload,
+    "save": save_list_pdf,
+}
+
+
+async def closed_loop(workload, client, rec: Recorder, opts: dict, stop_at: float):
+    """One virtual user: run the workload back to back until the deadline."""
+    while time.perf_counter() < stop_at:
+        await workload(client, rec, opts)
+
+
+def summarise(rec: Recorder, elapsed: float) -> dict:
+    out = {}
+    for op in sorted(set(rec.samples) | set(rec.errors)):
+        ordered = sorted(rec.samples.get(op, []))
+        errors = sum(rec.errors.get(op, {}).values())
+
+        def pct(q):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 1) if ordered else None
+
+        out[op] = {
+            "count": len(ordered),
+            "errors": errors,
+            "error_kinds": rec.errors.get(op, {}),
+            "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": round(ordered[-1], 1) if ordered else None,
+        }
+    return out
+
+
+def dumps(result: dict) -> str:
+    return json.dumps(result, indent=2, sort_keys=True)
@@ -0,0 +1,9 @@
+# Puts the repository root on sys.path so tests import `services.*` and `routes.*` as the app does.
+import os
+import tempfile
+
+# database.py builds its engine at import time; every test module shares one throwaway SQLite file
+_tmp = tempfile.mkdtemp(prefix="app_test_")
+os.environ["SUPABASE_DB_URL"] = ""
+os.environ["SQLITE_DB_URL"] = f"sqlite+aiosqlite:///{_tmp}/app.db"
+os.environ["SETTINGS_INVALIDATION"] = ""
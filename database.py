@@ -1,27 +1,119 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, event, inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 from datetime import datetime
-import os
+from dotenv import load_dotenv
+from services.search import ensure_search_index
+from services.metrics import record_stage
+import os, time, asyncio, threading
 
-# ✅ Load Supabase connection URL
+load_dotenv()
+
+# ✅ Load Supabase connection URL (falls back to a local SQLite file for offline development)
 SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL")
-if not SUPABASE_DB_URL:
-    raise ValueError("❌ SUPABASE_DB_URL is missing in your .env file!")
+SQLITE_FALLBACK_URL = os.getenv("SQLITE_DB_URL", "sqlite+aiosqlite:///./documents.db")
+
+if SUPABASE_DB_URL:
+    # ✅ psycopg3 dialect; the same driver serves the async engine
+    DATABASE_URL = SUPABASE_DB_URL.replace("postgresql://", "postgresql+psycopg://")
+else:
+    print("⚠️ SUPABASE_DB_URL not set, using local SQLite:", SQLITE_FALLBACK_URL)
+    DATABASE_URL = SQLITE_FALLBACK_URL
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
 
-# ✅ Use psycopg3 dialect explicitly
-DATABASE_URL = SUPABASE_DB_URL.replace("postgresql://", "postgresql+psycopg://")
+# ✅ Pool settings (DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_RECYCLE / DB_POOL_TIMEOUT / DB_STATEMENT_TIMEOUT_MS)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))
 
-# ✅ Create SQLAlchemy engine and session
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# ✅ Create async SQLAlchemy engine and session
+# SQLite gets SQLAlchemy's default NullPool, which rejects the queue-pool sizing arguments
+POOL_ARGS = {} if IS_SQLITE else {
+    "pool_size": POOL_SIZE,
+    "max_overflow": MAX_OVERFLOW,
+    "pool_recycle": POOL_RECYCLE,
+    "pool_timeout": POOL_TIMEOUT,
+}
+engine = create_async_engine(DATABASE_URL, pool_pre_ping=True, **POOL_ARGS)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
+
+@event.listens_for(engine.sync_engine, "connect")
+def configure_connection(dbapi_connection, connection_record):
+    if IS_SQLITE:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+    elif STATEMENT_TIMEOUT_MS:
+        # SET outside a transaction so it sticks for the life of the pooled connection
+        autocommit = dbapi_connection.autocommit
+        dbapi_connection.autocommit = True
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET statement_timeout = {STATEMENT_TIMEOUT_MS}")
+        cursor.close()
+        dbapi_connection.autocommit = autocommit
+
+
+# -----------------------------
+# ⏱️ Statement Timing
+# -----------------------------
+# Statement time feeds the "db" stage histogram (and the current request's breakdown)
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["statement_started"].pop()
+    record_stage("db", time.perf_counter() - started)
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _statement_failed(context):
+    conn = context.connection
+    if conn is not None and conn.info.get("statement_started"):
+        record_stage("db", time.perf_counter() - conn.info["statement_started"].pop())
+
+# -----------------------------
+# 🔌 Session Dependency + Pool Stats
+# -----------------------------
+_pool_wait = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+async def get_db():
+    async with SessionLocal() as session:
+        # Checking out the connection up front lets us time the wait for a pooled connection
+        start = time.perf_counter()
+        await session.connection()
+        waited = (time.perf_counter() - start) * 1000
+        _pool_wait["count"] += 1
+        _pool_wait["total_ms"] += waited
+        _pool_wait["max_ms"] = max(_pool_wait["max_ms"], waited)
+        yield session
+
+def pool_stats() -> dict:
+    pool = engine.pool
+    count = _pool_wait["count"]
+    return {
+        "dialect": engine.dialect.name,
+        "size": pool.size() if hasattr(pool, "size") else None,
+        "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+        "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+        "checkouts": count,
+        "avg_wait_ms": round(_pool_wait["total_ms"] / count, 2) if count else 0.0,
+        "max_wait_ms": round(_pool_wait["max_ms"], 2),
+    }
+
 # -----------------------------
 # 📄 Documents Table
 # -----------------------------
 class Document(Base):
     __tablename__ = "documents"
+    # Keyset pagination: WHERE user_id = ? AND id < cursor ORDER BY id DESC
+    __table_args__ = (Index("ix_documents_user_id_id", "user_id", "id"),)
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
     content = Column(Text, nullable=False)
@@ -31,12 +123,15 @@ class Document(Base):
     signer_name = Column(String(255), nullable=True)
     signature_url = Column(Text, nullable=True)
     signature_hash = Column(String(255), nullable=True)
+    signed_pdf_url = Column(Text, nullable=True)
 
 # -----------------------------
 # ⚙️ User Settings Table
 # -----------------------------
 class UserSettings(Base):
     __tablename__ = "user_settings"
+    # One row per user; lets first-time reads upsert with ON CONFLICT DO NOTHING
+    __table_args__ = (Index("ux_user_settings_user_id", "user_id", unique=True),)
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String(255), nullable=True)
     openai_model = Column(String(255), default="gpt-4o-mini")
@@ -48,10 +143,63 @@ class UserSettings(Base):
 # -----------------------------
 # 🚀 Initialize Database
 # -----------------------------
-def init_db():
+schema_ready = threading.Event()
+_init_lock = asyncio.Lock()
+
+def _add_missing_columns(sync_conn):
+    # create_all never alters existing tables: add nullable columns introduced since
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=sync_conn.dialect)
+                sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                print(f"✅ Added column {table.name}.{column.name}")
+
+def _create_schema(sync_conn):
+    Base.metadata.create_all(sync_conn)
+    _add_missing_columns(sync_conn)
+    # create_all skips indexes on tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.unique:
+                # Upserts (ON CONFLICT) depend on unique indexes: failing here must block startup.
+                # Legacy duplicates are never deleted at boot; tools/ has the one-off migration.
+                try:
+                    index.create(sync_conn, checkfirst=True)
+                except Exception as e:
+                    raise RuntimeError(
+                        f"Could not create unique index {index.name} (duplicate rows?); "
+                        f"run python -m tools.migrate_{table.name}"
+                    ) from e
+                continue
+            # A savepoint per index, so a slow or failing secondary index doesn't block startup
+            try:
+                with sync_conn.begin_nested():
+                    index.create(sync_conn, checkfirst=True)
+            except Exception as e:
+                print(f"⚠️ Could not create index {index.name}:", e)
+    # Full-text search index (tsvector + GIN on Postgres, FTS5 on SQLite)
     try:
-        Base.metadata.create_all(bind=engine)
-        print("✅ Database initialized")
+        with sync_conn.begin_nested():
+            ensure_search_index(sync_conn)
     except Exception as e:
-        print("⚠️ Database not ready yet, continuing startup:", e)
+        print("⚠️ Could not create full-text search index:", e)
 
+async def init_db() -> bool:
+    """Create tables and indexes once per process; later calls are a flag check."""
+    if schema_ready.is_set():
+        return True
+    async with _init_lock:
+        if schema_ready.is_set():
+            return True
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(_create_schema)
+            schema_ready.set()
+            print("✅ Database initialized")
+            return True
+        except Exception as e:
+            print("⚠️ Database not ready yet, continuing startup:", e)
+            return False
@@ -3,22 +3,65 @@ import os
 for k in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "http_proxy", "https_proxy"):
     os.environ.pop(k, None)
 
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from routes.chat import router as chat_router
-from routes.upload import router as upload_router
-from routes.generate import router as generate_router
-from routes.save import router as save_router
-from database import init_db
+from services.startup import report, init_schema, warm_up, warmup_enabled
+
+# Route modules only import light dependencies; fitz, docx, fpdf and openai load on first use
+with report.phase("import fastapi"):
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, PlainTextResponse
+with report.phase("import database"):
+    from database import init_db, engine, schema_ready, pool_stats
+with report.phase("import routes"):
+    from routes.chat import router as chat_router, answer_cache
+    from routes.upload import router as upload_router, MAX_FILE_SIZE, upload_jobs
+    from routes.generate import router as generate_router
+    from routes.save import router as save_router
+    from routes.settings import router as settings_router, invalidation, on_invalidate
+    from routes.sign import router as sign_router, storage
+from services.llm import gateway
+from services.pdf_render import renderer
+from services.ingest import UploadLimitMiddleware
+from services.extraction import extractor
+from services.jurisdiction import knowledge
+from services.metrics import MetricsMiddleware, render_metrics, render_value, slow_requests
 import asyncio
-import uvicorn
 
 app = FastAPI(title="LawHelpZone AI Backend")
+_background = set()
+
+def spawn(coro):
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
 
 @app.on_event("startup")
 async def startup():
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, init_db)
+    # Schema setup runs once in the background; /ready flips when it is done
+    spawn(init_schema(init_db))
+    await invalidation.start(on_invalidate)
+    await upload_jobs.start()
+    if warmup_enabled():
+        spawn(warm_up(engine, renderer))
+    report.print_summary()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await invalidation.stop()
+    await upload_jobs.stop()
+    await gateway.aclose()
+    await storage.aclose()
+    if answer_cache:
+        answer_cache.save()
+    renderer.shutdown()
+    extractor.shutdown()
+    await engine.dispose()
+
+# ✅ Reject oversized uploads before the multipart body is parsed (64 KB for form overhead)
+app.add_middleware(UploadLimitMiddleware, path_prefix="/api/upload", max_bytes=MAX_FILE_SIZE + 64 * 1024)
+
+# ✅ Route latency, in-flight gauges and per-stage breakdowns (GET /metrics)
+app.add_middleware(MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,10 +75,62 @@ app.include_router(chat_router, prefix="/api")
 app.include_router(upload_router, prefix="/api/upload")   # ✅ FIXED
 app.include_router(generate_router, prefix="/api")
 app.include_router(save_router, prefix="/api/save")       # ✅ FIXED
+app.include_router(settings_router, prefix="/api/settings")
+app.include_router(sign_router, prefix="/api/sign")
 
 @app.get("/")
 def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready():
+    if not schema_ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+@app.get("/startup")
+def startup_report():
+    return report.as_dict()
+
+@app.get("/api/db/stats")
+def db_stats():
+    return pool_stats()
+
+@app.get("/api/laws/stats")
+def laws_stats():
+    return knowledge.stats()
+
+@app.get("/api/llm/stats")
+def llm_stats():
+    return gateway.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    db = pool_stats()
+    llm = gateway.stats()
+    render = renderer.stats()
+    jobs = upload_jobs.stats()
+    extra = []
+    extra += render_value("db_pool_size", "Configured DB pool size", db["size"])
+    extra += render_value("db_pool_checked_out", "DB connections in use", db["checked_out"])
+    extra += render_value("db_pool_overflow", "DB connections beyond the pool size", db["overflow"])
+    extra += render_value("db_pool_checkouts_total", "DB connection checkouts", db["checkouts"], "counter")
+    extra += render_value("db_pool_wait_avg_ms", "Average wait for a pooled connection", db["avg_wait_ms"])
+    extra += render_value("llm_requests_total", "LLM requests", llm.get("requests"), "counter")
+    extra += render_value("llm_failures_total", "LLM requests that failed", llm.get("failures"), "counter")
+    extra += render_value("llm_retries_total", "LLM retries", llm.get("retries"), "counter")
+    extra += render_value("llm_prompt_tokens_total", "LLM prompt tokens", llm.get("prompt_tokens"), "counter")
+    extra += render_value("llm_completion_tokens_total", "LLM completion tokens", llm.get("completion_tokens"), "counter")
+    extra += render_value("llm_in_flight", "LLM calls in flight", sum(llm["in_flight"].values()))
+    extra += render_value("render_queue_depth", "PDF renders queued or running", render["queue_depth"])
+    extra += render_value("upload_jobs_queue_depth", "Upload jobs waiting", jobs["queue_depth"])
+    extra += render_value("upload_jobs_running", "Upload jobs running", jobs["running"])
+    return render_metrics(extra)
+
+@app.get("/metrics/slow")
+def metrics_slow():
+    return {"samples": list(slow_requests)}
+
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT", 10000)))
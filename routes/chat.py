@@ -1,72 +1,208 @@
-import os
+import re
+import uuid
 import asyncio
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from contextlib import aclosing
 from dotenv import load_dotenv
-from openai import OpenAI
+from services.chat_memory import ConversationMemory
+from services.llm import gateway
+from services.jurisdiction import knowledge
+from services.answer_cache import SemanticAnswerCache
 
 load_dotenv()
 router = APIRouter()
-sessions = {}
 
-def get_openai_client():
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY is not set")
-    return OpenAI(api_key=api_key)
+SYSTEM_PROMPT = (
+    "You are LawHelpZone AI, a professional legal assistant. "
+    "Answer legal questions only. "
+    "Always end your response with: "
+    "'⚖️ This information is AI-generated and not legal advice.'"
+)
+
+# Control frames sent alongside streamed token frames
+PING_FRAME = "__PING__"
+END_FRAME = "__END__"
+CANCELLED_FRAME = "__CANCELLED__"
+CACHED_FRAME = "__CACHED__"
+SESSION_FRAME = "__SESSION__:"
+UNAVAILABLE_REPLY = "⚖️ Service temporarily unavailable."
+
+# Client-supplied ids let a reconnect (to any worker) resume the conversation
+SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{8,128}")
+
+async def summarize_turns(summary: str, turns: list) -> str:
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in turns)
+    return await gateway.complete(
+        [
+            {
+                "role": "system",
+                "content": (
+                    "Condense this legal-assistant conversation into a short factual summary. "
+                    "Keep names, jurisdictions, dates, amounts and open questions. "
+                    f"Stay under {memory.summary_max_tokens} tokens."
+                ),
+            },
+            {
+                "role": "user",
+                "content": f"Existing summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}",
+            },
+        ],
+        temperature=0.2,
+        max_tokens=memory.summary_max_tokens,
+    )
+
+
+memory = ConversationMemory.from_env(SYSTEM_PROMPT, summarizer=summarize_turns)
+# Opt-in (CHAT_ANSWER_CACHE=1): near-duplicate first questions are answered locally
+answer_cache = SemanticAnswerCache.from_env()
+_background = set()
+
+# ----------------------------
+# Stream one assistant reply token-by-token over the socket
+# ----------------------------
+async def stream_reply(ws: WebSocket, messages: list) -> tuple[str, bool]:
+    """Returns (reply, complete); a reply cut short by an upstream error is not complete."""
+    parts = []
+    try:
+        # aclosing() closes the upstream stream (and frees the model slot) on cancel or disconnect
+        async with aclosing(gateway.stream(messages, temperature=0.6)) as tokens:
+            async for delta in tokens:
+                parts.append(delta)
+                await ws.send_text(delta)
+    except WebSocketDisconnect:
+        raise
+    except Exception:
+        if not parts:
+            await ws.send_text(UNAVAILABLE_REPLY)
+            return UNAVAILABLE_REPLY, False
+        return "".join(parts).strip(), False
+
+    return "".join(parts).strip(), True
+
+
+async def jurisdiction_context(sid, msg: str) -> str | None:
+    mem = memory.session(sid)
+    await memory.set_jurisdiction(sid, knowledge.detect(msg) or mem.jurisdiction)
+    notes = knowledge.context(mem.jurisdiction, msg)
+    if not notes:
+        return None
+    return f"Jurisdiction notes for {mem.jurisdiction} (use where relevant):\n{notes}"
+
+
+async def cached_answer(ws: WebSocket, msg: str, jurisdiction: str | None) -> str | None:
+    hit = await asyncio.to_thread(answer_cache.lookup, msg, jurisdiction)
+    if hit is None:
+        return None
+    await ws.send_text(CACHED_FRAME)
+    await ws.send_text(hit["answer"])
+    return hit["answer"]
+
+
+async def respond(ws: WebSocket, sid: str, msg: str):
+    # Pick up turns written by another worker before this socket reconnected here
+    mem = await memory.resume(sid)
+    # Only opening questions are cached: later turns depend on the conversation so far
+    first_turn = answer_cache is not None and not mem.turns and not mem.summary
+    await memory.append(sid, "user", msg)
+    context = await jurisdiction_context(sid, msg)
+    jurisdiction = memory.session(sid).jurisdiction
+
+    try:
+        # Only questions with a resolved jurisdiction: "" would mix every other country together
+        reply = await cached_answer(ws, msg, jurisdiction) if first_turn and jurisdiction else None
+        if reply is None:
+            reply, complete = await stream_reply(ws, memory.build_prompt(sid, context))
+            if first_turn and jurisdiction and complete and reply:
+                task = asyncio.create_task(asyncio.to_thread(answer_cache.store, msg, reply, jurisdiction))
+                _background.add(task)
+                task.add_done_callback(_background.discard)
+    except asyncio.CancelledError:
+        # Superseded by a newer message or the socket went away
+        try:
+            await ws.send_text(CANCELLED_FRAME)
+        except Exception:
+            pass
+        raise
+
+    await memory.append(sid, "assistant", reply)
+    await ws.send_text(END_FRAME)
+
+    # Summarise turns that left the window after the reply is out, off the latency path.
+    # Runs detached so a quick follow-up message does not cancel it.
+    if memory.needs_compaction(sid):
+        task = asyncio.create_task(memory.compact(sid))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+
+
+async def cancel_pending(task: asyncio.Task | None):
+    if task is None:
+        return
+    if task.done():
+        if not task.cancelled():
+            task.exception()  # retrieve so failures are not reported as unhandled
+        return
+    task.cancel()
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
+
 
 @router.websocket("/chat")
 async def chat_socket(ws: WebSocket):
     await ws.accept()
 
-    try:
-        client = get_openai_client()
-    except Exception:
+    if not gateway.configured:
         await ws.send_text("⚖️ AI service not configured.")
         await ws.close()
         return
 
-    sid = id(ws)
-    sessions[sid] = {
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "You are LawHelpZone AI, a professional legal assistant. "
-                    "Answer legal questions only. "
-                    "Always end your response with: "
-                    "'⚖️ This information is AI-generated and not legal advice.'"
-                ),
-            }
-        ]
-    }
+    requested = ws.query_params.get("session_id", "")
+    sid = requested if SESSION_ID_PATTERN.fullmatch(requested) else uuid.uuid4().hex
+    await memory.resume(sid)
+    # Opt-in, so clients that predate resumable sessions never see the control frame
+    if "session_id" in ws.query_params or ws.query_params.get("resume") in ("1", "true"):
+        await ws.send_text(SESSION_FRAME + sid)
+
+    pending: asyncio.Task | None = None
 
     try:
         while True:
             try:
                 msg = await asyncio.wait_for(ws.receive_text(), timeout=60)
             except asyncio.TimeoutError:
-                await ws.send_text("__PING__")
+                # Only ping while idle so pings never interleave with token frames
+                if pending is None or pending.done():
+                    await ws.send_text(PING_FRAME)
                 continue
 
             if not msg.strip():
                 continue
 
-            sessions[sid]["messages"].append({"role": "user", "content": msg})
-
-            try:
-                res = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=sessions[sid]["messages"],
-                    temperature=0.6,
-                )
-                reply = res.choices[0].message.content.strip()
-            except Exception:
-                reply = "⚖️ Service temporarily unavailable."
-
-            sessions[sid]["messages"].append({"role": "assistant", "content": reply})
-            await ws.send_text(reply)
+            # A new message cancels any reply still being generated
+            await cancel_pending(pending)
+            pending = asyncio.create_task(respond(ws, sid, msg))
 
     except WebSocketDisconnect:
         pass
     finally:
-        sessions.pop(sid, None)
+        # The session is kept (until idle_ttl) so a reconnect with the same id resumes it
+        await cancel_pending(pending)
+
+
+@router.get("/chat/stats")
+def chat_stats():
+    return {
+        **memory.stats(),
+        "answer_cache": answer_cache.stats() if answer_cache else {"enabled": False},
+    }
+
+
+@router.get("/chat/stats/{session_id}")
+def chat_session_stats(session_id: str):
+    # For a caller that already holds the id; /chat/stats never lists them
+    stats = memory.stats(session_id)
+    if not stats:
+        raise HTTPException(status_code=404, detail="Session not active")
+    return stats
@@ -1,18 +1,23 @@
-import os
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-from openai import OpenAI
+from services.llm import gateway
+from services.result_cache import ResultCache, make_key
+from services.jurisdiction import knowledge
+
+import os, json, time, asyncio
+from collections import deque
+from contextlib import aclosing
 
 load_dotenv()
 router = APIRouter()
 
-# ✅ Lazy, proxy-safe OpenAI client
-def get_openai_client():
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY not configured")
-    return OpenAI(api_key=api_key)
+BATCH_MAX_ITEMS = int(os.getenv("GENERATE_BATCH_MAX_ITEMS", 100))
+BATCH_CONCURRENCY = int(os.getenv("GENERATE_BATCH_CONCURRENCY", 8))
+
+# ✅ Identical requests within the TTL are served from cache (GENERATE_CACHE_SIZE / _TTL / _DB)
+generate_cache = ResultCache.from_env("generate", "GENERATE", max_entries=512, ttl=6 * 3600)
 
 class GenerateRequest(BaseModel):
     type: str
@@ -22,33 +27,180 @@ class GenerateRequest(BaseModel):
     country: str
     clauses: str | None = None
 
-@router.post("/generate")
-async def generate(req: GenerateRequest):
-    try:
-        client = get_openai_client()
+class BatchGenerateRequest(BaseModel):
+    items: list[GenerateRequest] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    concurrency: int | None = None
 
-        prompt = (
-            f"Draft a professional {req.type} agreement between {req.partyA} and {req.partyB}, "
-            f"effective {req.effectiveDate} under {req.country} law. "
-            f"Use clear legal formatting and numbered clauses."
-        )
+def cache_key(req: GenerateRequest) -> str:
+    return make_key({
+        "type": req.type.casefold(),
+        "partyA": req.partyA,
+        "partyB": req.partyB,
+        "effectiveDate": req.effectiveDate,
+        "country": req.country.casefold(),
+        "clauses": req.clauses or "",
+        # Edits to data/laws change the injected context, so they start a fresh cache generation
+        "laws": knowledge.snapshot().version,
+    })
+
+
+def draft_messages(req: GenerateRequest) -> list:
+    prompt = (
+        f"Draft a professional {req.type} agreement between {req.partyA} and {req.partyB}, "
+        f"effective {req.effectiveDate} under {req.country} law. "
+        f"Use clear legal formatting and numbered clauses."
+    )
+
+    if req.clauses:
+        prompt += f"\nInclude these clauses: {req.clauses}"
+
+    messages = [{"role": "system", "content": "You draft formal legal documents."}]
+    context = knowledge.context(req.country, f"{req.type} {req.clauses or ''}")
+    if context:
+        messages.append({
+            "role": "system",
+            "content": f"Jurisdiction notes for {knowledge.resolve(req.country)} (follow where relevant):\n{context}",
+        })
+    messages.append({"role": "user", "content": prompt})
+    return messages
 
-        if req.clauses:
-            prompt += f"\nInclude these clauses: {req.clauses}"
 
-        res = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You draft formal legal documents."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
+async def draft_document(req: GenerateRequest) -> str:
+    return await gateway.complete(draft_messages(req), temperature=0.7)
+
+
+@router.post("/generate")
+async def generate(req: GenerateRequest, stream: bool = False):
+    if stream:
+        return StreamingResponse(
+            stream_document(req),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
 
-        return {"content": res.choices[0].message.content.strip()}
+    try:
+        content, status = await generate_cache.get_or_compute(
+            cache_key(req),
+            lambda: draft_document(req),
+        )
+        return {"content": content, "cached": status != "miss", "cache": status}
 
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Document generation failed: {str(e)}"
         )
+
+
+# ----------------------------
+# Streaming generation (SSE: delta events, then one done event)
+# ----------------------------
+stream_stats = {"streams": 0, "completed": 0, "cancelled": 0, "failed": 0, "cached": 0}
+ttfb_ms: deque = deque(maxlen=1000)
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_document(req: GenerateRequest):
+    started = time.perf_counter()
+    stream_stats["streams"] += 1
+    key = cache_key(req)
+
+    cached = await generate_cache.get(key)
+    if cached is not None:
+        stream_stats["cached"] += 1
+        ttfb_ms.append((time.perf_counter() - started) * 1000)
+        yield sse("delta", {"text": cached})
+        yield sse("done", {"content": cached, "cached": True, "usage": None})
+        return
+
+    parts, usage = [], {}
+    first_token_ms = None
+    try:
+        # Closing this generator (client disconnect) closes the upstream completion
+        async with aclosing(gateway.stream(draft_messages(req), usage=usage, temperature=0.7)) as tokens:
+            async for delta in tokens:
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                    ttfb_ms.append(first_token_ms)
+                parts.append(delta)
+                yield sse("delta", {"text": delta})
+    except asyncio.CancelledError:
+        stream_stats["cancelled"] += 1
+        raise
+    except Exception as e:
+        stream_stats["failed"] += 1
+        yield sse("error", {"detail": f"Document generation failed: {str(e)}"})
+        return
+
+    content = "".join(parts).strip()
+    elapsed = time.perf_counter() - started
+    await generate_cache.put(key, content, cost=elapsed)
+    stream_stats["completed"] += 1
+    yield sse("done", {
+        "content": content,
+        "cached": False,
+        "usage": usage or None,
+        "ttfb_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+        "elapsed_ms": round(elapsed * 1000, 1),
+    })
+
+
+def percentile(samples, q: float) -> float | None:
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 1)
+
+
+# ----------------------------
+# Batch generation (NDJSON, one line per item as it completes)
+# ----------------------------
+@router.post("/generate/batch")
+async def generate_batch(batch: BatchGenerateRequest):
+    limit = max(1, min(batch.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
+    sem = asyncio.Semaphore(limit)
+
+    async def run(index: int, req: GenerateRequest) -> dict:
+        try:
+            async with sem:
+                content, status = await generate_cache.get_or_compute(cache_key(req), lambda: draft_document(req))
+            return {"index": index, "content": content, "cached": status != "miss", "cache": status}
+        except Exception as e:
+            # One failed item is reported in its own line; the rest of the batch carries on
+            return {"index": index, "error": f"Document generation failed: {str(e)}"}
+
+    async def lines():
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(run(i, req)) for i, req in enumerate(batch.items)]
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                failed += "error" in item
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+            yield json.dumps({
+                "done": True,
+                "total": len(tasks),
+                "succeeded": len(tasks) - failed,
+                "failed": failed,
+                "concurrency": limit,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            }) + "\n"
+        finally:
+            # Client went away: stop generating what nobody will read. A fill that another
+            # request is also waiting on keeps running for that request (see ResultCache).
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/generate/stats")
+def generate_stats():
+    return {
+        **generate_cache.stats(),
+        "stream": {**stream_stats, "ttfb_p50_ms": percentile(ttfb_ms, 0.5), "ttfb_p95_ms": percentile(ttfb_ms, 0.95)},
+    }
@@ -1,24 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from database import SessionLocal, Document, init_db
-from fpdf import FPDF
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, Document
 from datetime import datetime
-import tempfile, os, traceback
-from fastapi.responses import FileResponse
+from services.pdf_render import (
+    renderer, render_document, render_paged_document, TEMPLATE_VERSION, PAGED_TEMPLATE_VERSION, PAGED_MIN_CHARS,
+)
+from services.artifacts import pdf_store, content_key, serve_artifact, serve_rendering
+from services.documents import list_page, estimate_total, page_size, DEFAULT_PAGE_SIZE
+from services.search import search_documents
+import asyncio, traceback
 
 router = APIRouter()
 
-# ----------------------------
-# DB Session Dependency
-# ----------------------------
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # ----------------------------
 # Request Schema
 # ----------------------------
@@ -28,13 +22,40 @@ class SaveRequest(BaseModel):
     user_id: str | None = None
 
 # ----------------------------
-# Save Document + Generate Styled PDF (Unicode Safe with Bold & Italic)
+# PDF artifact key + background render
+# ----------------------------
+def created_label(doc: Document) -> str:
+    return (doc.created_at or datetime.utcnow()).strftime("%Y-%m-%d %H:%M:%S UTC")
+
+
+def paged(doc: Document) -> bool:
+    # Long documents are paginated and written page by page, so memory stays flat
+    return len(doc.content) >= PAGED_MIN_CHARS
+
+
+def artifact_key(doc: Document) -> str:
+    version = PAGED_TEMPLATE_VERSION if paged(doc) else TEMPLATE_VERSION
+    return content_key(version, doc.title, doc.content, doc.user_id, created_label(doc))
+
+
+def enqueue_render(doc: Document, key: str):
+    return renderer.submit(
+        key,
+        render_paged_document if paged(doc) else render_document,
+        doc.title,
+        doc.content,
+        doc.user_id,
+        created_label(doc),
+        store=pdf_store,
+    )
+
+
+# ----------------------------
+# Save Document + Queue Styled PDF (Unicode Safe with Bold & Italic)
 # ----------------------------
 @router.post("/")
-async def save_document(req: SaveRequest, db: Session = Depends(get_db)):
+async def save_document(req: SaveRequest, db: AsyncSession = Depends(get_db)):
     try:
-        init_db()
-
         if not req.title.strip() or not req.content.strip():
             raise ValueError("Title and content cannot be empty.")
 
@@ -45,98 +66,21 @@ async def save_document(req: SaveRequest, db: Session = Depends(get_db)):
             user_id=req.user_id,
         )
         db.add(new_doc)
-        db.commit()
-        db.refresh(new_doc)
-
-        # ✅ Font directory setup
-        FONT_DIR = os.path.join(os.path.dirname(__file__), "../fonts")
-        os.makedirs(FONT_DIR, exist_ok=True)
-        FONT_REGULAR = os.path.join(FONT_DIR, "DejaVuSans.ttf")
-        FONT_BOLD = os.path.join(FONT_DIR, "DejaVuSans-Bold.ttf")
-        FONT_ITALIC = os.path.join(FONT_DIR, "DejaVuSans-Oblique.ttf")
-
-        # ✅ Font existence check
-        for font_file in [FONT_REGULAR, FONT_BOLD, FONT_ITALIC]:
-            if not os.path.exists(font_file):
-                print(f"⚠️ Missing font file: {font_file}")
-                raise FileNotFoundError(
-                    "DejaVuSans.ttf / DejaVuSans-Bold.ttf / DejaVuSans-Oblique.ttf missing in backend/fonts/"
-                )
-
-        # ✅ Create styled PDF with consistent name
-        pdf_dir = tempfile.gettempdir()
-        pdf_path = os.path.join(pdf_dir, f"doc_{new_doc.id}.pdf")
-
-        pdf = FPDF()
-        pdf.add_page()
-
-        # Add Unicode fonts (Regular, Bold, Italic)
-        pdf.add_font("DejaVu", "", FONT_REGULAR, uni=True)
-        pdf.add_font("DejaVu", "B", FONT_BOLD, uni=True)
-        pdf.add_font("DejaVu", "I", FONT_ITALIC, uni=True)
-
-        # ----------------------------
-        # Header Section
-        # ----------------------------
-        pdf.set_fill_color(28, 33, 48)  # Dark header background
-        pdf.rect(0, 0, 210, 25, "F")
-        pdf.set_text_color(255, 255, 255)
-        pdf.set_font("DejaVu", "B", 16)
-        pdf.cell(0, 15, "LawHelpZone AI — Legal Document", ln=True, align="C")
-        pdf.ln(10)
-
-        # ----------------------------
-        # Document Info
-        # ----------------------------
-        pdf.set_text_color(0, 0, 0)
-        pdf.set_font("DejaVu", "", 12)
-        pdf.cell(0, 10, f"📄 Document Title: {req.title}", ln=True)
-        pdf.cell(0, 10, f"🕒 Created on: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}", ln=True)
-        if req.user_id:
-            pdf.cell(0, 10, f"👤 Created by: {req.user_id}", ln=True)
-        pdf.ln(6)
-
-        # ----------------------------
-        # Divider Line
-        # ----------------------------
-        pdf.set_draw_color(180, 180, 180)
-        pdf.set_line_width(0.3)
-        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-        pdf.ln(8)
-
-        # ----------------------------
-        # Content Section
-        # ----------------------------
-        pdf.set_font("DejaVu", "", 11)
-        pdf.multi_cell(0, 8, req.content)
-        pdf.ln(12)
-
-        # ----------------------------
-        # Signature Placeholder
-        # ----------------------------
-        pdf.set_font("DejaVu", "I", 11)
-        pdf.cell(0, 10, "_________________________", ln=True)
-        pdf.cell(0, 8, "Authorized Signature", ln=True)
-        pdf.ln(8)
-
-        # ----------------------------
-        # Footer Watermark
-        # ----------------------------
-        pdf.set_y(-15)
-        pdf.set_font("DejaVu", "I", 9)
-        pdf.set_text_color(120)
-        pdf.cell(
-            0, 10, "Generated by LawHelpZone AI — www.lawhelpzone.com", 0, 0, "C"
-        )
+        await db.commit()
+        await db.refresh(new_doc)
 
-        pdf.output(pdf_path)
+        # ✅ Render runs in the PDF worker pool; GET /pdf/{id} waits for it if still queued
+        key = artifact_key(new_doc)
+        if not pdf_store.exists(key):
+            enqueue_render(new_doc, key)
 
-        print(f"✅ Saved document and generated styled PDF: {pdf_path}")
+        print(f"✅ Saved document {new_doc.id}, PDF render queued")
         return {
             "status": "success",
-            "message": "Document saved and styled PDF generated successfully",
+            "message": "Document saved and styled PDF queued",
             "id": new_doc.id,
-            "pdf_path": pdf_path,
+            "pdf_path": pdf_store.path(key),
+            "pdf_url": f"/api/save/pdf/{new_doc.id}",
         }
 
     except Exception as e:
@@ -145,29 +89,35 @@ async def save_document(req: SaveRequest, db: Session = Depends(get_db)):
 
 
 # ----------------------------
-# List Documents
+# List Documents (metadata only, keyset-paginated)
 # ----------------------------
 @router.get("/list")
-async def list_documents(user_id: str | None = None, db: Session = Depends(get_db)):
+async def list_documents(
+    user_id: str | None = None,
+    cursor: int | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
     try:
-        init_db()
-        query = db.query(Document)
-        if user_id:
-            query = query.filter(Document.user_id == user_id)
-        docs = query.order_by(Document.id.desc()).all()
+        rows, next_cursor = await list_page(db, user_id, cursor, page_size(limit))
 
-        print(f"📄 Fetched {len(docs)} documents for user {user_id or 'guest'}")
-        return {
+        print(f"📄 Fetched {len(rows)} documents for user {user_id or 'guest'}")
+        result = {
             "documents": [
                 {
                     "id": d.id,
                     "title": d.title,
-                    "content": d.content,
                     "created_at": d.created_at.strftime("%b %d, %Y"),
+                    "signed": bool(d.signer_name),
                 }
-                for d in docs
-            ]
+                for d in rows
+            ],
+            "next_cursor": next_cursor,
         }
+        if include_total:
+            result["total_estimate"] = await estimate_total(db, user_id)
+        return result
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error fetching documents: {str(e)}")
@@ -177,15 +127,14 @@ async def list_documents(user_id: str | None = None, db: Session = Depends(get_d
 # Delete Document
 # ----------------------------
 @router.delete("/delete/{doc_id}")
-async def delete_document(doc_id: int, db: Session = Depends(get_db)):
+async def delete_document(doc_id: int, db: AsyncSession = Depends(get_db)):
     try:
-        init_db()
-        doc = db.query(Document).filter(Document.id == doc_id).first()
+        doc = await db.get(Document, doc_id)
         if not doc:
             raise HTTPException(status_code=404, detail="Document not found")
 
-        db.delete(doc)
-        db.commit()
+        await db.delete(doc)
+        await db.commit()
         print(f"🗑️ Deleted document ID {doc_id}")
         return {"status": "deleted", "id": doc_id}
     except Exception as e:
@@ -197,16 +146,92 @@ async def delete_document(doc_id: int, db: Session = Depends(get_db)):
 # Serve PDF
 # ----------------------------
 @router.get("/pdf/{doc_id}")
-async def get_pdf(doc_id: int, db: Session = Depends(get_db)):
-    """Serve generated PDF file for viewing or download."""
-    init_db()
-    doc = db.query(Document).filter(Document.id == doc_id).first()
+async def get_pdf(doc_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    """Serve generated PDF file for viewing or download (supports ETag/304 and Range)."""
+    doc = await db.get(Document, doc_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    # Release the pooled connection before (possibly) waiting on the render
+    await db.close()
+
+    key = artifact_key(doc)
+    if not pdf_store.exists(key):
+        job = renderer.pending(key) or enqueue_render(doc, key)
+        try:
+            if paged(doc):
+                # Stream pages as they are written rather than waiting for the last one
+                return await serve_rendering(request, pdf_store, key, job, renderer.output_path(key))
+            await asyncio.shield(job)
+        except Exception as e:
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=f"PDF render failed: {str(e)}")
+
+    print(f"📄 Serving PDF for document ID {doc_id}: {key}")
+    return serve_artifact(request, pdf_store, key)
+
+
+# ----------------------------
+# Full-text Search (ranked, with highlighted snippets)
+# ----------------------------
+@router.get("/search")
+async def search(
+    q: str,
+    user_id: str | None = None,
+    limit: int = 20,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_db),
+):
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+
+    limit = page_size(limit)
+    offset = max(0, offset)
+    try:
+        rows = await search_documents(db, q, user_id, limit, offset)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error searching documents: {str(e)}")
+
+    return {
+        "results": [
+            {
+                "id": r.id,
+                "title": r.title,
+                "created_at": r.created_at.strftime("%b %d, %Y") if isinstance(r.created_at, datetime) else r.created_at,
+                "snippet": r.snippet,
+                "rank": round(float(r.rank), 4),
+            }
+            for r in rows
+        ],
+        "next_offset": offset + limit if len(rows) == limit else None,
+    }
+
+
+# ----------------------------
+# Document Content (loaded on demand)
+# ----------------------------
+@router.get("/{doc_id}")
+async def get_document(doc_id: int, db: AsyncSession = Depends(get_db)):
+    doc = await db.get(Document, doc_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    pdf_path = os.path.join(tempfile.gettempdir(), f"doc_{doc_id}.pdf")
-    if not os.path.exists(pdf_path):
-        raise HTTPException(status_code=404, detail="PDF not found")
+    return {
+        "id": doc.id,
+        "title": doc.title,
+        "content": doc.content,
+        "user_id": doc.user_id,
+        "created_at": doc.created_at.strftime("%b %d, %Y"),
+        "signer_name": doc.signer_name,
+        "signature_url": doc.signature_url,
+        "signed_pdf_url": doc.signed_pdf_url,
+    }
+
 
-    print(f"📄 Serving PDF for document ID {doc_id}: {pdf_path}")
-    return FileResponse(pdf_path, media_type="application/pdf")
+# ----------------------------
+# Render Stats
+# ----------------------------
+@router.get("/render/stats")
+def render_stats():
+    return {**renderer.stats(), "artifacts": pdf_store.stats()}
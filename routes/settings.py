@@ -1,70 +1,115 @@
-from fastapi import APIRouter, HTTPException, Form
-from database import SessionLocal, UserSettings
+from fastapi import APIRouter, HTTPException, Form, Depends
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, SessionLocal, UserSettings, SUPABASE_DB_URL, IS_SQLITE
+from services.result_cache import ResultCache
+from services.invalidation import InvalidationChannel, PostgresNotifyChannel
 from datetime import datetime
 from pydantic import BaseModel
-import traceback
+import os, traceback
 
 router = APIRouter()
 
+# ✅ Read-through cache (SETTINGS_CACHE_SIZE / SETTINGS_CACHE_TTL); concurrent misses share one query
+settings_cache = ResultCache.from_env("user_settings", "SETTINGS", max_entries=10000, ttl=300)
+
+# ✅ SETTINGS_INVALIDATION=postgres fans invalidations out to other workers via LISTEN/NOTIFY
+if os.getenv("SETTINGS_INVALIDATION") == "postgres" and SUPABASE_DB_URL:
+    invalidation = PostgresNotifyChannel(SUPABASE_DB_URL, "user_settings_invalidate")
+else:
+    invalidation = InvalidationChannel()
+
+
+def on_invalidate(user_id: str | None):
+    if user_id is None:
+        settings_cache.clear()
+    else:
+        settings_cache.invalidate(user_id)
+
+
+# Requests without a user_id share one row, the same one GET / reads by default
+DEFAULT_USER_ID = "default_user"
+
+
 class SettingsRequest(BaseModel):
-    user_id: str | None = None
+    user_id: str = DEFAULT_USER_ID
     openai_model: str | None = None
     theme: str | None = None
     api_key: str | None = None
     supabase_url: str | None = None
 
 
+def serialize(settings: UserSettings) -> dict:
+    return {
+        "user_id": settings.user_id,
+        "openai_model": settings.openai_model,
+        "theme": settings.theme,
+        "api_key": settings.api_key,
+        "supabase_url": settings.supabase_url,
+        "updated_at": settings.updated_at,
+    }
+
+
+async def ensure_row(db: AsyncSession, user_id: str):
+    """Idempotent insert of the default row; concurrent first-time requests can't create duplicates."""
+    insert = sqlite.insert if IS_SQLITE else postgresql.insert
+    await db.execute(
+        insert(UserSettings)
+        .values(user_id=user_id, openai_model="gpt-4o-mini", theme="dark", updated_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=["user_id"])
+    )
+
+
+async def load_settings(user_id: str) -> dict:
+    async with SessionLocal() as db:
+        settings = await db.scalar(select(UserSettings).where(UserSettings.user_id == user_id))
+        if not settings:
+            await ensure_row(db, user_id)
+            await db.commit()
+            settings = await db.scalar(select(UserSettings).where(UserSettings.user_id == user_id))
+        return serialize(settings)
+
+
 @router.get("/")
-def get_settings(user_id: str = "default_user"):
-    db = SessionLocal()
+async def get_settings(user_id: str = DEFAULT_USER_ID):
     try:
-        settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
-        if not settings:
-            settings = UserSettings(user_id=user_id)
-            db.add(settings)
-            db.commit()
-            db.refresh(settings)
-        return {
-            "user_id": settings.user_id,
-            "openai_model": settings.openai_model,
-            "theme": settings.theme,
-            "api_key": settings.api_key,
-            "supabase_url": settings.supabase_url,
-            "updated_at": settings.updated_at,
-        }
+        settings, _ = await settings_cache.get_or_compute(user_id, lambda: load_settings(user_id))
+        return settings
     except Exception as e:
         print("❌ Error fetching settings:", e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        db.close()
 
 
 @router.post("/")
-def update_settings(req: SettingsRequest):
-    db = SessionLocal()
+async def update_settings(req: SettingsRequest, db: AsyncSession = Depends(get_db)):
     try:
-        settings = db.query(UserSettings).filter(UserSettings.user_id == req.user_id).first()
-        if not settings:
-            settings = UserSettings(user_id=req.user_id)
-            db.add(settings)
-
-        if req.openai_model:
-            settings.openai_model = req.openai_model
-        if req.theme:
-            settings.theme = req.theme
-        if req.api_key:
-            settings.api_key = req.api_key
-        if req.supabase_url:
-            settings.supabase_url = req.supabase_url
-
-        settings.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(settings)
-
-        return {"status": "success", "updated": True, "data": settings.__dict__}
+        await ensure_row(db, req.user_id)
+
+        values = {
+            field: getattr(req, field)
+            for field in ("openai_model", "theme", "api_key", "supabase_url")
+            if getattr(req, field)
+        }
+        values["updated_at"] = datetime.utcnow()
+        await db.execute(update(UserSettings).where(UserSettings.user_id == req.user_id).values(**values))
+        await invalidation.publish(db, req.user_id)
+        await db.commit()
+        settings_cache.invalidate(req.user_id)
+
+        settings = await db.scalar(select(UserSettings).where(UserSettings.user_id == req.user_id))
+        return {"status": "success", "updated": True, "data": serialize(settings)}
     except Exception:
         trace = traceback.format_exc()
         print(f"❌ Error updating settings:\n{trace}")
         raise HTTPException(status_code=500, detail="Failed to update settings")
-    finally:
-        db.close()
+
+
+@router.get("/stats")
+def settings_stats():
+    stats = settings_cache.stats()
+    return {
+        **stats,
+        "db_round_trips_saved": stats["hits"] + stats["shared"],
+        "invalidation": type(invalidation).__name__,
+    }
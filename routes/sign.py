@@ -1,105 +1,159 @@
-from fastapi import APIRouter, Form, UploadFile, File, HTTPException
-from database import SessionLocal, Document
+from fastapi import APIRouter, Form, UploadFile, File, HTTPException, Depends
+from fastapi.responses import FileResponse
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, Document
 from datetime import datetime
-from fpdf import FPDF
-import os, tempfile, traceback, hashlib, requests
+from services.storage import storage_from_env, LocalStorage
+from services.pdf_render import renderer, render_signed_document, SIGNED_TEMPLATE_VERSION
+import os, asyncio, tempfile, traceback, hashlib, mimetypes, time, uuid
 
 router = APIRouter()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+storage = storage_from_env()
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("Supabase credentials missing in environment variables.")
+TEMP_DIR = os.getenv("SIGN_TEMP_DIR", "temp_files")
+SIGNATURE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+MAX_SIGNATURE_SIZE = 5 * 1024 * 1024
 
-BUCKET_NAME = "signed_documents"
-
-# ---------- HELPER: UPLOAD VIA REST ----------
-def supabase_upload(path: str, file_bytes: bytes):
-    url = f"{SUPABASE_URL}/storage/v1/object/{BUCKET_NAME}/{path}"
-
-    headers = {
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "apikey": SUPABASE_KEY,
-        "Content-Type": "application/octet-stream"
-    }
-
-    r = requests.post(url, headers=headers, data=file_bytes)
-
-    if r.status_code not in [200, 201]:
-        raise Exception(f"Supabase upload error: {r.text}")
-
-    return f"{SUPABASE_URL}/storage/v1/object/public/{BUCKET_NAME}/{path}"
+sign_ms_total = 0.0
+signed = 0
 
 
+# ----------------------------
+# Save signature, render signed PDF, upload both
 # ----------------------------
 @router.post("/")
 async def save_signature(
     doc_id: int = Form(...),
     signer_name: str = Form(...),
     signature: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
 ):
-    db = SessionLocal()
-    try:
-        doc = db.query(Document).filter(Document.id == doc_id).first()
-        if not doc:
-            raise HTTPException(status_code=404, detail="Document not found.")
+    global sign_ms_total, signed
+    started = time.perf_counter()
+
+    ext = os.path.splitext(signature.filename or "")[1].lower()
+    if ext not in SIGNATURE_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Signature must be a PNG or JPEG image.")
+
+    doc = await db.get(Document, doc_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    title, content = doc.title, doc.content
+    created_at = (doc.created_at or datetime.utcnow()).strftime("%Y-%m-%d %H:%M:%S UTC")
+    # Don't hold a pooled connection through rendering and uploads
+    await db.rollback()
+
+    file_bytes = await signature.read(MAX_SIGNATURE_SIZE + 1)
+    if not file_bytes:
+        raise HTTPException(status_code=400, detail="Empty signature.")
+    if len(file_bytes) > MAX_SIGNATURE_SIZE:
+        raise HTTPException(status_code=400, detail="Signature image too large.")
+
+    sig_hash = hashlib.sha256(file_bytes).hexdigest()
+    signed_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
+    content_type = mimetypes.types_map.get(ext, "application/octet-stream")
+    temp_signature_path = temp_pdf_path = None
 
-        # Save signature temporarily
-        temp_dir = "temp_files"
-        os.makedirs(temp_dir, exist_ok=True)
-
-        timestamp = int(datetime.utcnow().timestamp())
-        temp_signature_path = os.path.join(temp_dir, f"{timestamp}_{signature.filename}")
-
-        file_bytes = await signature.read()
-
-        with open(temp_signature_path, "wb") as f:
+    try:
+        # The render worker reads the image from disk; a unique name so concurrent signings never collide
+        os.makedirs(TEMP_DIR, exist_ok=True)
+        fd, temp_signature_path = tempfile.mkstemp(prefix=f"signature_{doc_id}_", suffix=ext, dir=TEMP_DIR)
+        with os.fdopen(fd, "wb") as f:
             f.write(file_bytes)
-
-        # ----- UPLOAD SIGNATURE -----
-        signature_storage_path = f"signatures/{doc_id}_{timestamp}_{signature.filename}"
-
-        signature_url = supabase_upload(signature_storage_path, file_bytes)
-
-        sig_hash = hashlib.sha256(file_bytes).hexdigest()
-
-        # Update DB
-        doc.signer_name = signer_name
-        doc.signature_url = signature_url
-        doc.signature_hash = sig_hash
-        db.commit()
-
-        # ----- GENERATE PDF -----
-        signed_pdf_path = generate_signed_pdf(
-            doc.title,
-            doc.content,
-            signer_name,
-            temp_signature_path
+        # Every signed PDF is unique (it carries signed_at) and is only read once, by the upload,
+        # so it renders to a temp file rather than taking space in the shared artifact store
+        fd, temp_pdf_path = tempfile.mkstemp(prefix=f"signed_{doc_id}_", suffix=".pdf", dir=TEMP_DIR)
+        os.close(fd)
+
+        async def upload_signature():
+            path = f"signatures/{doc_id}_{uuid.uuid4().hex}{ext}"
+            return await storage.put_bytes(path, file_bytes, content_type)
+
+        async def render_and_upload_pdf():
+            await renderer.submit(
+                f"{SIGNED_TEMPLATE_VERSION}:{uuid.uuid4().hex}",
+                render_signed_document,
+                temp_pdf_path,
+                title,
+                content,
+                created_at,
+                signer_name,
+                temp_signature_path,
+                signed_at,
+            )
+            # Streamed from disk, never loaded into memory
+            path = f"signed_pdfs/{doc_id}_{sig_hash[:16]}_signed.pdf"
+            return await storage.put_file(path, temp_pdf_path, "application/pdf")
+
+        # The signature upload overlaps the render and the PDF upload; if either fails the
+        # other is cancelled instead of running on in the background
+        try:
+            async with asyncio.TaskGroup() as tg:
+                signature_task = tg.create_task(upload_signature())
+                pdf_task = tg.create_task(render_and_upload_pdf())
+        except ExceptionGroup as eg:
+            raise eg.exceptions[0]
+        signature_url, signed_pdf_url = signature_task.result(), pdf_task.result()
+
+        # ----- SINGLE DB UPDATE -----
+        result = await db.execute(
+            update(Document)
+            .where(Document.id == doc_id)
+            .values(
+                signer_name=signer_name,
+                signature_url=signature_url,
+                signature_hash=sig_hash,
+                signed_pdf_url=signed_pdf_url,
+            )
         )
+        await db.commit()
+        if not result.rowcount:
+            raise HTTPException(status_code=404, detail="Document was deleted while signing.")
 
-        with open(signed_pdf_path, "rb") as f:
-            pdf_bytes = f.read()
-
-        signed_pdf_storage_path = f"signed_pdfs/{doc_id}_signed.pdf"
-
-        signed_pdf_url = supabase_upload(signed_pdf_storage_path, pdf_bytes)
-
-        doc.signed_pdf_url = signed_pdf_url
-        db.commit()
-
-        # Cleanup
-        os.remove(temp_signature_path)
-        os.remove(signed_pdf_path)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        sign_ms_total += elapsed_ms
+        signed += 1
+        print(f"✍️ Signed document {doc_id} in {elapsed_ms:.0f} ms ({storage.name} storage)")
 
         return {
             "status": "success",
             "signature_url": signature_url,
-            "signed_pdf_url": signed_pdf_url
+            "signed_pdf_url": signed_pdf_url,
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        db.close()
+        for temp_path in (temp_signature_path, temp_pdf_path):
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+# ----------------------------
+# Local storage backend: serve stored files
+# ----------------------------
+@router.get("/files/{path:path}")
+async def get_stored_file(path: str):
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=404, detail="Not found")
+    full = storage.resolve(path)
+    if full is None or not os.path.isfile(full):
+        raise HTTPException(status_code=404, detail="Not found")
+    return FileResponse(full)
+
+
+# ----------------------------
+# Signing Stats
+# ----------------------------
+@router.get("/stats")
+def sign_stats():
+    return {
+        "signed": signed,
+        "avg_sign_ms": round(sign_ms_total / signed, 1) if signed else 0.0,
+        "storage": storage.stats(),
+    }
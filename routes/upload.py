@@ -1,147 +1,227 @@
+import asyncio
 import os
-from datetime import datetime
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+import uuid
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, Depends, WebSocket, WebSocketDisconnect
 from dotenv import load_dotenv
-from openai import OpenAI
-import fitz
-from docx import Document as DocxReader
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from database import SessionLocal, Document
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import SessionLocal, Document, get_db
+from services.analysis import analyze_document, ANALYSIS_PROMPT_VERSION
+from services.result_cache import ResultCache, make_key
+from services.documents import list_page, estimate_total, page_size, DEFAULT_PAGE_SIZE
+from services.artifacts import pdf_store, content_key, serve_artifact, serve_rendering
+from services.pdf_render import renderer, render_plain_document, PLAIN_TEMPLATE_VERSION
+from services.ingest import ingest_upload, IngestedFile
+from services.jobs import JobQueue
+from services.extraction import extractor
 
 load_dotenv()
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
-PDF_DIR = "generated_pdfs"
-
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(PDF_DIR, exist_ok=True)
-
 ALLOWED_EXTENSIONS = {".pdf", ".docx", ".txt"}
 MAX_FILE_SIZE = 10 * 1024 * 1024
 
 
-def get_openai_client():
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY not configured")
-    return OpenAI(api_key=api_key)
+# ------------------ DEDUP CACHES ------------------
+# Extraction is keyed by file hash alone; analysis also by prompt version and owner, so a prompt
+# change re-analyses without re-extracting and each user gets their own document row. Retention via UPLOAD_*_CACHE_TTL (default 30 days).
+RETENTION = 30 * 24 * 3600
+text_cache = ResultCache.from_env("upload_text", "UPLOAD_TEXT", max_entries=64, ttl=RETENTION)
+analysis_cache = ResultCache.from_env("upload_analysis", "UPLOAD_DEDUP", max_entries=1024, ttl=RETENTION)
 
 
-def extract_text(path: str) -> str:
-    if path.endswith(".pdf"):
-        with fitz.open(path) as pdf:
-            return "".join(page.get_text() for page in pdf)
-    if path.endswith(".docx"):
-        return "\n".join(p.text for p in DocxReader(path).paragraphs)
-    if path.endswith(".txt"):
-        with open(path, encoding="utf-8", errors="ignore") as f:
-            return f.read()
-    raise HTTPException(400, "Unsupported file type")
+async def document_exists(doc_id: int) -> bool:
+    # Short-lived sessions here: the upload request must not hold a pooled connection through LLM calls
+    async with SessionLocal() as db:
+        return await db.scalar(select(Document.id).where(Document.id == doc_id)) is not None
 
 
 # ------------------ UPLOAD & ANALYZE ------------------
+def no_progress(stage: str, fraction: float = 0.0):
+    pass
+
+
+async def process_upload(ingested: IngestedFile, user_id: str | None = None, progress=no_progress) -> dict:
+    """Extract, analyse and store one upload; progress(stage, fraction) is told as each stage starts."""
+
+    async def extract():
+        progress("extract")
+        text = await extractor.extract(ingested)
+        if len(text.strip()) < 50:
+            raise HTTPException(400, "Document too short")
+        return text
+
+    async def analyse():
+        text, _ = await text_cache.get_or_compute(make_key({"sha256": ingested.sha256}), extract)
+
+        # ✅ Whole document is analysed (map-reduce over clause-aligned chunks), not just text[:4000]
+        progress("analyse")
+        analysis = await analyze_document(text, on_progress=lambda f: progress("analyse", f))
+
+        progress("save")
+        async with SessionLocal() as db:
+            doc = Document(title=ingested.filename, content=analysis, user_id=user_id)
+            db.add(doc)
+            await db.commit()
+            await db.refresh(doc)
+
+        return {"doc_id": doc.id, "ai_summary": analysis}
+
+    key = make_key({"sha256": ingested.sha256, "prompt": ANALYSIS_PROMPT_VERSION, "user_id": user_id})
+    result, status = await analysis_cache.get_or_compute(key, analyse)
+
+    # The linked document may have been deleted since; analyse again in that case
+    if status != "miss" and not await document_exists(result["doc_id"]):
+        analysis_cache.invalidate(key)
+        result, status = await analysis_cache.get_or_compute(key, analyse)
+
+    return {
+        "message": "File processed",
+        "doc_id": result["doc_id"],
+        "ai_summary": result["ai_summary"],
+        "deduplicated": status != "miss",
+    }
+
+
 @router.post("/")
-async def upload(file: UploadFile = File(...)):
-    ext = os.path.splitext(file.filename)[1].lower()
-    if ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(400, "Only PDF, DOCX, TXT allowed")
+async def upload(file: UploadFile = File(...), user_id: str | None = Form(None)):
+    ingested = await ingest_upload(file, ALLOWED_EXTENSIONS, MAX_FILE_SIZE)
+    try:
+        return await process_upload(ingested, user_id)
+    finally:
+        ingested.close()
 
-    data = await file.read()
-    if len(data) > MAX_FILE_SIZE:
-        raise HTTPException(400, "File too large")
-    if not data:
-        raise HTTPException(400, "Empty file")
 
-    filename = f"{int(datetime.utcnow().timestamp())}{ext}"
-    path = os.path.join(UPLOAD_DIR, filename)
+# ------------------ BACKGROUND JOBS ------------------
+# Input is spooled to JOB_SPOOL_DIR so queued jobs survive a restart along with their state
+JOB_SPOOL_DIR = os.getenv("UPLOAD_JOB_SPOOL_DIR", "jobs/uploads")
 
-    with open(path, "wb") as f:
-        f.write(data)
 
+async def run_upload_job(payload: dict, progress) -> dict:
+    ingested = IngestedFile.from_path(payload["path"], payload["filename"], payload["sha256"])
     try:
-        text = extract_text(path)
-        if len(text.strip()) < 50:
-            raise HTTPException(400, "Document too short")
+        return await process_upload(ingested, payload.get("user_id"), progress)
+    finally:
+        ingested.close()
+
+
+upload_jobs = JobQueue.from_env("upload", "UPLOAD", run_upload_job, workers=2, max_depth=100)
+
+
+@router.post("/jobs", status_code=202)
+async def submit_upload_job(file: UploadFile = File(...), user_id: str | None = Form(None)):
+    ingested = await ingest_upload(file, ALLOWED_EXTENSIONS, MAX_FILE_SIZE)
+    if upload_jobs.depth >= upload_jobs.max_depth:
+        ingested.close()
+        raise HTTPException(503, "Upload queue is full, try again later")
 
-        client = get_openai_client()
-        res = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": text[:4000]}],
-            temperature=0.3,
+    os.makedirs(JOB_SPOOL_DIR, exist_ok=True)
+    path = os.path.join(JOB_SPOOL_DIR, f"{uuid.uuid4().hex}{ingested.ext}")
+    try:
+        await asyncio.to_thread(ingested.persist, path)
+        job = await upload_jobs.submit(
+            {"path": path, "filename": ingested.filename, "sha256": ingested.sha256, "user_id": user_id}
         )
+    except OverflowError:
+        ingested.close()
+        raise HTTPException(503, "Upload queue is full, try again later")
+    except BaseException:
+        ingested.close()
+        raise
 
-        analysis = res.choices[0].message.content.strip()
+    return {**job, "status_url": f"/api/upload/jobs/{job['id']}", "ws_url": f"/api/upload/jobs/{job['id']}/ws"}
 
-        db = SessionLocal()
-        doc = Document(title=file.filename, content=analysis)
-        db.add(doc)
-        db.commit()
-        db.refresh(doc)
-        db.close()
 
-        return {"message": "File processed", "doc_id": doc.id, "ai_summary": analysis}
+@router.get("/jobs/stats")
+def job_stats():
+    return upload_jobs.stats()
 
-    finally:
-        if os.path.exists(path):
-            os.remove(path)
+
+@router.get("/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    job = await upload_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return job
+
+
+@router.websocket("/jobs/{job_id}/ws")
+async def watch_upload_job(ws: WebSocket, job_id: str):
+    await ws.accept()
+    try:
+        found = False
+        async for job in upload_jobs.subscribe(job_id):
+            found = True
+            await ws.send_json(job)
+        if not found:
+            await ws.send_json({"id": job_id, "error": "Job not found"})
+        await ws.close()
+    except WebSocketDisconnect:
+        pass
 
 
 # ------------------ LIST DOCUMENTS ------------------
 @router.get("/list")
-def list_documents(user_id: str):
-    db = SessionLocal()
-    docs = db.query(Document).all()
-    db.close()
-
-    return {
+async def list_documents(
+    user_id: str,
+    cursor: int | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    rows, next_cursor = await list_page(db, user_id, cursor, page_size(limit))
+    result = {
         "documents": [
             {"id": d.id, "title": d.title, "created_at": d.created_at}
-            for d in docs
-        ]
+            for d in rows
+        ],
+        "next_cursor": next_cursor,
     }
+    if include_total:
+        result["total_estimate"] = await estimate_total(db, user_id)
+    return result
 
 
 # ------------------ DELETE DOCUMENT ------------------
 @router.delete("/delete/{doc_id}")
-def delete_document(doc_id: int):
-    db = SessionLocal()
-    doc = db.query(Document).filter(Document.id == doc_id).first()
+async def delete_document(doc_id: int, db: AsyncSession = Depends(get_db)):
+    doc = await db.get(Document, doc_id)
     if not doc:
-        db.close()
         raise HTTPException(404, "Document not found")
 
-    db.delete(doc)
-    db.commit()
-    db.close()
+    await db.delete(doc)
+    await db.commit()
 
     return {"message": "Deleted"}
 
 
 # ------------------ GENERATE & DOWNLOAD PDF ------------------
 @router.get("/pdf/{doc_id}")
-def download_pdf(doc_id: int):
-    db = SessionLocal()
-    doc = db.query(Document).filter(Document.id == doc_id).first()
-    db.close()
+async def download_pdf(doc_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    doc = await db.get(Document, doc_id)
+    await db.close()
 
     if not doc:
         raise HTTPException(404, "Document not found")
 
-    pdf_path = os.path.join(PDF_DIR, f"doc_{doc_id}.pdf")
+    # Keyed by content, so edited documents get a fresh PDF and stale ones age out of the store
+    key = content_key(PLAIN_TEMPLATE_VERSION, doc.content)
+    if not pdf_store.exists(key):
+        job = renderer.pending(key) or renderer.submit(key, render_plain_document, doc.content, store=pdf_store)
+        # Pages stream to the client as the worker flushes them
+        return await serve_rendering(request, pdf_store, key, job, renderer.output_path(key),
+                                     filename=f"{doc.title}.pdf", disposition="attachment")
+
+    return serve_artifact(request, pdf_store, key, filename=f"{doc.title}.pdf", disposition="attachment")
 
-    # Generate PDF if not exists
-    if not os.path.exists(pdf_path):
-        c = canvas.Canvas(pdf_path, pagesize=letter)
-        text = c.beginText(40, 750)
-        text.setFont("Helvetica", 10)
 
-        for line in doc.content.split("\n"):
-            text.textLine(line)
+# ------------------ EXTRACTION STATS ------------------
+@router.get("/extraction/stats")
+def extraction_stats():
+    return extractor.stats()
 
-        c.drawText(text)
-        c.save()
 
-    return FileResponse(pdf_path, media_type="application/pdf", filename=f"{doc.title}.pdf")
\ No newline at end of file
+# ------------------ DEDUP STATS ------------------
+@router.get("/dedup/stats")
+def dedup_stats():
+    return {"analysis": analysis_cache.stats(), "extraction": text_cache.stats()}
@@ -0,0 +1,125 @@
+import os
+import re
+import asyncio
+from typing import Callable
+
+from services.llm import gateway
+
+# Bump when prompts or chunking change; upload dedup keys include it
+ANALYSIS_PROMPT_VERSION = "mapreduce-v1"
+
+CHUNK_CHARS = int(os.getenv("ANALYSIS_CHUNK_CHARS", 6000))
+FAN_IN = int(os.getenv("ANALYSIS_FAN_IN", 4))
+MAX_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", 8))
+
+# Headings that start a new clause/section: "ARTICLE 3", "Section 2.1", "12. Term", "SCHEDULE A", "DEFINITIONS"
+SECTION_BREAK = re.compile(
+    r"\n(?=[ \t]*(?:"
+    r"(?:ARTICLE|Article|SECTION|Section|CLAUSE|Clause|SCHEDULE|Schedule|PART|Part)\b"
+    r"|\d+(?:\.\d+)*[.)]?[ \t]+[A-Z]"
+    r"|[A-Z][A-Z \-]{3,}[ \t]*\n"
+    r"))"
+)
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+SENTENCE_BREAK = re.compile(r"(?<=[.;:])\s+")
+
+MAP_PROMPT = (
+    "You are a legal analyst. You are reading part {index} of {total} of a longer legal document. "
+    "Summarise this part: parties, obligations, key dates and deadlines, amounts, termination, "
+    "liability and any unusual or risky terms. Quote clause numbers where present. Be concise."
+)
+REDUCE_PROMPT = (
+    "You are a legal analyst. Merge these partial analyses of consecutive parts of one legal document "
+    "into a single analysis. Remove repetition but keep every specific party, date, amount and clause reference."
+)
+FINAL_PROMPT = (
+    "You are a legal analyst. Produce the final analysis of this legal document with the sections: "
+    "Summary, Parties, Key Clauses, Obligations & Deadlines, Risks & Red Flags. Be specific and concise."
+)
+
+
+# ----------------------------
+# Chunking on clause / section boundaries
+# ----------------------------
+def _split(piece: str, max_chars: int) -> list:
+    if len(piece) <= max_chars:
+        return [piece]
+    for pattern in (PARAGRAPH_BREAK, SENTENCE_BREAK):
+        parts = [p for p in pattern.split(piece) if p.strip()]
+        if len(parts) > 1:
+            return [sub for p in parts for sub in _split(p, max_chars)]
+    return [piece[i:i + max_chars] for i in range(0, len(piece), max_chars)]
+
+
+def chunk_text(text: str, max_chars: int = CHUNK_CHARS) -> list:
+    sections = [s for s in SECTION_BREAK.split(text) if s.strip()]
+    pieces = [p for s in sections for p in _split(s, max_chars)]
+
+    # Greedily pack consecutive pieces so chunks are as full as possible without crossing max_chars
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+# ----------------------------
+# Map-reduce analysis
+# ----------------------------
+async def _ask(system: str, content: str, sem: asyncio.Semaphore) -> str:
+    async with sem:
+        return await gateway.complete(
+            [
+                {"role": "system", "content": system},
+                {"role": "user", "content": content},
+            ],
+            temperature=0.3,
+        )
+
+
+async def analyze_document(text: str, on_progress: Callable[[float], None] | None = None) -> str:
+    """Summarise chunks concurrently, then merge FAN_IN partials at a time until one remains,
+    so latency grows with log(len(text)) rather than linearly."""
+    chunks = chunk_text(text)
+    if not chunks:
+        return ""
+
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    if len(chunks) == 1:
+        return await _ask(FINAL_PROMPT, chunks[0], sem)
+
+    # Total LLM calls across map and reduce levels, for progress reporting
+    total, n = len(chunks), len(chunks)
+    while n > 1:
+        total += n // FAN_IN + (1 if n % FAN_IN > 1 else 0)
+        n = -(-n // FAN_IN)
+    done = 0
+
+    async def ask(prompt: str, body: str) -> str:
+        nonlocal done
+        result = await _ask(prompt, body, sem)
+        done += 1
+        if on_progress:
+            on_progress(done / total)
+        return result
+
+    partials = await asyncio.gather(*[
+        ask(MAP_PROMPT.format(index=i + 1, total=len(chunks)), chunk)
+        for i, chunk in enumerate(chunks)
+    ])
+
+    while len(partials) > 1:
+        groups = [partials[i:i + FAN_IN] for i in range(0, len(partials), FAN_IN)]
+        prompt = FINAL_PROMPT if len(groups) == 1 else REDUCE_PROMPT
+        # A trailing single-item group is carried up a level unchanged
+        partials = await asyncio.gather(*[
+            ask(prompt, "\n\n---\n\n".join(group)) if len(group) > 1 else asyncio.sleep(0, group[0])
+            for group in groups
+        ])
+
+    return partials[0]
@@ -0,0 +1,258 @@
+import os
+import re
+import json
+import time
+import zlib
+import tempfile
+import threading
+
+# Bump when the vectoriser changes; persisted entries are re-embedded on load anyway
+VECTORIZER_VERSION = "hashed-ngrams-v1"
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+# ----------------------------
+# Offline text vectoriser
+# ----------------------------
+class HashedNgramVectorizer:
+    """Char 3-5 grams plus word uni/bigrams, hashed (crc32, stable across processes) into `dim` signed buckets."""
+
+    def __init__(self, dim: int = 4096):
+        self.dim = dim
+
+    def features(self, text: str) -> list:
+        words = WORD.findall(text.casefold())
+        feats = [f"w:{w}" for w in words]
+        feats += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        joined = f" {' '.join(words)} "
+        for n in (3, 4, 5):
+            feats += [joined[i:i + n] for i in range(len(joined) - n + 1)]
+        return feats
+
+    def transform(self, texts: list):
+        import numpy as np
+
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feat in self.features(text):
+                h = zlib.crc32(feat.encode("utf-8"))
+                out[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+# ----------------------------
+# Partitioned, LRU-bounded answer cache
+# ----------------------------
+class Partition:
+    """Entries for one jurisdiction: a dense matrix of unit vectors and a parallel list of entries."""
+
+    def __init__(self, dim: int):
+        import numpy as np
+
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.entries: list = []
+
+    def add(self, vector, entry: dict):
+        import numpy as np
+
+        self.vectors = np.vstack([self.vectors, vector[None, :]])
+        self.entries.append(entry)
+
+    def remove(self, index: int):
+        # Swap-remove keeps the matrix dense
+        last = len(self.entries) - 1
+        if index != last:
+            self.vectors[index] = self.vectors[last]
+            self.entries[index] = self.entries[last]
+        self.vectors = self.vectors[:last]
+        self.entries.pop()
+
+    def nearest(self, vector) -> tuple[int, float]:
+        if not self.entries:
+            return -1, 0.0
+        scores = self.vectors @ vector
+        best = int(scores.argmax())
+        return best, float(scores[best])
+
+
+class SemanticAnswerCache:
+    """First-turn question -> answer, matched by cosine similarity within the same jurisdiction only.
+    Questions without a resolved jurisdiction are neither served nor stored: they could be about
+    any country outside data/laws, and answers must never cross jurisdictions."""
+
+    def __init__(
+        self,
+        path: str | None,
+        max_entries: int = 2000,
+        threshold: float = 0.9,
+        dim: int = 4096,
+        ttl: float = 7 * 24 * 3600,
+        save_every: int = 20,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.save_every = save_every
+        self.vectorizer = HashedNgramVectorizer(dim)
+        self._partitions: dict = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._loaded = False
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.stores = 0
+        self.evictions = 0
+        self.lookup_ms_total = 0.0
+
+    @classmethod
+    def from_env(cls) -> "SemanticAnswerCache | None":
+        """None unless CHAT_ANSWER_CACHE is on (the cache is opt-in)."""
+        if os.getenv("CHAT_ANSWER_CACHE", "0").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            os.getenv("CHAT_ANSWER_CACHE_PATH", "cache/chat_answers.json") or None,
+            max_entries=int(os.getenv("CHAT_ANSWER_CACHE_SIZE", 2000)),
+            threshold=float(os.getenv("CHAT_ANSWER_CACHE_THRESHOLD", 0.9)),
+            dim=int(os.getenv("CHAT_ANSWER_CACHE_DIM", 4096)),
+            ttl=float(os.getenv("CHAT_ANSWER_CACHE_TTL", 7 * 24 * 3600)),
+        )
+
+    def _partition(self, jurisdiction: str) -> Partition:
+        part = self._partitions.get(jurisdiction)
+        if part is None:
+            part = self._partitions[jurisdiction] = Partition(self.vectorizer.dim)
+        return part
+
+    def __len__(self) -> int:
+        return sum(len(p.entries) for p in self._partitions.values())
+
+    # ---------- lookup / store ----------
+    def lookup(self, question: str, jurisdiction: str | None) -> dict | None:
+        if not jurisdiction:
+            self.skipped += 1
+            return None
+        start = time.perf_counter()
+        self.load()
+        vector = self.vectorizer.transform([question])[0]
+        with self._lock:
+            part = self._partitions.get(jurisdiction)
+            index, score = part.nearest(vector) if part else (-1, 0.0)
+            entry = part.entries[index] if index >= 0 else None
+            if entry is not None and entry["created_at"] + self.ttl < time.time():
+                part.remove(index)
+                entry = None
+            if entry is None or score < self.threshold:
+                self.misses += 1
+                entry = None
+            else:
+                self.hits += 1
+                entry["last_used"] = time.time()
+                entry["hits"] += 1
+        self.lookup_ms_total += (time.perf_counter() - start) * 1000
+        return {**entry, "similarity": round(score, 4)} if entry else None
+
+    def store(self, question: str, answer: str, jurisdiction: str | None):
+        if not jurisdiction:
+            return
+        self.load()
+        vector = self.vectorizer.transform([question])[0]
+        now = time.time()
+        with self._lock:
+            part = self._partition(jurisdiction)
+            index, score = part.nearest(vector)
+            if index >= 0 and score >= self.threshold:
+                # Same question again: refresh the answer instead of adding a near-duplicate
+                part.entries[index].update(answer=answer, created_at=now, last_used=now)
+            else:
+                part.add(vector, {
+                    "question": question,
+                    "answer": answer,
+                    "jurisdiction": jurisdiction,
+                    "created_at": now,
+                    "last_used": now,
+                    "hits": 0,
+                })
+                self._evict()
+            self.stores += 1
+            self._unsaved += 1
+            due = self.path and self._unsaved >= self.save_every
+        if due:
+            self.save()
+
+    def _evict(self):
+        while len(self) > self.max_entries:
+            key, index = min(
+                ((k, i) for k, p in self._partitions.items() for i in range(len(p.entries))),
+                key=lambda ki: self._partitions[ki[0]].entries[ki[1]]["last_used"],
+            )
+            self._partitions[key].remove(index)
+            self.evictions += 1
+
+    # ---------- persistence ----------
+    def load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not self.path or not os.path.exists(self.path):
+                return
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    entries = json.load(f).get("entries", [])
+            except Exception as e:
+                print("⚠️ Could not load chat answer cache:", e)
+                return
+            now = time.time()
+            entries = [e for e in entries if e.get("jurisdiction") and e["created_at"] + self.ttl >= now]
+            entries.sort(key=lambda e: e["last_used"])
+            entries = entries[-self.max_entries:]
+            if entries:
+                vectors = self.vectorizer.transform([e["question"] for e in entries])
+                for vector, entry in zip(vectors, entries):
+                    self._partition(entry["jurisdiction"]).add(vector, entry)
+            print(f"💬 Loaded {len(entries)} cached chat answers")
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            entries = [dict(e) for p in self._partitions.values() for e in p.entries]
+            self._unsaved = 0
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # A unique temp file per save, so concurrent saves (threads or workers) never interleave
+        with self._save_lock:
+            fd, tmp = tempfile.mkstemp(prefix=".chat_answers.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"vectorizer": VECTORIZER_VERSION, "entries": entries}, f, ensure_ascii=False)
+                os.replace(tmp, self.path)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+    # ---------- stats ----------
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "partitions": {k: len(p.entries) for k, p in self._partitions.items()},
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped_no_jurisdiction": self.skipped,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "avg_lookup_ms": round(self.lookup_ms_total / lookups, 3) if lookups else 0.0,
+        }
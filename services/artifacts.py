@@ -0,0 +1,263 @@
+import os
+import asyncio
+import hashlib
+import threading
+import time
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+# How often a response following an in-progress render checks for newly written pages
+FOLLOW_POLL_SECONDS = 0.05
+
+
+def content_key(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part if part is not None else "").encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+# ----------------------------
+# Content-addressed artifact store
+# ----------------------------
+class ArtifactStore:
+    """Files named by content hash, written atomically and LRU-evicted under a disk budget.
+
+    Several worker processes can share one directory: recency is kept in the files' mtime and
+    the directory is rescanned before evicting, so the budget holds for the directory as a whole."""
+
+    def __init__(self, root: str, max_bytes: int, suffix: str = ".pdf"):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._index: dict = {}  # key -> (size, last_access), as of the last scan in this process
+        self.evictions = 0
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        index = {}
+        for entry in os.scandir(self.root):
+            try:
+                st = entry.stat()
+                if entry.name.endswith(".tmp"):
+                    # Leftover from an interrupted write (other workers' fresh temp files are left alone)
+                    if time.time() - st.st_mtime > 3600:
+                        os.remove(entry.path)
+                    continue
+            except FileNotFoundError:
+                continue  # committed or evicted by another worker meanwhile
+            if entry.name.endswith(self.suffix):
+                index[entry.name[: -len(self.suffix)]] = (st.st_size, st.st_mtime)
+        self._index = index
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}{self.suffix}")
+
+    def tmp_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+    def exists(self, key: str) -> bool:
+        try:
+            st = os.stat(self.path(key))
+        except FileNotFoundError:
+            self._index.pop(key, None)
+            return False
+        # Possibly rendered by another worker since our last scan
+        self._index.setdefault(key, (st.st_size, st.st_mtime))
+        return True
+
+    def touch(self, key: str):
+        """Record a use in the file's mtime, where every worker's eviction can see it."""
+        now = time.time()
+        try:
+            os.utime(self.path(key), (now, now))
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if key in self._index:
+                self._index[key] = (self._index[key][0], now)
+
+    def commit(self, key: str, tmp_path: str):
+        """Atomically move a fully written temp file into place, then enforce the budget."""
+        os.replace(tmp_path, self.path(key))
+        with self._lock:
+            self._scan()
+            self._evict(keep=key)
+
+    def _evict(self, keep: str):
+        total = sum(size for size, _ in self._index.values())
+        if total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._index.items(), key=lambda kv: kv[1][1]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self.path(key))
+                self.evictions += 1
+            except FileNotFoundError:
+                pass  # another worker evicted it first
+            del self._index[key]
+            total -= size
+
+    def stats(self) -> dict:
+        return {
+            "root": self.root,
+            "artifacts": len(self._index),
+            "bytes": sum(size for size, _ in self._index.values()),
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+# ----------------------------
+# Conditional + ranged file serving
+# ----------------------------
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int):
+    """Parse a single "bytes=start-end" range into (start, end) inclusive. Returns None when the
+    header should be ignored and the full body served (multiple ranges, malformed syntax);
+    raises RangeNotSatisfiable when a valid range lies entirely past the end of the file."""
+    if not header.startswith("bytes=") or "," in header:
+        return None
+    start, sep, end = header[6:].strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start == "":
+            length = int(end)
+            if length < 0:
+                return None
+            if length == 0 or size == 0:
+                raise RangeNotSatisfiable
+            return max(0, size - length), size - 1
+        first = int(start)
+        last = int(end) if end else None
+    except ValueError:
+        return None
+    if first < 0 or (last is not None and last < first):
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable
+    return first, size - 1 if last is None else min(last, size - 1)
+
+
+def iter_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def content_disposition(disposition: str, filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+
+def serve_artifact(request: Request, store: ArtifactStore, key: str, filename: str | None = None,
+                   media_type: str = "application/pdf", disposition: str = "inline") -> Response:
+    path = store.path(key)
+    size = os.path.getsize(path)
+    store.touch(key)
+
+    etag = f'"{key}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=0, must-revalidate",
+    }
+    if filename:
+        headers["Content-Disposition"] = content_disposition(disposition, filename)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(length)
+            return StreamingResponse(iter_file(path, start, length), status_code=206,
+                                     media_type=media_type, headers=headers)
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(iter_file(path, 0, size), media_type=media_type, headers=headers)
+
+
+# ----------------------------
+# Serving a render while it is still being written
+# ----------------------------
+async def follow_render(f, job: asyncio.Task):
+    """Yield what the render worker has flushed so far, then the rest as it arrives. The open
+    handle survives the temp file being committed (renamed) into the store."""
+    try:
+        while True:
+            finished = job.done()  # checked before reading, so the last read drains the file
+            chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+            if chunk:
+                yield chunk
+            elif finished:
+                break
+            else:
+                await asyncio.sleep(FOLLOW_POLL_SECONDS)
+    finally:
+        f.close()
+    if job.cancelled() or job.exception() is not None:
+        # Headers are long gone; the client sees a truncated PDF
+        print("⚠️ Streamed PDF render did not finish; response truncated")
+
+
+async def serve_rendering(request: Request, store: ArtifactStore, key: str, job: asyncio.Task,
+                          tmp_path: str | None, filename: str | None = None,
+                          media_type: str = "application/pdf", disposition: str = "inline") -> Response:
+    """Stream an artifact while its render job writes it, so the first bytes of a long
+    document go out after its first page instead of its last. Render errors before the
+    first byte propagate to the caller; once the file is complete it is served normally."""
+    f = None
+    while tmp_path and not job.done():
+        try:
+            f = open(tmp_path, "rb")
+            break
+        except FileNotFoundError:
+            await asyncio.sleep(FOLLOW_POLL_SECONDS)
+    if f is None:
+        await asyncio.shield(job)
+        return serve_artifact(request, store, key, filename=filename, media_type=media_type, disposition=disposition)
+
+    # No ETag until the artifact is committed: if the render fails mid-stream, a validator here
+    # would let clients revalidate the truncated copy (304) forever
+    headers = {"Cache-Control": "no-store"}
+    if filename:
+        headers["Content-Disposition"] = content_disposition(disposition, filename)
+    return StreamingResponse(follow_render(f, job), media_type=media_type, headers=headers)
+
+
+pdf_store = ArtifactStore(
+    os.getenv("ARTIFACT_DIR", "generated_pdfs"),
+    max_bytes=int(os.getenv("ARTIFACT_MAX_MB", 512)) * 1024 * 1024,
+)
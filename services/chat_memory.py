@@ -0,0 +1,266 @@
+import os
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from services.session_store import SessionStore, session_store_from_env
+
+# Rough token estimate (~4 chars per token for English legal text) plus per-message overhead
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+Summarizer = Callable[[str, list], Awaitable[str]]
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def message_tokens(messages: list) -> int:
+    return sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+# ----------------------------
+# Per-session state
+# ----------------------------
+class SessionMemory:
+    def __init__(self):
+        self.summary = ""
+        self.turns = []
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.summarised_messages = 0
+        self.dropped_messages = 0
+        self.last_prompt_tokens = 0
+        self.peak_prompt_tokens = 0
+        self.compacting = False
+        # Last country the user named; sticks for follow-ups that don't repeat it
+        self.jurisdiction: str | None = None
+        # Id of the last store event applied (persistent stores only)
+        self.seq = 0
+
+    def stats(self) -> dict:
+        return {
+            "jurisdiction": self.jurisdiction,
+            "messages": len(self.turns),
+            "turn_tokens": message_tokens(self.turns),
+            "summary_tokens": estimate_tokens(self.summary) if self.summary else 0,
+            "summarised_messages": self.summarised_messages,
+            "dropped_messages": self.dropped_messages,
+            "last_prompt_tokens": self.last_prompt_tokens,
+            "peak_prompt_tokens": self.peak_prompt_tokens,
+            "memory_bytes": sum(len(m["content"]) for m in self.turns) + len(self.summary),
+            "idle_seconds": round(time.time() - self.last_used, 1),
+        }
+
+
+# ----------------------------
+# Token-budgeted conversation memory
+# ----------------------------
+class ConversationMemory:
+    """Sliding window of recent turns plus a rolling summary of older ones, under a token budget."""
+
+    def __init__(
+        self,
+        system_prompt: str,
+        max_prompt_tokens: int = 3000,
+        window_messages: int = 8,
+        summary_max_tokens: int = 400,
+        max_sessions: int = 1000,
+        idle_ttl: float = 1800,
+        summarizer: Summarizer | None = None,
+        store: SessionStore | None = None,
+    ):
+        self.system_prompt = system_prompt
+        self.max_prompt_tokens = max_prompt_tokens
+        self.window_messages = window_messages
+        self.summary_max_tokens = summary_max_tokens
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.summarizer = summarizer
+        self.store = store or SessionStore()
+        self._sessions: OrderedDict = OrderedDict()
+        self.evicted_sessions = 0
+        self._last_purge = time.time()
+
+    @classmethod
+    def from_env(cls, system_prompt: str, summarizer: Summarizer | None = None) -> "ConversationMemory":
+        return cls(
+            system_prompt,
+            max_prompt_tokens=int(os.getenv("CHAT_MAX_PROMPT_TOKENS", 3000)),
+            window_messages=int(os.getenv("CHAT_WINDOW_MESSAGES", 8)),
+            summary_max_tokens=int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", 400)),
+            max_sessions=int(os.getenv("CHAT_MAX_SESSIONS", 1000)),
+            idle_ttl=float(os.getenv("CHAT_SESSION_TTL", 1800)),
+            summarizer=summarizer,
+            store=session_store_from_env(),
+        )
+
+    # ---------- session lifecycle ----------
+    def session(self, sid) -> SessionMemory:
+        self._evict_idle()
+        mem = self._sessions.get(sid)
+        if mem is None:
+            mem = SessionMemory()
+            self._sessions[sid] = mem
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted_sessions += 1
+        else:
+            self._sessions.move_to_end(sid)
+        mem.last_used = time.time()
+        return mem
+
+    def close(self, sid):
+        self._sessions.pop(sid, None)
+
+    def _evict_idle(self):
+        cutoff = time.time() - self.idle_ttl
+        # OrderedDict is kept in LRU order, so idle sessions sit at the front
+        while self._sessions:
+            sid, mem = next(iter(self._sessions.items()))
+            if mem.last_used >= cutoff:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted_sessions += 1
+
+    async def resume(self, sid) -> SessionMemory:
+        """Session state including events other workers appended since this one last looked.
+        A session evicted here, or started on another worker, is rebuilt from the store."""
+        mem = self.session(sid)
+        if self.store.persistent:
+            # Store calls run off the event loop: a busy shared file must not stall other sockets
+            events = await asyncio.to_thread(self.store.events_since, str(sid), mem.seq, self.idle_ttl)
+            self._replay(mem, events)
+            # Sessions nobody came back for are only dropped from the shared store here
+            if time.time() - self._last_purge > min(self.idle_ttl, 300):
+                self._last_purge = time.time()
+                await asyncio.to_thread(self.store.purge_expired, self.idle_ttl)
+        return mem
+
+    # ---------- event log ----------
+    @staticmethod
+    def _apply(mem: SessionMemory, kind: str, payload: dict):
+        if kind == "turn":
+            mem.turns.append({"role": payload["role"], "content": payload["content"]})
+        elif kind == "summary":
+            del mem.turns[: payload["folded"]]
+            if payload["summarised"]:
+                mem.summary = payload["summary"]
+                mem.summarised_messages += payload["folded"]
+            else:
+                mem.dropped_messages += payload["folded"]
+        elif kind == "jurisdiction":
+            mem.jurisdiction = payload["value"]
+
+    def _replay(self, mem: SessionMemory, events: list):
+        for event_id, kind, payload in events:
+            # Skip events already applied by a concurrent catch-up
+            if event_id > mem.seq:
+                self._apply(mem, kind, payload)
+                mem.seq = event_id
+
+    def _append_and_fetch(self, sid: str, kind: str, payload: dict, after: int) -> list:
+        self.store.append(sid, kind, payload)
+        return self.store.events_since(sid, after, self.idle_ttl)
+
+    async def _record(self, sid, kind: str, payload: dict):
+        """Append-only: persistent stores write the event, then replay it (with anything newer)."""
+        mem = self.session(sid)
+        if self.store.persistent:
+            events = await asyncio.to_thread(self._append_and_fetch, str(sid), kind, payload, mem.seq)
+            self._replay(mem, events)
+        else:
+            self._apply(mem, kind, payload)
+
+    # ---------- messages ----------
+    async def append(self, sid, role: str, content: str):
+        await self._record(sid, "turn", {"role": role, "content": content})
+
+    async def set_jurisdiction(self, sid, value: str | None):
+        if value != self.session(sid).jurisdiction:
+            await self._record(sid, "jurisdiction", {"value": value})
+
+    def build_prompt(self, sid, context: str | None = None) -> list:
+        mem = self.session(sid)
+        pinned = [{"role": "system", "content": self.system_prompt}]
+        if context:
+            pinned.append({"role": "system", "content": context})
+        if mem.summary:
+            pinned.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{mem.summary}",
+            })
+
+        # Hard cap: never send more than the budget, even if compaction is behind
+        budget = self.max_prompt_tokens - message_tokens(pinned)
+        window = []
+        used = 0
+        for msg in reversed(mem.turns):
+            cost = message_tokens([msg])
+            if window and used + cost > budget:
+                break
+            window.append(msg)
+            used += cost
+        window.reverse()
+
+        prompt = pinned + window
+        mem.last_prompt_tokens = message_tokens(prompt)
+        mem.peak_prompt_tokens = max(mem.peak_prompt_tokens, mem.last_prompt_tokens)
+        return prompt
+
+    def needs_compaction(self, sid) -> bool:
+        mem = self._sessions.get(sid)
+        if mem is None or mem.compacting:
+            return False
+        if len(mem.turns) > self.window_messages:
+            return True
+        pinned = estimate_tokens(self.system_prompt) + estimate_tokens(mem.summary)
+        return pinned + message_tokens(mem.turns) > self.max_prompt_tokens
+
+    async def compact(self, sid):
+        """Fold turns that fell out of the window into the rolling summary."""
+        if not self.needs_compaction(sid):
+            return
+        mem = self._sessions[sid]
+        keep = min(self.window_messages, len(mem.turns))
+        old = mem.turns[: len(mem.turns) - keep]
+        if not old:
+            return
+
+        mem.compacting = True
+        try:
+            summary = None
+            if self.summarizer:
+                try:
+                    summary = await self.summarizer(mem.summary, old)
+                except Exception as e:
+                    print("⚠️ Chat summarisation failed, dropping old turns:", e)
+
+            # New turns may have been appended while summarising; only drop what was folded
+            await self._record(sid, "summary", {
+                "folded": len(old),
+                "summarised": bool(summary),
+                "summary": summary.strip()[: self.summary_max_tokens * CHARS_PER_TOKEN] if summary else mem.summary,
+            })
+        finally:
+            mem.compacting = False
+
+    # ---------- stats ----------
+    def stats(self, sid=None) -> dict:
+        """Aggregates, or one session's window and prompt sizes when given its id."""
+        if sid is not None:
+            mem = self._sessions.get(sid)
+            return mem.stats() if mem else {}
+        # Aggregates only: session ids are resumable tokens and must not be listed
+        sessions = [m.stats() for m in self._sessions.values()]
+        return {
+            "active_sessions": len(sessions),
+            "evicted_sessions": self.evicted_sessions,
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "peak_prompt_tokens": max((s["peak_prompt_tokens"] for s in sessions), default=0),
+            "messages": sum(s["messages"] for s in sessions),
+            "store": self.store.stats(),
+            "memory_bytes": sum(s["memory_bytes"] for s in sessions),
+        }
@@ -0,0 +1,55 @@
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Document
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Listing never touches the (potentially huge) content column
+LIST_COLUMNS = (Document.id, Document.title, Document.user_id, Document.created_at, Document.signer_name)
+
+
+def page_size(limit: int | None) -> int:
+    return max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+
+# ----------------------------
+# Keyset-paginated metadata listing
+# ----------------------------
+async def list_page(db: AsyncSession, user_id: str | None, cursor: int | None, limit: int):
+    """Return (rows, next_cursor). Rows are newest first; pass next_cursor back to continue."""
+    query = select(*LIST_COLUMNS)
+    if user_id:
+        query = query.where(Document.user_id == user_id)
+    if cursor:
+        query = query.where(Document.id < cursor)
+    query = query.order_by(Document.id.desc()).limit(limit + 1)
+
+    rows = (await db.execute(query)).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+# ----------------------------
+# Cheap total estimate
+# ----------------------------
+async def estimate_total(db: AsyncSession, user_id: str | None) -> int:
+    query = select(Document.id)
+    if user_id:
+        query = query.where(Document.user_id == user_id)
+
+    if db.bind.dialect.name != "postgresql":
+        return (await db.execute(select(func.count()).select_from(query.subquery()))).scalar_one()
+
+    if not user_id:
+        # Planner statistics, no table scan (-1 until the table is first analysed)
+        result = await db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'documents'::regclass")
+        )
+        return max(0, int(result.scalar_one()))
+
+    plan = (await db.execute(
+        text("EXPLAIN (FORMAT JSON) SELECT id FROM documents WHERE user_id = :uid"), {"uid": user_id}
+    )).scalar_one()
+    return int(plan[0]["Plan"]["Plan Rows"])
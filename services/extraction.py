@@ -0,0 +1,207 @@
+import os
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+
+from services.ingest import IngestedFile
+from services.metrics import stage
+
+
+# ----------------------------
+# Worker side
+# ----------------------------
+def _open_pdf(source: tuple):
+    import fitz
+
+    kind, value = source
+    if kind == "path":
+        return fitz.open(value)
+    return fitz.open(stream=value, filetype="pdf")
+
+
+def pdf_page_count(source: tuple) -> int:
+    with _open_pdf(source) as pdf:
+        return pdf.page_count
+
+
+def extract_pdf_pages(source: tuple, start: int, end: int) -> tuple:
+    began = time.process_time()
+    with _open_pdf(source) as pdf:
+        text = "".join(pdf[i].get_text() for i in range(start, end))
+    return start, text, time.process_time() - began
+
+
+def extract_docx(source: tuple) -> tuple:
+    import io
+    from docx import Document as DocxReader
+
+    began = time.process_time()
+    kind, value = source
+    doc = DocxReader(value if kind == "path" else io.BytesIO(value))
+    text = "\n".join(p.text for p in doc.paragraphs)
+    return 0, text, time.process_time() - began
+
+
+# ----------------------------
+# Event-loop side
+# ----------------------------
+class ExtractionService:
+    """Splits PDFs into page ranges and extracts them in parallel worker processes."""
+
+    def __init__(self, workers: int, pages_per_task: int = 16, max_pages: int = 1000, timeout: float = 120):
+        self.workers = workers
+        self.pages_per_task = pages_per_task
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self._executor: ProcessPoolExecutor | None = None
+        self.jobs = 0
+        self.timeouts = 0
+        self.recycles = 0
+        self.pages = 0
+        self.worker_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    @classmethod
+    def from_env(cls) -> "ExtractionService":
+        return cls(
+            workers=int(os.getenv("EXTRACT_WORKERS", os.cpu_count() or 1)),
+            pages_per_task=int(os.getenv("EXTRACT_PAGES_PER_TASK", 16)),
+            max_pages=int(os.getenv("EXTRACT_MAX_PAGES", 1000)),
+            timeout=float(os.getenv("EXTRACT_TIMEOUT", 120)),
+        )
+
+    def start(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """Kill a pool whose worker overran the deadline: a dropped future doesn't stop the parse,
+        which would otherwise keep a core and a pool slot. Other extractions on it fail fast."""
+        if self._executor is not executor:
+            return  # already replaced by a sibling task that timed out too
+        self._executor = None
+        self.recycles += 1
+        # ProcessPoolExecutor has no public way to kill busy workers before Python 3.14
+        terminate = getattr(executor, "terminate_workers", None)
+        if terminate is not None:
+            terminate()
+        else:
+            for process in list(getattr(executor, "_processes", {}).values()):
+                process.terminate()
+            executor.shutdown(wait=False, cancel_futures=True)
+        print(f"⚠️ Extraction pool recycled after a timeout ({self.recycles} so far)")
+
+    @staticmethod
+    def _read_text(upload: IngestedFile) -> str:
+        with upload.open() as f:
+            return f.read().decode("utf-8", errors="ignore")
+
+    @staticmethod
+    def _source(upload: IngestedFile) -> tuple:
+        # Small uploads are shipped to workers as bytes; spooled ones are reopened from disk
+        if upload.in_memory:
+            return "bytes", bytes(upload.getbuffer())
+        return "path", upload.path
+
+    async def _run(self, fn, *args, deadline: float):
+        loop = asyncio.get_running_loop()
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+        executor = self.start()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(executor, fn, *args), remaining)
+        except asyncio.TimeoutError:
+            self._recycle(executor)
+            raise
+
+    async def iter_text(self, upload: IngestedFile) -> AsyncIterator[str]:
+        """Yield extracted text in document order as soon as each leading page range is ready."""
+        loop = asyncio.get_running_loop()
+        began = loop.time()
+        deadline = began + self.timeout
+        self.jobs += 1
+
+        if upload.ext == ".txt":
+            # Up to MAX_FILE_SIZE, possibly from a spooled file: read off the event loop
+            yield await asyncio.to_thread(self._read_text, upload)
+            return
+
+        source = self._source(upload)
+        tasks = []
+        try:
+            if upload.ext == ".docx":
+                _, text, seconds = await self._run(extract_docx, source, deadline=deadline)
+                self.worker_seconds += seconds
+                yield text
+                return
+
+            if upload.ext != ".pdf":
+                raise HTTPException(400, "Unsupported file type")
+
+            page_count = await self._run(pdf_page_count, source, deadline=deadline)
+            if page_count > self.max_pages:
+                raise HTTPException(400, f"Document exceeds {self.max_pages} pages")
+
+            tasks = [
+                asyncio.ensure_future(
+                    self._run(extract_pdf_pages, source, start, min(start + self.pages_per_task, page_count),
+                              deadline=deadline)
+                )
+                for start in range(0, page_count, self.pages_per_task)
+            ]
+
+            # Emit ranges strictly in order, buffering any that finish early
+            for task in tasks:
+                _, text, seconds = await task
+                self.worker_seconds += seconds
+                yield text
+            self.pages += page_count
+
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPException(504, "Document extraction timed out")
+        except BrokenProcessPool:
+            # The pool was recycled under this extraction because another one timed out
+            raise HTTPException(503, "Document extraction was interrupted, try again")
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # mark retrieved; the first failure already propagated
+            self.wall_seconds += loop.time() - began
+
+    async def extract(self, upload: IngestedFile) -> str:
+        with stage("extract"):
+            return "".join([part async for part in self.iter_text(upload)])
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self._executor is not None,
+            "jobs": self.jobs,
+            "timeouts": self.timeouts,
+            "recycles": self.recycles,
+            "pages": self.pages,
+            "worker_seconds": round(self.worker_seconds, 3),
+            "wall_seconds": round(self.wall_seconds, 3),
+            "pages_per_second_per_core": round(self.pages / self.worker_seconds, 1) if self.worker_seconds else 0.0,
+        }
+
+
+extractor = ExtractionService.from_env()
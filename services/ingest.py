@@ -0,0 +1,181 @@
+import os
+import io
+import json
+import hashlib
+import tempfile
+
+from fastapi import HTTPException, UploadFile
+
+CHUNK_SIZE = 64 * 1024
+# Uploads up to this size stay in memory; larger ones roll over to a temp file
+SPOOL_MAX_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", 1024 * 1024))
+SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+
+
+# ----------------------------
+# Spooled upload buffer
+# ----------------------------
+class IngestedFile:
+    """Upload bytes held in memory, or in a named temp file once past SPOOL_MAX_BYTES."""
+
+    def __init__(self, filename: str, ext: str):
+        self.filename = filename
+        self.ext = ext
+        self.size = 0
+        self.sha256 = ""
+        self.path: str | None = None
+        self._memory = io.BytesIO()
+        self._file = None
+
+    @property
+    def in_memory(self) -> bool:
+        return self.path is None
+
+    def write(self, chunk: bytes):
+        if self._file is None and self.size + len(chunk) > SPOOL_MAX_BYTES:
+            self._rollover()
+        (self._file or self._memory).write(chunk)
+        self.size += len(chunk)
+
+    def _rollover(self):
+        self._file = tempfile.NamedTemporaryFile(prefix="upload_", suffix=self.ext, dir=SPOOL_DIR, delete=False)
+        self.path = self._file.name
+        self._file.write(self._memory.getbuffer())
+        self._memory = io.BytesIO()
+
+    def finish(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def getbuffer(self) -> memoryview:
+        return self._memory.getbuffer()
+
+    def open(self):
+        """Binary file object positioned at the start, for extractors that take a stream."""
+        if self.path:
+            return open(self.path, "rb")
+        return io.BytesIO(self._memory.getvalue())
+
+    def persist(self, path: str):
+        """Move the bytes to a durable path (e.g. a job spool) that this object then owns."""
+        self.finish()
+        if self.path:
+            os.replace(self.path, path)
+        else:
+            with open(path, "wb") as f:
+                f.write(self._memory.getbuffer())
+            self._memory = io.BytesIO()
+        self.path = path
+
+    @classmethod
+    def from_path(cls, path: str, filename: str, sha256: str) -> "IngestedFile":
+        """Re-open a persisted upload, e.g. when a queued job resumes after a restart."""
+        ingested = cls(filename, os.path.splitext(path)[1].lower())
+        ingested.path = path
+        ingested.size = os.path.getsize(path)
+        ingested.sha256 = sha256
+        return ingested
+
+    def close(self):
+        self.finish()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+        self._memory = io.BytesIO()
+
+
+async def ingest_upload(file: UploadFile, allowed_extensions: set, max_bytes: int) -> IngestedFile:
+    """Read the upload in chunks, hashing as it goes and aborting as soon as max_bytes is crossed."""
+    ext = os.path.splitext(file.filename or "")[1].lower()
+    if ext not in allowed_extensions:
+        raise HTTPException(400, "Only PDF, DOCX, TXT allowed")
+
+    ingested = IngestedFile(file.filename, ext)
+    digest = hashlib.sha256()
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if ingested.size + len(chunk) > max_bytes:
+                raise HTTPException(400, "File too large")
+            digest.update(chunk)
+            ingested.write(chunk)
+        ingested.finish()
+    except BaseException:
+        ingested.close()
+        raise
+
+    if not ingested.size:
+        ingested.close()
+        raise HTTPException(400, "Empty file")
+
+    ingested.sha256 = digest.hexdigest()
+    return ingested
+
+
+# ----------------------------
+# Early rejection before the body is parsed
+# ----------------------------
+class UploadTooLarge(HTTPException):
+    # An HTTPException so FastAPI's body parsing re-raises it as a 413 instead of a generic 400
+    def __init__(self):
+        super().__init__(413, "File too large")
+
+
+class UploadLimitMiddleware:
+    """Reject oversized request bodies on upload paths from Content-Length, or mid-stream for chunked bodies."""
+
+    def __init__(self, app, path_prefix: str, max_bytes: int):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise UploadTooLarge()
+            return message
+
+        async def tracked_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except UploadTooLarge:
+            if not started:
+                await self._reject(send)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": "File too large"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
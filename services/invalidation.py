@@ -0,0 +1,63 @@
+import asyncio
+from typing import Callable
+
+from sqlalchemy import text
+
+
+# ----------------------------
+# Cross-worker cache invalidation
+# ----------------------------
+class InvalidationChannel:
+    """Default channel: invalidations stay inside this worker (other workers rely on their TTL)."""
+
+    async def start(self, on_message: Callable[[str | None], None]):
+        pass
+
+    async def publish(self, db, key: str):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class PostgresNotifyChannel(InvalidationChannel):
+    """LISTEN/NOTIFY fan-out. publish() runs inside the writer's transaction, so peers hear it on commit."""
+
+    def __init__(self, dsn: str, channel: str):
+        self.dsn = dsn
+        self.channel = channel
+        self._task: asyncio.Task | None = None
+        self.received = 0
+
+    async def start(self, on_message):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen(on_message))
+
+    async def _listen(self, on_message):
+        import psycopg
+
+        delay = 1.0
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.dsn, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {self.channel}")
+                    # Anything published while we were disconnected was missed: flush everything
+                    on_message(None)
+                    delay = 1.0
+                    async for notify in conn.notifies():
+                        self.received += 1
+                        on_message(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Invalidation listener on '{self.channel}' dropped, retrying:", e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    async def publish(self, db, key: str):
+        await db.execute(text("SELECT pg_notify(:channel, :key)"), {"channel": self.channel, "key": key})
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,424 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from typing import Awaitable, Callable
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+# Minimum gap between progress writes for one job
+PROGRESS_INTERVAL = 0.25
+
+
+# ----------------------------
+# Persistent job state (SQLite, WAL), shared by every worker process on the host
+# ----------------------------
+class JobStore:
+    COLUMNS = (
+        "id", "status", "stage", "progress", "payload", "result", "error", "created_at", "updated_at",
+        "owner", "lease_until", "attempts",
+    )
+    # Added after the first release; ALTERed into existing databases
+    LATE_COLUMNS = {"owner": "TEXT", "lease_until": "REAL", "attempts": "INTEGER NOT NULL DEFAULT 0"}
+
+    def __init__(self, path: str, table: str = "jobs"):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT, progress REAL NOT NULL, "
+            "payload TEXT NOT NULL, result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+        for column, ddl in self.LATE_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_status ON {table} (status, created_at)")
+        self._conn.commit()
+
+    def _row(self, row) -> dict | None:
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def put(self, job: dict):
+        values = dict(job, payload=json.dumps(job["payload"]), result=json.dumps(job["result"]) if job["result"] else None)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                tuple(values[c] for c in self.COLUMNS),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM {self.table} WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row(row)
+
+    def claim(self, owner: str, lease: float, max_attempts: int) -> tuple[dict | None, int]:
+        """Atomically take the oldest queued job, or a running one whose owner stopped renewing
+        its lease. One statement, so concurrent workers can never claim the same row.
+
+        Expired jobs that already used max_attempts are failed instead (their input probably
+        crashes the worker). Returns (job or None, number of jobs given up on)."""
+        now = time.time()
+        with self._lock:
+            abandoned = self._conn.execute(
+                f"UPDATE {self.table} SET status = ?, owner = NULL, lease_until = NULL, updated_at = ?, "
+                "error = 'Gave up after ' || attempts || ' attempts: the worker stopped while running it' "
+                "WHERE status = ? AND (lease_until IS NULL OR lease_until < ?) AND attempts >= ?",
+                (FAILED, now, RUNNING, now, max_attempts),
+            ).rowcount
+            row = self._conn.execute(
+                f"UPDATE {self.table} SET status = ?, owner = ?, lease_until = ?, attempts = attempts + 1, "
+                "stage = NULL, progress = 0, updated_at = ? "
+                f"WHERE id = (SELECT id FROM {self.table} WHERE status = ? "
+                "OR (status = ? AND (lease_until IS NULL OR lease_until < ?)) ORDER BY created_at LIMIT 1) "
+                f"RETURNING {', '.join(self.COLUMNS)}",
+                (RUNNING, owner, now + lease, now, QUEUED, RUNNING, now),
+            ).fetchone()
+            self._conn.commit()
+        return self._row(row), abandoned
+
+    def update(self, job: dict, owner: str) -> bool:
+        """Write progress or the outcome; False if another worker has since taken the job over."""
+        result = json.dumps(job["result"]) if job["result"] else None
+        with self._lock:
+            cur = self._conn.execute(
+                f"UPDATE {self.table} SET status = ?, stage = ?, progress = ?, result = ?, error = ?, "
+                "updated_at = ?, lease_until = ? WHERE id = ? AND owner = ?",
+                (job["status"], job["stage"], job["progress"], result, job["error"],
+                 job["updated_at"], job["lease_until"], job["id"], owner),
+            )
+            self._conn.commit()
+            return cur.rowcount == 1
+
+    def release(self, owner: str) -> int:
+        """Hand this worker's running jobs back to the queue (clean shutdown, so not an attempt)."""
+        with self._lock:
+            cur = self._conn.execute(
+                f"UPDATE {self.table} SET status = ?, owner = NULL, lease_until = NULL, stage = NULL, progress = 0, "
+                "attempts = max(attempts - 1, 0) "
+                "WHERE status = ? AND owner = ?",
+                (QUEUED, RUNNING, owner),
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def queued(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT count(*) FROM {self.table} WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def purge_finished(self, older_than: float) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE status IN (?, ?) AND updated_at < ?",
+                (*FINISHED, time.time() - older_than),
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+
+# ----------------------------
+# Bounded worker pool with per-stage progress
+# ----------------------------
+class JobQueue:
+    """Jobs are persisted before they are acknowledged. Every worker process claims jobs from the
+    shared store under a lease it renews while running, so a job runs on one worker at a time and
+    one whose worker died is picked up again once its lease expires.
+
+    The handler receives the job payload and a progress(stage, fraction) callback and returns a
+    JSON-serialisable result. Stage and progress are persisted as they change, so any worker can
+    report them; subscribers get a snapshot on every state change.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[dict, Callable[[str, float], None]], Awaitable[dict]],
+        store: JobStore,
+        workers: int = 2,
+        max_depth: int = 100,
+        retention: float = 24 * 3600,
+        lease: float = 30,
+        poll: float = 1.0,
+        max_attempts: int = 3,
+    ):
+        self.name = name
+        self.handler = handler
+        self.store = store
+        self.workers = workers
+        self.max_depth = max_depth
+        self.retention = retention
+        self.lease = lease
+        self.poll = poll
+        self.max_attempts = max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._running = False
+        self._wakeup: asyncio.Event | None = None
+        self._depth = 0
+        self._tasks: list[asyncio.Task] = []
+        self._jobs: dict = {}  # jobs running in this process
+        self._subscribers: dict = defaultdict(set)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.resumed = 0
+        self.lost_leases = 0
+        self.abandoned = 0
+        self._stage_ms: dict = defaultdict(lambda: deque(maxlen=500))
+        self._wait_ms: deque = deque(maxlen=500)
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, handler, workers: int = 2, max_depth: int = 100) -> "JobQueue":
+        return cls(
+            name,
+            handler,
+            JobStore(os.getenv(f"{prefix}_JOB_DB", f"jobs/{name}.db")),
+            workers=int(os.getenv(f"{prefix}_JOB_WORKERS", workers)),
+            max_depth=int(os.getenv(f"{prefix}_JOB_QUEUE", max_depth)),
+            retention=float(os.getenv(f"{prefix}_JOB_RETENTION", 24 * 3600)),
+            lease=float(os.getenv(f"{prefix}_JOB_LEASE", 30)),
+            poll=float(os.getenv(f"{prefix}_JOB_POLL", 1.0)),
+            max_attempts=int(os.getenv(f"{prefix}_JOB_MAX_ATTEMPTS", 3)),
+        )
+
+    # ---------- lifecycle ----------
+    async def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._wakeup = asyncio.Event()
+        await asyncio.to_thread(self.store.purge_finished, self.retention)
+        self._depth = await asyncio.to_thread(self.store.queued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._running = False
+        # Interrupted jobs go straight back to the queue instead of waiting out their lease
+        released = await asyncio.to_thread(self.store.release, self.owner)
+        if released:
+            print(f"🔁 Released {released} {self.name} job(s) back to the queue")
+
+    @property
+    def depth(self) -> int:
+        """Queued jobs across all workers, as of this worker's last look at the store."""
+        return self._depth
+
+    # ---------- submit / inspect ----------
+    async def submit(self, payload: dict) -> dict:
+        if not self._running:
+            raise RuntimeError(f"{self.name} job queue is not running")
+        self._depth = await asyncio.to_thread(self.store.queued)
+        if self._depth >= self.max_depth:
+            raise OverflowError(f"{self.name} job queue is full")
+
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": QUEUED,
+            "stage": None,
+            "progress": 0.0,
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "owner": None,
+            "lease_until": None,
+            "attempts": 0,
+        }
+        await asyncio.to_thread(self.store.put, job)
+        self._depth += 1
+        self.submitted += 1
+        self._wakeup.set()
+        return self.snapshot(job)
+
+    async def get(self, job_id: str) -> dict | None:
+        job = self._jobs.get(job_id) or await asyncio.to_thread(self.store.get, job_id)
+        return self.snapshot(job) if job else None
+
+    def snapshot(self, job: dict) -> dict:
+        snap = {k: job[k] for k in ("id", "status", "stage", "result", "error", "created_at", "updated_at")}
+        snap["progress"] = round(job["progress"], 3)
+        if job["status"] == QUEUED and self._running:
+            snap["queue_depth"] = self.depth
+        return snap
+
+    async def subscribe(self, job_id: str):
+        """Yield snapshots until the job finishes. The first one is the current state. Jobs running
+        on another worker are followed by polling the store."""
+        updates: asyncio.Queue = asyncio.Queue()
+        # Register before reading state so no transition can slip in between
+        self._subscribers[job_id].add(updates)
+        try:
+            job = await self.get(job_id)
+            last = None
+            while job is not None:
+                if job != last:
+                    yield job
+                    last = job
+                if job["status"] in FINISHED:
+                    return
+                try:
+                    job = await asyncio.wait_for(updates.get(), timeout=self.poll)
+                except asyncio.TimeoutError:
+                    job = await self.get(job_id)
+        finally:
+            subs = self._subscribers.get(job_id)
+            if subs is not None:
+                subs.discard(updates)
+                if not subs:
+                    del self._subscribers[job_id]
+
+    # ---------- execution ----------
+    def _publish(self, job: dict):
+        job["updated_at"] = time.time()
+        snap = self.snapshot(job)
+        for updates in self._subscribers.get(job["id"], ()):
+            updates.put_nowait(snap)
+
+    async def _save(self, job: dict):
+        job["lease_until"] = time.time() + self.lease
+        if not await asyncio.to_thread(self.store.update, dict(job), self.owner):
+            self.lost_leases += 1
+            print(f"⚠️ {self.name} job {job['id']} was taken over by another worker")
+
+    async def _worker(self):
+        while True:
+            try:
+                self._wakeup.clear()
+                job, abandoned = await asyncio.to_thread(self.store.claim, self.owner, self.lease, self.max_attempts)
+                if abandoned:
+                    self.abandoned += abandoned
+                    print(f"⚠️ Gave up on {abandoned} {self.name} job(s) after {self.max_attempts} attempts")
+                self._depth = await asyncio.to_thread(self.store.queued)
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if job["attempts"] > 1:
+                    # Claimed again after its worker stopped or died; starts over from its spooled input
+                    self.resumed += 1
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ {self.name} worker error:", e)
+                await asyncio.sleep(self.poll)
+
+    async def _persist(self, job: dict, dirty: asyncio.Event, done: asyncio.Event):
+        """Single writer per job: coalesces progress writes and renews the lease, in order."""
+        while True:
+            try:
+                await asyncio.wait_for(dirty.wait(), timeout=self.lease / 3)
+            except asyncio.TimeoutError:
+                pass
+            if done.is_set():
+                return
+            dirty.clear()
+            await self._save(job)
+            try:
+                await asyncio.wait_for(done.wait(), timeout=PROGRESS_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, job: dict):
+        self._wait_ms.append((time.time() - job["created_at"]) * 1000)
+        self._jobs[job["id"]] = job
+        stage_started = time.perf_counter()
+        dirty, done = asyncio.Event(), asyncio.Event()
+
+        def progress(stage: str, fraction: float = 0.0):
+            nonlocal stage_started
+            if stage != job["stage"]:
+                now = time.perf_counter()
+                if job["stage"] is not None:
+                    self._stage_ms[job["stage"]].append((now - stage_started) * 1000)
+                stage_started = now
+                job["stage"] = stage
+            job["progress"] = max(0.0, min(1.0, fraction))
+            self._publish(job)
+            dirty.set()
+
+        self._publish(job)
+        persister = asyncio.create_task(self._persist(job, dirty, done))
+        try:
+            job["result"] = await self.handler(job["payload"], progress)
+            job["status"] = DONE
+            job["progress"] = 1.0
+            self.completed += 1
+        except asyncio.CancelledError:
+            persister.cancel()
+            self._jobs.pop(job["id"], None)
+            raise
+        except Exception as e:
+            job["status"] = FAILED
+            job["error"] = getattr(e, "detail", None) or str(e) or type(e).__name__
+            self.failed += 1
+        finally:
+            if job["stage"] is not None:
+                self._stage_ms[job["stage"]].append((time.perf_counter() - stage_started) * 1000)
+
+        # Let an in-progress write finish first so the final state is always written last
+        done.set()
+        dirty.set()
+        await persister
+        self._publish(job)
+        try:
+            # A shutdown arriving now must not turn a finished job back into a queued one
+            await asyncio.shield(self._save(job))
+        finally:
+            self._jobs.pop(job["id"], None)
+
+    # ---------- stats ----------
+    @staticmethod
+    def _summary(samples) -> dict:
+        ordered = sorted(samples)
+        if not ordered:
+            return {"count": 0}
+        return {
+            "count": len(ordered),
+            "avg_ms": round(sum(ordered) / len(ordered), 1),
+            "p50_ms": round(ordered[len(ordered) // 2], 1),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "workers": self.workers,
+            "queue_depth": self.depth,
+            "max_depth": self.max_depth,
+            "owner": self.owner,
+            "running": len(self._jobs),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "resumed": self.resumed,
+            "lost_leases": self.lost_leases,
+            "abandoned": self.abandoned,
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "queue_wait": self._summary(self._wait_ms),
+            "stages": {stage: self._summary(samples) for stage, samples in self._stage_ms.items()},
+        }
@@ -0,0 +1,238 @@
+import os
+import re
+import glob
+import hashlib
+import json
+import math
+import time
+import threading
+from collections import Counter
+
+LAWS_DIR = os.getenv("LAWS_DIR", os.path.join(os.path.dirname(__file__), "../data/laws"))
+# How often (seconds) lookups check the data files for changes
+RELOAD_INTERVAL = float(os.getenv("LAWS_RELOAD_INTERVAL", 2))
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from how i in is it law laws legal of on or the to under what when with".split()
+)
+
+# Common names and codes; a country entry in the data may add its own under "aliases"
+BUILTIN_ALIASES = {
+    "United Kingdom": ["uk", "u.k.", "gb", "great britain", "britain", "england", "england and wales", "scotland", "wales"],
+    "United States": ["us", "u.s.", "usa", "u.s.a.", "america", "united states of america"],
+    "Pakistan": ["pk", "pak", "islamic republic of pakistan"],
+    "Australia": ["au", "aus", "commonwealth of australia"],
+    "United Arab Emirates": ["uae", "emirates"],
+    "India": ["in", "bharat"],
+    "Canada": ["ca"],
+}
+
+
+def tokenize(text: str) -> list:
+    return [t for t in TOKEN.findall(text.casefold()) if t not in STOPWORDS]
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(TOKEN.findall(name.casefold()))
+
+
+# ----------------------------
+# Per-country BM25 index
+# ----------------------------
+class SnippetIndex:
+    """Okapi BM25 over one country's snippets. Postings are built once; a query touches only its terms."""
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, snippets: list):
+        self.snippets = snippets  # [(topic, text)]
+        self.postings: dict = {}
+        lengths = []
+        for i, (topic, text) in enumerate(snippets):
+            terms = Counter(tokenize(f"{topic} {text}"))
+            lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, []).append((i, tf))
+        self.lengths = lengths
+        avg = sum(lengths) / len(lengths) if lengths else 0.0
+        self.norms = [self.K1 * (1 - self.B + self.B * n / avg) if avg else self.K1 for n in lengths]
+        total = len(snippets)
+        self.idf = {
+            term: math.log(1 + (total - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in self.postings.items()
+        }
+
+    def search(self, query: str, k: int) -> list:
+        scores: dict = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.K1 + 1) / (tf + self.norms[i])
+        best = sorted(scores.items(), key=lambda s: -s[1])[:k]
+        return [self.snippets[i] for i, _ in best]
+
+
+class KnowledgeSnapshot:
+    """Immutable, fully built index; reloads build a new one and swap it in."""
+
+    def __init__(self, data: dict, signature: tuple, version: str = ""):
+        self.signature = signature
+        # Content hash, stable across processes; prompt caches key on it
+        self.version = version
+        self.general: dict = {}
+        self.indexes: dict = {}
+        self.aliases: dict = {}
+        for country, topics in data.items():
+            snippets = []
+            for topic, value in topics.items():
+                if topic == "aliases":
+                    continue
+                for text in value if isinstance(value, list) else [value]:
+                    if topic == "general":
+                        self.general.setdefault(country, []).append(text)
+                    else:
+                        snippets.append((topic, text))
+            self.indexes[country] = SnippetIndex(snippets)
+            for alias in [country, *BUILTIN_ALIASES.get(country, []), *topics.get("aliases", [])]:
+                self.aliases[normalize_name(alias)] = country
+        self.max_alias_words = max((len(a.split()) for a in self.aliases), default=1)
+        self.snippet_count = sum(len(ix.snippets) for ix in self.indexes.values()) + sum(
+            len(g) for g in self.general.values()
+        )
+
+
+# ----------------------------
+# Loader with hot reload
+# ----------------------------
+class JurisdictionKnowledge:
+    def __init__(self, directory: str, reload_interval: float = 2):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._snapshot: KnowledgeSnapshot | None = None
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._checked_at = 0.0
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_build_ms = 0.0
+        self.lookups = 0
+
+    def _files(self) -> list:
+        return sorted(glob.glob(os.path.join(self.directory, "*.json")))
+
+    def _signature(self) -> tuple:
+        sig = []
+        for path in self._files():
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            sig.append((path, st.st_mtime_ns, st.st_size))
+        return tuple(sig)
+
+    def _build(self, signature: tuple) -> KnowledgeSnapshot:
+        start = time.perf_counter()
+        data: dict = {}
+        digest = hashlib.sha256()
+        for path, _, _ in signature:
+            with open(path, "rb") as f:
+                raw = f.read()
+            digest.update(raw)
+            for country, topics in json.loads(raw).items():
+                data.setdefault(country, {}).update(topics)
+        snapshot = KnowledgeSnapshot(data, signature, digest.hexdigest()[:12])
+        self.last_build_ms = (time.perf_counter() - start) * 1000
+        return snapshot
+
+    def _reload(self, signature: tuple):
+        try:
+            snapshot = self._build(signature)
+            self._snapshot = snapshot
+            self.reloads += 1
+            print(f"📚 Loaded jurisdiction knowledge: {len(snapshot.indexes)} countries, "
+                  f"{snapshot.snippet_count} snippets in {self.last_build_ms:.1f} ms")
+        except Exception as e:
+            # Keep serving the previous snapshot if the edited file is broken
+            self.reload_errors += 1
+            print("⚠️ Jurisdiction knowledge reload failed:", e)
+        finally:
+            self._reloading = False
+
+    def snapshot(self) -> KnowledgeSnapshot:
+        """Current index. The first call builds it; later file changes rebuild in a background thread."""
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < self.reload_interval:
+            return self._snapshot
+
+        with self._lock:
+            if self._snapshot is None:
+                self._checked_at = now
+                self._snapshot = KnowledgeSnapshot({}, ())
+                self._reloading = True
+                self._reload(self._signature())
+                return self._snapshot
+            if now - self._checked_at >= self.reload_interval:
+                self._checked_at = now
+                signature = self._signature()
+                if signature != self._snapshot.signature and not self._reloading:
+                    self._reloading = True
+                    threading.Thread(target=self._reload, args=(signature,), daemon=True).start()
+        return self._snapshot
+
+    # ---------- lookups ----------
+    def resolve(self, country: str | None) -> str | None:
+        if not country:
+            return None
+        return self.snapshot().aliases.get(normalize_name(country))
+
+    def detect(self, text: str) -> str | None:
+        """First country named in free text (longest alias wins at each position)."""
+        snap = self.snapshot()
+        words = TOKEN.findall(text.casefold())
+        for i in range(len(words)):
+            for n in range(min(snap.max_alias_words, len(words) - i), 0, -1):
+                country = snap.aliases.get(" ".join(words[i:i + n]))
+                # Two-letter codes only count when written as such ("UK", not "us" the pronoun)
+                if country and (n > 1 or len(words[i]) > 2 or re.search(rf"\b{words[i].upper()}\b", text)):
+                    return country
+        return None
+
+    def context(self, country: str | None, query: str = "", k: int = 3, max_chars: int = 1500) -> str:
+        """General notes for the country plus the k snippets most relevant to the query."""
+        snap = self.snapshot()
+        name = snap.aliases.get(normalize_name(country)) if country else None
+        if name is None:
+            return ""
+        self.lookups += 1
+        lines = list(snap.general.get(name, []))
+        if query:
+            lines += [f"{topic}: {text}" for topic, text in snap.indexes[name].search(query, k)]
+        out, used = [], 0
+        for line in lines:
+            if used + len(line) > max_chars:
+                break
+            out.append(f"- {line}")
+            used += len(line)
+        return "\n".join(out)
+
+    def stats(self) -> dict:
+        snap = self._snapshot
+        return {
+            "directory": os.path.abspath(self.directory),
+            "loaded": snap is not None,
+            "version": snap.version if snap else None,
+            "countries": len(snap.indexes) if snap else 0,
+            "snippets": snap.snippet_count if snap else 0,
+            "aliases": len(snap.aliases) if snap else 0,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "last_build_ms": round(self.last_build_ms, 1),
+            "lookups": self.lookups,
+        }
+
+
+knowledge = JurisdictionKnowledge(LAWS_DIR, reload_interval=RELOAD_INTERVAL)
@@ -0,0 +1,259 @@
+import os
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator
+
+from dotenv import load_dotenv
+
+from services.metrics import stage
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+load_dotenv()
+
+
+def retryable_errors() -> tuple:
+    """Errors worth another attempt; 4xx other than 429 are returned to the caller as-is."""
+    # openai (and httpx) are imported on first use so they stay off the cold-start path
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+    return APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+
+# ----------------------------
+# Process-wide LLM gateway
+# ----------------------------
+class LLMGateway:
+    """One pooled AsyncOpenAI client per process, with per-model concurrency limits,
+    timeouts, jittered retries and optional hedged requests."""
+
+    def __init__(
+        self,
+        default_model: str = "gpt-4o-mini",
+        timeout: float = 60,
+        connect_timeout: float = 5,
+        max_retries: int = 2,
+        retry_base: float = 0.5,
+        retry_cap: float = 8,
+        max_concurrency: int = 16,
+        max_connections: int = 64,
+        hedge_after: float = 0,
+    ):
+        self.default_model = default_model
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.hedge_after = hedge_after
+        self._client: "AsyncOpenAI | None" = None
+        self._semaphores: dict = {}
+        self._in_flight: dict = {}  # model -> requests holding a slot
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "semaphore_wait_seconds": 0.0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "LLMGateway":
+        return cls(
+            default_model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+            timeout=float(os.getenv("LLM_TIMEOUT", 60)),
+            connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", 5)),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", 2)),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 16)),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 64)),
+            hedge_after=float(os.getenv("LLM_HEDGE_AFTER", 0)),
+        )
+
+    # ---------- client & limits ----------
+    @property
+    def configured(self) -> bool:
+        return bool(os.getenv("OPENAI_API_KEY"))
+
+    def client(self) -> "AsyncOpenAI":
+        if self._client is None:
+            import httpx
+            from openai import AsyncOpenAI
+
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise RuntimeError("OPENAI_API_KEY is not set")
+            http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            # OPENAI_BASE_URL is honoured by the SDK, which is how the fake server is wired in
+            self._client = AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+        return self._client
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(model)
+        if sem is None:
+            sem = self._semaphores[model] = asyncio.Semaphore(self.max_concurrency)
+        return sem
+
+    @asynccontextmanager
+    async def _slot(self, model: str):
+        sem = self._semaphore(model)
+        start = time.perf_counter()
+        async with sem:
+            self._stats["semaphore_wait_seconds"] += time.perf_counter() - start
+            self._in_flight[model] = self._in_flight.get(model, 0) + 1
+            try:
+                yield
+            finally:
+                self._in_flight[model] -= 1
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform over [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.retry_cap, self.retry_base * 2 ** attempt))
+
+    def _record_usage(self, usage):
+        if usage is None:
+            return
+        self._stats["prompt_tokens"] += usage.prompt_tokens or 0
+        self._stats["completion_tokens"] += usage.completion_tokens or 0
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    # ---------- non-streaming ----------
+    async def _attempt(self, model: str, messages: list, **kwargs) -> str:
+        async with self._slot(model):
+            res = await self.client().chat.completions.create(model=model, messages=messages, **kwargs)
+        self._record_usage(res.usage)
+        return (res.choices[0].message.content or "").strip()
+
+    async def _hedged(self, model: str, messages: list, hedge_after: float, **kwargs) -> str:
+        primary = asyncio.create_task(self._attempt(model, messages, **kwargs))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if done:
+                return primary.result()
+
+            # Only hedge when there is spare capacity; hedging a saturated model adds load to the tail
+            if self._semaphore(model).locked():
+                return await primary
+
+            self._stats["hedges"] += 1
+            backup = asyncio.create_task(self._attempt(model, messages, **kwargs))
+            pending = {primary, backup}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self._stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def complete(
+        self,
+        messages: list,
+        model: str | None = None,
+        hedge_after: float | None = None,
+        **kwargs,
+    ) -> str:
+        model = model or self.default_model
+        hedge_after = self.hedge_after if hedge_after is None else hedge_after
+        self._stats["requests"] += 1
+
+        with stage("llm"):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    if hedge_after > 0:
+                        return await self._hedged(model, messages, hedge_after, **kwargs)
+                    return await self._attempt(model, messages, **kwargs)
+                except retryable_errors():
+                    if attempt >= self.max_retries:
+                        self._stats["failures"] += 1
+                        raise
+                    self._stats["retries"] += 1
+                    await asyncio.sleep(self._backoff(attempt))
+                except Exception:
+                    self._stats["failures"] += 1
+                    raise
+
+    # ---------- streaming ----------
+    async def stream(
+        self, messages: list, model: str | None = None, usage: dict | None = None, **kwargs
+    ) -> AsyncIterator[str]:
+        """Yield text deltas. Retries only happen before the first token is produced;
+        closing the generator closes the upstream response and frees the model slot.
+        Pass a dict as `usage` to receive the token counts once the stream ends."""
+        model = model or self.default_model
+        self._stats["requests"] += 1
+
+        with stage("llm"):
+            async with self._slot(model):
+                attempt = 0
+                while True:
+                    try:
+                        stream = await self.client().chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            stream=True,
+                            stream_options={"include_usage": True},
+                            **kwargs,
+                        )
+                        break
+                    except retryable_errors():
+                        if attempt >= self.max_retries:
+                            self._stats["failures"] += 1
+                            raise
+                        self._stats["retries"] += 1
+                        await asyncio.sleep(self._backoff(attempt))
+                        attempt += 1
+
+                try:
+                    async for chunk in stream:
+                        if getattr(chunk, "usage", None):
+                            self._record_usage(chunk.usage)
+                            if usage is not None:
+                                usage.update(
+                                    prompt_tokens=chunk.usage.prompt_tokens or 0,
+                                    completion_tokens=chunk.usage.completion_tokens or 0,
+                                    total_tokens=chunk.usage.total_tokens or 0,
+                                )
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            yield delta
+                finally:
+                    await stream.close()
+
+    # ---------- stats ----------
+    def stats(self) -> dict:
+        return {
+            "default_model": self.default_model,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": dict(self._in_flight),
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in self._stats.items()},
+        }
+
+
+gateway = LLMGateway.from_env()
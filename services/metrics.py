@@ -0,0 +1,213 @@
+import os
+import time
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Requests slower than this (ms) keep a per-stage breakdown; 0 disables sampling
+SLOW_REQUEST_MS = float(os.getenv("METRICS_SLOW_MS", 0))
+SLOW_SAMPLES = int(os.getenv("METRICS_SLOW_SAMPLES", 100))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ----------------------------
+# Minimal Prometheus-style instruments
+# ----------------------------
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: dict = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in sorted(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._series: dict = {}
+
+    def observe(self, *labels, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = self.header()
+        names = self.labelnames + ("le",)
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(names, (*labels, _num(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+def render_value(name: str, help: str, value, kind: str = "gauge", labels: dict | None = None) -> list:
+    """One-off sample for values owned elsewhere (pool sizes, token counters)."""
+    if value is None:
+        return []
+    label_str = _labels(tuple(labels), tuple(labels.values())) if labels else ""
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name}{label_str} {_num(value)}"]
+
+
+# ----------------------------
+# Instruments
+# ----------------------------
+request_seconds = Histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"))
+requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being served", ("method",))
+websockets_open = Gauge("websocket_connections_open", "Open WebSocket connections")
+stage_seconds = Histogram("stage_duration_seconds", "Time spent per processing stage", ("stage",))
+stage_errors = Counter("stage_errors_total", "Stages that raised", ("stage",))
+
+INSTRUMENTS = (request_seconds, requests_in_flight, websockets_open, stage_seconds, stage_errors)
+
+# Per-request stage breakdown (stage -> ms); shared by tasks the request spawns
+_trace: ContextVar[dict | None] = ContextVar("metrics_trace", default=None)
+slow_requests: deque = deque(maxlen=SLOW_SAMPLES)
+
+
+def record_stage(name: str, seconds: float):
+    stage_seconds.observe(name, value=seconds)
+    trace = _trace.get()
+    if trace is not None:
+        # Concurrent work in one stage (e.g. map-reduce LLM calls) adds up, so it can exceed wall time
+        trace[name] = trace.get(name, 0.0) + seconds * 1000
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        stage_errors.inc(name)
+        raise
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def render_metrics(extra: list | None = None) -> str:
+    lines = []
+    for metric in INSTRUMENTS:
+        lines += metric.render()
+    lines += extra or []
+    return "\n".join(lines) + "\n"
+
+
+# ----------------------------
+# ASGI middleware: route latency, in-flight gauges, slow-request sampling
+# ----------------------------
+class MetricsMiddleware:
+    def __init__(self, app, exclude: tuple = ("/metrics",)):
+        self.app = app
+        self.exclude = exclude
+
+    @staticmethod
+    def _route(scope) -> str:
+        # FastAPI sets scope["route"] once matched; label by template so ids don't explode cardinality
+        route = scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+            return
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        trace = {}
+        token = _trace.set(trace)
+
+        async def tracked_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        requests_in_flight.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, tracked_send)
+        finally:
+            elapsed = time.perf_counter() - start
+            requests_in_flight.dec(method)
+            _trace.reset(token)
+            route = self._route(scope)
+            request_seconds.observe(method, route, str(status), value=elapsed)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                slow_requests.append({
+                    "at": time.time(),
+                    "method": method,
+                    "path": scope["path"],
+                    "route": route,
+                    "status": status,
+                    "duration_ms": round(elapsed * 1000, 1),
+                    "stages_ms": {k: round(v, 1) for k, v in trace.items()},
+                })
+
+    async def _websocket(self, scope, receive, send):
+        websockets_open.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            websockets_open.dec()
@@ -0,0 +1,353 @@
+import os
+import asyncio
+import copy
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from services.metrics import stage
+from services.pdf_stream import A4, LETTER, MM, PDFStreamWriter, PageFlow, TrueTypeFont
+
+FONT_DIR = os.path.join(os.path.dirname(__file__), "../fonts")
+FONT_FILES = {
+    "": os.path.join(FONT_DIR, "DejaVuSans.ttf"),
+    "B": os.path.join(FONT_DIR, "DejaVuSans-Bold.ttf"),
+    "I": os.path.join(FONT_DIR, "DejaVuSans-Oblique.ttf"),
+}
+
+# Per-worker-process FPDF instance holding the parsed DejaVu fonts
+_prototype = None
+# Per-worker-process DejaVu metrics for the paginated streaming renderer
+_stream_font = None
+
+
+def check_fonts():
+    for font_file in FONT_FILES.values():
+        if not os.path.exists(font_file):
+            print(f"⚠️ Missing font file: {font_file}")
+            raise FileNotFoundError(
+                "DejaVuSans.ttf / DejaVuSans-Bold.ttf / DejaVuSans-Oblique.ttf missing in backend/fonts/"
+            )
+
+
+# ----------------------------
+# Worker side
+# ----------------------------
+def load_fonts():
+    """Process-pool initializer: parse the TTFs once per worker instead of once per render."""
+    global _prototype
+    from fpdf import FPDF
+
+    check_fonts()
+    pdf = FPDF()
+    for style, path in FONT_FILES.items():
+        pdf.add_font("DejaVu", style, path, uni=True)
+    _prototype = pdf
+    stream_font()
+
+
+def stream_font() -> TrueTypeFont:
+    global _stream_font
+    if _stream_font is None:
+        _stream_font = TrueTypeFont(FONT_FILES[""], "DejaVuSans")
+    return _stream_font
+
+
+def new_pdf():
+    from fpdf import FPDF
+
+    if _prototype is None:
+        load_fonts()
+    pdf = FPDF()
+    # Share the parsed metrics, but give each document its own glyph subset
+    for key, font in _prototype.fonts.items():
+        pdf.fonts[key] = dict(font, subset=copy.deepcopy(font["subset"]))
+    for key, entry in _prototype.font_files.items():
+        pdf.font_files[key] = dict(entry)
+    return pdf
+
+
+# Bump when the layout changes so cached artifacts are re-rendered
+TEMPLATE_VERSION = "styled-v1"
+PAGED_TEMPLATE_VERSION = "styled-paged-v2"
+PLAIN_TEMPLATE_VERSION = "plain-v3"
+SIGNED_TEMPLATE_VERSION = "signed-v1"
+
+# Saved documents at least this long use the paginated streaming renderer instead of FPDF,
+# which builds the whole document in memory before writing it
+PAGED_MIN_CHARS = int(os.getenv("PDF_PAGED_MIN_CHARS", 20000))
+
+HEADER_FILL = (28, 33, 48)
+FOOTER_TEXT = "Generated by LawHelpZone AI — www.lawhelpzone.com"
+
+
+def _header(pdf, title: str, created_at: str, user_id: str | None):
+    # ----------------------------
+    # Header Section
+    # ----------------------------
+    pdf.set_fill_color(28, 33, 48)  # Dark header background
+    pdf.rect(0, 0, 210, 25, "F")
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font("DejaVu", "B", 16)
+    pdf.cell(0, 15, "LawHelpZone AI — Legal Document", ln=True, align="C")
+    pdf.ln(10)
+
+    # ----------------------------
+    # Document Info
+    # ----------------------------
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("DejaVu", "", 12)
+    pdf.cell(0, 10, f"📄 Document Title: {title}", ln=True)
+    pdf.cell(0, 10, f"🕒 Created on: {created_at}", ln=True)
+    if user_id:
+        pdf.cell(0, 10, f"👤 Created by: {user_id}", ln=True)
+    pdf.ln(6)
+
+    # ----------------------------
+    # Divider Line
+    # ----------------------------
+    pdf.set_draw_color(180, 180, 180)
+    pdf.set_line_width(0.3)
+    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+    pdf.ln(8)
+
+
+def _footer(pdf):
+    # ----------------------------
+    # Footer Watermark
+    # ----------------------------
+    pdf.set_y(-15)
+    pdf.set_font("DejaVu", "I", 9)
+    pdf.set_text_color(120)
+    pdf.cell(
+        0, 10, "Generated by LawHelpZone AI — www.lawhelpzone.com", 0, 0, "C"
+    )
+
+
+def render_document(pdf_path: str, title: str, content: str, user_id: str | None, created_at: str) -> dict:
+    start = time.perf_counter()
+    pdf = new_pdf()
+    pdf.add_page()
+    _header(pdf, title, created_at, user_id)
+
+    # ----------------------------
+    # Content Section
+    # ----------------------------
+    pdf.set_font("DejaVu", "", 11)
+    pdf.multi_cell(0, 8, content)
+    pdf.ln(12)
+
+    # ----------------------------
+    # Signature Placeholder
+    # ----------------------------
+    pdf.set_font("DejaVu", "I", 11)
+    pdf.cell(0, 10, "_________________________", ln=True)
+    pdf.cell(0, 8, "Authorized Signature", ln=True)
+    pdf.ln(8)
+
+    _footer(pdf)
+    pdf.output(pdf_path)
+
+    return {"path": pdf_path, "pages": pdf.page_no(), "render_ms": (time.perf_counter() - start) * 1000}
+
+
+def render_signed_document(
+    pdf_path: str,
+    title: str,
+    content: str,
+    created_at: str,
+    signer_name: str,
+    signature_path: str,
+    signed_at: str,
+) -> dict:
+    """Styled template with the signer's image and name in place of the signature placeholder."""
+    start = time.perf_counter()
+    pdf = new_pdf()
+    pdf.add_page()
+    _header(pdf, title, created_at, None)
+
+    # ----------------------------
+    # Content Section
+    # ----------------------------
+    pdf.set_font("DejaVu", "", 11)
+    pdf.multi_cell(0, 8, content)
+    pdf.ln(12)
+
+    # ----------------------------
+    # Signature Block (kept together on one page)
+    # ----------------------------
+    if pdf.get_y() > 297 - 70:
+        pdf.add_page()
+    pdf.image(signature_path, x=10, y=pdf.get_y(), w=60)
+    pdf.ln(32)
+    pdf.set_font("DejaVu", "I", 11)
+    pdf.cell(0, 10, "_________________________", ln=True)
+    pdf.set_font("DejaVu", "", 11)
+    pdf.cell(0, 8, f"Signed by: {signer_name}", ln=True)
+    pdf.cell(0, 8, f"Signed on: {signed_at}", ln=True)
+    pdf.ln(8)
+
+    _footer(pdf)
+    pdf.output(pdf_path)
+
+    return {"path": pdf_path, "pages": pdf.page_no(), "render_ms": (time.perf_counter() - start) * 1000}
+
+
+def render_paged_document(pdf_path: str, title: str, content: str, user_id: str | None, created_at: str) -> dict:
+    """The styled template for long documents: wrapped, paginated and written page by page,
+    with the footer (and a page number) on every page."""
+    start = time.perf_counter()
+    with open(pdf_path, "wb") as fh:
+        writer = PDFStreamWriter(fh, stream_font(), A4, title=title)
+
+        def decorate(flow: PageFlow):
+            flow.centered(flow.height - 9 * MM, f"{FOOTER_TEXT} · Page {flow.page_number}", 9,
+                          color=(120, 120, 120), italic=True)
+            if flow.page_number > 1:
+                return
+            # ----------------------------
+            # Header Section (first page)
+            # ----------------------------
+            flow.rect(0, 0, flow.width, 25 * MM, HEADER_FILL)
+            flow.centered(14 * MM, "LawHelpZone AI — Legal Document", 16, color=(255, 255, 255), bold=True)
+            flow.y = 30 * MM
+            flow.write_line(f"Document Title: {title}", 12, 10 * MM)
+            flow.write_line(f"Created on: {created_at}", 12, 10 * MM)
+            if user_id:
+                flow.write_line(f"Created by: {user_id}", 12, 10 * MM)
+            flow.space(6 * MM)
+            flow.line(10 * MM, flow.y, flow.width - 10 * MM, flow.y, (180, 180, 180), 0.3 * MM)
+            flow.space(8 * MM)
+
+        flow = PageFlow(writer, (10 * MM, 15 * MM, 10 * MM, 20 * MM), on_page=decorate)
+        flow.new_page()
+
+        # ----------------------------
+        # Content Section
+        # ----------------------------
+        flow.paragraphs(content, 11, 8 * MM)
+
+        # ----------------------------
+        # Signature Placeholder (kept together on one page)
+        # ----------------------------
+        flow.ensure(30 * MM)
+        flow.space(12 * MM)
+        flow.write_line("_________________________", 11, 10 * MM, italic=True)
+        flow.write_line("Authorized Signature", 11, 8 * MM, italic=True)
+        flow.close()
+
+    return {"path": pdf_path, "pages": writer.page_count, "render_ms": (time.perf_counter() - start) * 1000}
+
+
+def render_plain_document(pdf_path: str, content: str) -> dict:
+    start = time.perf_counter()
+    with open(pdf_path, "wb") as fh:
+        writer = PDFStreamWriter(fh, stream_font(), LETTER)
+        flow = PageFlow(writer, (40, 42, 40, 42))
+        flow.paragraphs(content, 10, 12)
+        flow.close()
+    return {"path": pdf_path, "pages": writer.page_count, "render_ms": (time.perf_counter() - start) * 1000}
+
+
+# ----------------------------
+# Event-loop side
+# ----------------------------
+class RenderService:
+    """Runs renders in a process pool; jobs for the same key are deduplicated while in flight."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+        self._jobs: dict = {}
+        self._outputs: dict = {}
+        self.completed = 0
+        self.failed = 0
+        self.render_ms_total = 0.0
+        self.render_ms_max = 0.0
+        self.wait_ms_total = 0.0
+
+    def start(self):
+        if self._executor is None:
+            check_fonts()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=load_fonts,
+            )
+        return self._executor
+
+    async def warm_up(self):
+        """Spawn every worker now so fonts are parsed before the first save, not during it."""
+        loop = asyncio.get_running_loop()
+        executor = self.start()
+        await asyncio.gather(*[loop.run_in_executor(executor, os.getpid) for _ in range(self.workers)])
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, key, fn, *args, store=None) -> asyncio.Task:
+        """Queue fn(out_path, *args) in the pool. With a store, the output goes to a temp file
+        that is committed atomically under `key` once the render succeeds."""
+        job = self._jobs.get(key)
+        if job is not None and not job.done():
+            return job
+
+        out_path = store.tmp_path(key) if store else None
+        job = asyncio.create_task(self._run(key, fn, args, store, out_path))
+        self._jobs[key] = job
+        self._outputs[key] = out_path
+        job.add_done_callback(lambda t: self._finished(key, t))
+        return job
+
+    def pending(self, key) -> asyncio.Task | None:
+        return self._jobs.get(key)
+
+    def output_path(self, key) -> str | None:
+        """Temp file an in-flight store-backed job is writing; readable while it grows."""
+        return self._outputs.get(key)
+
+    async def _run(self, key, fn, args, store, out_path):
+        loop = asyncio.get_running_loop()
+        enqueued = time.perf_counter()
+        call_args = (out_path, *args) if store else args
+        try:
+            with stage("render"):
+                result = await loop.run_in_executor(self.start(), fn, *call_args)
+            if store:
+                store.commit(key, out_path)
+        finally:
+            if out_path and os.path.exists(out_path):
+                os.remove(out_path)
+
+        self.completed += 1
+        self.render_ms_total += result["render_ms"]
+        self.render_ms_max = max(self.render_ms_max, result["render_ms"])
+        self.wait_ms_total += (time.perf_counter() - enqueued) * 1000 - result["render_ms"]
+        return result
+
+    def _finished(self, key, job: asyncio.Task):
+        if self._jobs.get(key) is job:
+            del self._jobs[key]
+            self._outputs.pop(key, None)
+        if job.cancelled():
+            self.failed += 1
+        elif job.exception() is not None:
+            self.failed += 1
+            print(f"⚠️ PDF render failed for {key}: {job.exception()}")
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self._executor is not None,
+            "queue_depth": len(self._jobs),
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_render_ms": round(self.render_ms_total / self.completed, 1) if self.completed else 0.0,
+            "max_render_ms": round(self.render_ms_max, 1),
+            "avg_queue_wait_ms": round(self.wait_ms_total / self.completed, 1) if self.completed else 0.0,
+        }
+
+
+renderer = RenderService(workers=int(os.getenv("RENDER_WORKERS", min(2, os.cpu_count() or 1))))
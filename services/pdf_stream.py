@@ -0,0 +1,497 @@
+import struct
+import hashlib
+import zlib
+
+# Page sizes in points
+A4 = (595.28, 841.89)
+LETTER = (612.0, 792.0)
+MM = 72 / 25.4
+
+# Tables a CIDFontType2 FontFile2 needs (PDF 32000 9.9); cmap, names and layout tables are not used
+SUBSET_TABLES = ("cvt ", "fpgm", "glyf", "head", "hhea", "hmtx", "loca", "maxp", "prep")
+
+
+class _Table(dict):
+    """Memo filled on first lookup; usable with map() and str.translate, which keeps the
+    per-character work of long documents in C."""
+
+    def __init__(self, compute):
+        super().__init__()
+        self.compute = compute
+
+    def __missing__(self, key):
+        value = self[key] = self.compute(key)
+        return value
+
+
+# ----------------------------
+# TrueType metrics (enough to lay out text and embed the font as a CID font)
+# ----------------------------
+class TrueTypeFont:
+    """Parsed once per process: glyph ids, advances and descriptor values. Each PDF embeds a
+    subset holding only the glyphs it used."""
+
+    def __init__(self, path: str, name: str):
+        self.path = path
+        self.name = name
+        with open(path, "rb") as f:
+            data = f.read()
+        tables = {}
+        num_tables = struct.unpack_from(">H", data, 4)[0]
+        for i in range(num_tables):
+            tag, _, offset, length = struct.unpack_from(">4sLLL", data, 12 + 16 * i)
+            tables[tag.decode("latin-1")] = (offset, length)
+
+        head = tables["head"][0]
+        self.units_per_em = struct.unpack_from(">H", data, head + 18)[0]
+        self.bbox = struct.unpack_from(">hhhh", data, head + 36)
+
+        hhea = tables["hhea"][0]
+        self.ascent, self.descent = struct.unpack_from(">hh", data, hhea + 4)
+        num_hmetrics = struct.unpack_from(">H", data, hhea + 34)[0]
+        hmtx = tables["hmtx"][0]
+        self.advances = [struct.unpack_from(">H", data, hmtx + 4 * i)[0] for i in range(num_hmetrics)]
+
+        self.cap_height = self.ascent
+        if "OS/2" in tables:
+            os2 = tables["OS/2"][0]
+            if struct.unpack_from(">H", data, os2)[0] >= 2:
+                self.cap_height = struct.unpack_from(">h", data, os2 + 88)[0]
+        self.italic_angle = 0.0
+        if "post" in tables:
+            self.italic_angle = struct.unpack_from(">l", data, tables["post"][0] + 4)[0] / 65536
+
+        self.cmap = self._parse_cmap(data, tables["cmap"][0])
+        self.data = data
+        self.tables = tables
+        self.num_glyphs = struct.unpack_from(">H", data, tables["maxp"][0] + 4)[0]
+        loca, _ = tables["loca"]
+        if struct.unpack_from(">h", data, head + 50)[0]:
+            self.loca = struct.unpack_from(f">{self.num_glyphs + 1}L", data, loca)
+        else:
+            self.loca = tuple(2 * v for v in struct.unpack_from(f">{self.num_glyphs + 1}H", data, loca))
+        self._widths = _Table(lambda char: self.advance(self.glyph(char)))
+
+    @staticmethod
+    def _parse_cmap(data: bytes, cmap: int) -> dict:
+        subtables = {}
+        for i in range(struct.unpack_from(">H", data, cmap + 2)[0]):
+            platform, encoding, offset = struct.unpack_from(">HHL", data, cmap + 4 + 8 * i)
+            subtables[(platform, encoding)] = cmap + offset
+
+        mapping = {}
+        if (3, 10) in subtables:
+            table = subtables[(3, 10)]
+            groups = struct.unpack_from(">L", data, table + 12)[0]
+            for g in range(groups):
+                start, end, glyph = struct.unpack_from(">LLL", data, table + 16 + 12 * g)
+                for code in range(start, end + 1):
+                    mapping[code] = glyph + code - start
+            return mapping
+
+        table = subtables.get((3, 1)) or subtables.get((0, 3))
+        if table is None:
+            raise ValueError("Font has no Unicode cmap")
+        seg_count = struct.unpack_from(">H", data, table + 6)[0] // 2
+        ends = table + 14
+        starts = ends + 2 * seg_count + 2
+        deltas = starts + 2 * seg_count
+        range_offsets = deltas + 2 * seg_count
+        for i in range(seg_count):
+            end = struct.unpack_from(">H", data, ends + 2 * i)[0]
+            start = struct.unpack_from(">H", data, starts + 2 * i)[0]
+            delta = struct.unpack_from(">h", data, deltas + 2 * i)[0]
+            range_offset = struct.unpack_from(">H", data, range_offsets + 2 * i)[0]
+            for code in range(start, min(end, 0xFFFE) + 1):
+                if range_offset == 0:
+                    glyph = (code + delta) & 0xFFFF
+                else:
+                    addr = range_offsets + 2 * i + range_offset + 2 * (code - start)
+                    glyph = struct.unpack_from(">H", data, addr)[0]
+                    if glyph:
+                        glyph = (glyph + delta) & 0xFFFF
+                if glyph:
+                    mapping[code] = glyph
+        return mapping
+
+    def glyph(self, char: str) -> int:
+        return self.cmap.get(ord(char), 0)
+
+    def advance(self, glyph: int) -> int:
+        """Advance in 1/1000 em, the unit PDF width arrays use."""
+        adv = self.advances[glyph] if glyph < len(self.advances) else self.advances[-1]
+        return round(adv * 1000 / self.units_per_em)
+
+    def width(self, text: str, size: float) -> float:
+        return sum(map(self._widths.__getitem__, text)) * size / 1000
+
+    # ---------- subsetting ----------
+    def _glyph_data(self, glyph: int) -> bytes:
+        start = self.tables["glyf"][0]
+        return self.data[start + self.loca[glyph]:start + self.loca[glyph + 1]]
+
+    def _components(self, glyph: int) -> list:
+        """Glyphs a composite glyph is built from (empty for simple glyphs)."""
+        data = self._glyph_data(glyph)
+        if len(data) < 10 or struct.unpack_from(">h", data, 0)[0] >= 0:
+            return []
+        out, pos = [], 10
+        while True:
+            flags, component = struct.unpack_from(">HH", data, pos)
+            out.append(component)
+            pos += 4 + (4 if flags & 0x0001 else 2)
+            if flags & 0x0008:
+                pos += 2
+            elif flags & 0x0040:
+                pos += 4
+            elif flags & 0x0080:
+                pos += 8
+            if not flags & 0x0020:
+                return out
+
+    def subset(self, glyphs) -> bytes:
+        """A font file where every glyph outside `glyphs` (and their components) is empty.
+        Glyph ids are unchanged, so /CIDToGIDMap /Identity and the width array still apply."""
+        keep, stack = {0}, list(glyphs)
+        while stack:
+            glyph = stack.pop()
+            if glyph not in keep and glyph < self.num_glyphs:
+                keep.add(glyph)
+                stack.extend(self._components(glyph))
+
+        # Glyphs past the highest one kept are dropped outright, shrinking loca and hmtx too
+        count = max(keep) + 1
+        glyf, loca = bytearray(), [0]
+        for glyph in range(count):
+            if glyph in keep:
+                glyf += self._glyph_data(glyph)
+                glyf += b"\0" * (-len(glyf) % 4)
+            loca.append(len(glyf))
+
+        tables = {tag: self.data[o:o + n] for tag, (o, n) in self.tables.items() if tag in SUBSET_TABLES}
+        head = bytearray(tables["head"])
+        struct.pack_into(">L", head, 8, 0)  # checkSumAdjustment, fixed up below
+        struct.pack_into(">h", head, 50, 1)  # long loca offsets
+        maxp = bytearray(tables["maxp"])
+        struct.pack_into(">H", maxp, 4, count)
+        metrics = min(len(self.advances), count)
+        hhea = bytearray(tables["hhea"])
+        struct.pack_into(">H", hhea, 34, metrics)
+        hmtx = tables["hmtx"]
+        lsb_start = 4 * len(self.advances)
+        hmtx = hmtx[:4 * metrics] + hmtx[lsb_start:lsb_start + 2 * (count - metrics)]
+        tables.update(head=bytes(head), maxp=bytes(maxp), hhea=bytes(hhea), hmtx=hmtx,
+                      glyf=bytes(glyf), loca=struct.pack(f">{len(loca)}L", *loca))
+        return _build_sfnt(tables)
+
+
+def _checksum(data: bytes) -> int:
+    data += b"\0" * (-len(data) % 4)
+    return sum(struct.unpack(f">{len(data) // 4}L", data)) & 0xFFFFFFFF
+
+
+def _build_sfnt(tables: dict) -> bytes:
+    tags = sorted(tables)
+    entry_selector = max(n for n in range(16) if 2 ** n <= len(tags))
+    search_range = 16 * 2 ** entry_selector
+    header = struct.pack(">LHHHH", 0x00010000, len(tags), search_range, entry_selector,
+                         len(tags) * 16 - search_range)
+    offset = 12 + 16 * len(tags)
+    records, body = [], bytearray()
+    for tag in tags:
+        data = tables[tag]
+        records.append(struct.pack(">4sLLL", tag.encode("latin-1"), _checksum(data), offset + len(body), len(data)))
+        body += data + b"\0" * (-len(data) % 4)
+    font = bytearray(header + b"".join(records) + body)
+    head = offset + sum(len(tables[t]) + (-len(tables[t]) % 4) for t in tags[:tags.index("head")])
+    struct.pack_into(">L", font, head + 8, (0xB1B0AFBA - _checksum(bytes(font))) & 0xFFFFFFFF)
+    return bytes(font)
+
+
+# ----------------------------
+# Incremental PDF writer
+# ----------------------------
+def _escape_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else f"#{ord(c):02X}" for c in name)
+
+
+class PDFStreamWriter:
+    """Writes each page to `fh` as soon as it is finished. Only object offsets, page ids and the
+    set of glyphs used survive a page, so memory stays flat however long the document is."""
+
+    CATALOG, PAGES, FONT, CID_FONT, DESCRIPTOR, FONT_FILE, TO_UNICODE = range(1, 8)
+
+    def __init__(self, fh, font: TrueTypeFont, page_size: tuple = A4, title: str | None = None):
+        self.fh = fh
+        self.font = font
+        self.page_size = page_size
+        self.title = title
+        self._offsets: dict = {}
+        self._next_id = 8
+        self._pages: list = []
+        self._used: dict = {}  # glyph id -> code point, for the width array and ToUnicode map
+        self._hex = _Table(self._register)  # code point -> 4-digit glyph id
+        self._pos = 0
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, data: bytes):
+        self.fh.write(data)
+        self._pos += len(data)
+
+    def _object(self, obj_id: int, body: bytes):
+        self._offsets[obj_id] = self._pos
+        self._write(b"%d 0 obj\n" % obj_id + body + b"\nendobj\n")
+
+    def _stream(self, obj_id: int, data: bytes, extra: str = "", compress: bool = True):
+        if compress:
+            data = zlib.compress(data, 6)
+            extra += " /Filter /FlateDecode"
+        self._object(obj_id, f"<< /Length {len(data)}{extra} >>\nstream\n".encode() + data + b"\nendstream")
+
+    def _new_id(self) -> int:
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    @property
+    def page_count(self) -> int:
+        return len(self._pages)
+
+    def encode(self, text: str) -> str:
+        """Hex string of 2-byte glyph ids for an Identity-H Tj operand."""
+        return text.translate(self._hex)
+
+    def _register(self, code: int) -> str:
+        glyph = self.font.cmap.get(code, 0)
+        self._used.setdefault(glyph, code)
+        return f"{glyph:04X}"
+
+    def add_page(self, content: bytes):
+        content_id, page_id = self._new_id(), self._new_id()
+        self._stream(content_id, content)
+        w, h = self.page_size
+        self._object(
+            page_id,
+            (
+                f"<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {w:.2f} {h:.2f}] "
+                f"/Resources << /Font << /F1 {self.FONT} 0 R >> >> /Contents {content_id} 0 R >>"
+            ).encode(),
+        )
+        self._pages.append(page_id)
+        # Let readers of the growing file (see artifacts.follow_render) see the page now
+        self.fh.flush()
+
+    def _write_font(self):
+        font = self.font
+        # Subset fonts carry a six-letter tag derived from the glyph set (PDF 32000 9.6.4)
+        digest = hashlib.sha1(repr(sorted(self._used)).encode()).digest()
+        tag = "".join(chr(65 + b % 26) for b in digest[:6])
+        name = f"{tag}+{_escape_name(font.name)}"
+        scale = 1000 / font.units_per_em
+        self._object(
+            self.FONT,
+            (
+                f"<< /Type /Font /Subtype /Type0 /BaseFont /{name} /Encoding /Identity-H "
+                f"/DescendantFonts [{self.CID_FONT} 0 R] /ToUnicode {self.TO_UNICODE} 0 R >>"
+            ).encode(),
+        )
+        widths = " ".join(f"{g} [{font.advance(g)}]" for g in sorted(self._used))
+        self._object(
+            self.CID_FONT,
+            (
+                f"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{name} "
+                f"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+                f"/FontDescriptor {self.DESCRIPTOR} 0 R /CIDToGIDMap /Identity /W [{widths}] >>"
+            ).encode(),
+        )
+        bbox = " ".join(str(round(v * scale)) for v in font.bbox)
+        self._object(
+            self.DESCRIPTOR,
+            (
+                f"<< /Type /FontDescriptor /FontName /{name} /Flags 32 /FontBBox [{bbox}] "
+                f"/ItalicAngle {font.italic_angle:.1f} /Ascent {round(font.ascent * scale)} "
+                f"/Descent {round(font.descent * scale)} /CapHeight {round(font.cap_height * scale)} "
+                f"/StemV 80 /FontFile2 {self.FONT_FILE} 0 R >>"
+            ).encode(),
+        )
+        subset = font.subset(self._used)
+        self._stream(self.FONT_FILE, subset, f" /Length1 {len(subset)}")
+
+        entries = [
+            f"<{g:04X}> <{chr(cp).encode('utf-16-be').hex().upper()}>" for g, cp in sorted(self._used.items()) if g
+        ]
+        blocks = []
+        for i in range(0, len(entries), 100):
+            chunk = entries[i:i + 100]
+            blocks.append(f"{len(chunk)} beginbfchar\n" + "\n".join(chunk) + "\nendbfchar")
+        cmap = (
+            "/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+            "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+            "1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+            + "\n".join(blocks)
+            + "\nendcmap\nCMapName currentdict /CMap defineresource pop\nend\nend"
+        )
+        self._stream(self.TO_UNICODE, cmap.encode())
+
+    def close(self):
+        """Write the shared objects, the cross-reference table and the trailer."""
+        self._write_font()
+        kids = " ".join(f"{p} 0 R" for p in self._pages)
+        self._object(self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>".encode())
+        self._object(self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>".encode())
+        info_id = None
+        if self.title:
+            info_id = self._new_id()
+            title = self.title.encode("utf-16-be").hex().upper()
+            self._object(info_id, f"<< /Title <FEFF{title}> /Producer (LawHelpZone AI) >>".encode())
+
+        xref = self._pos
+        lines = [f"xref\n0 {self._next_id}\n", "0000000000 65535 f \n"]
+        for obj_id in range(1, self._next_id):
+            lines.append(f"{self._offsets[obj_id]:010d} 00000 n \n")
+        self._write("".join(lines).encode())
+        info = f" /Info {info_id} 0 R" if info_id else ""
+        self._write(f"trailer\n<< /Size {self._next_id} /Root {self.CATALOG} 0 R{info} >>\nstartxref\n{xref}\n%%EOF\n".encode())
+        self.fh.flush()
+
+
+# ----------------------------
+# Text flow: wrap, paginate, flush
+# ----------------------------
+def iter_lines(text: str):
+    """Lines of `text` without building a list of the whole document."""
+    start = 0
+    while True:
+        end = text.find("\n", start)
+        if end == -1:
+            yield text[start:].rstrip("\r")
+            return
+        yield text[start:end].rstrip("\r")
+        start = end + 1
+
+
+def wrap_line(line: str, font: TrueTypeFont, size: float, max_width: float):
+    """Greedy word wrap; words wider than the line are broken by character."""
+    line = line.replace("\t", "    ")
+    if not line.strip():
+        yield ""
+        return
+    space = font.width(" ", size)
+    current, width = [], 0.0
+    for word in line.split():
+        w = font.width(word, size)
+        if w > max_width:
+            if current:
+                yield " ".join(current)
+                current, width = [], 0.0
+            piece, piece_w = "", 0.0
+            for char in word:
+                cw = font.width(char, size)
+                if piece and piece_w + cw > max_width:
+                    yield piece
+                    piece, piece_w = "", 0.0
+                piece += char
+                piece_w += cw
+            current, width = [piece], piece_w
+            continue
+        if current and width + space + w > max_width:
+            yield " ".join(current)
+            current, width = [], 0.0
+        if current:
+            width += space
+        current.append(word)
+        width += w
+    if current:
+        yield " ".join(current)
+
+
+class PageFlow:
+    """Cursor-based layout on top of PDFStreamWriter. Coordinates are in points from the
+    top-left corner; `on_page` draws fixed decoration (headers, footers) for each new page."""
+
+    def __init__(self, writer: PDFStreamWriter, margins: tuple, on_page=None):
+        self.writer = writer
+        self.font = writer.font
+        self.width, self.height = writer.page_size
+        self.left, self.top, self.right, self.bottom = margins
+        self.on_page = on_page
+        self.ops: list = []
+        self.y = self.top
+        self.open = False
+
+    @property
+    def text_width(self) -> float:
+        return self.width - self.left - self.right
+
+    @property
+    def page_number(self) -> int:
+        return self.writer.page_count + (1 if self.open else 0)
+
+    def new_page(self):
+        self.flush()
+        self.open = True
+        self.y = self.top
+        if self.on_page:
+            self.on_page(self)
+
+    def flush(self):
+        if self.open:
+            self.writer.add_page("\n".join(self.ops).encode())
+            self.ops = []
+            self.open = False
+
+    def ensure(self, height: float):
+        if not self.open or self.y + height > self.height - self.bottom:
+            self.new_page()
+
+    # ---------- drawing (top-left coordinates) ----------
+    def text(self, x: float, y: float, text: str, size: float, color=(0, 0, 0), bold=False, italic=False):
+        """Draw one line with its baseline `y` points from the top. Bold is a stroked fill and
+        italic a skewed text matrix, so a single embedded font covers every style."""
+        if not text:
+            return
+        base = self.height - y
+        skew = 0.21 if italic else 0
+        style = f"2 Tr {size * 0.03:.2f} w {color[0] / 255:.3f} {color[1] / 255:.3f} {color[2] / 255:.3f} RG " if bold else ""
+        # q/Q: render mode and colours are graphics state and would otherwise leak into later text
+        self.ops.append(
+            f"q BT {color[0] / 255:.3f} {color[1] / 255:.3f} {color[2] / 255:.3f} rg {style}"
+            f"/F1 {size:.1f} Tf 1 0 {skew} 1 {x:.2f} {base:.2f} Tm <{self.writer.encode(text)}> Tj ET Q"
+        )
+
+    def centered(self, y: float, text: str, size: float, **style):
+        self.text((self.width - self.font.width(text, size)) / 2, y, text, size, **style)
+
+    def rect(self, x: float, y: float, w: float, h: float, color):
+        self.ops.append(
+            f"q {color[0] / 255:.3f} {color[1] / 255:.3f} {color[2] / 255:.3f} rg "
+            f"{x:.2f} {self.height - y - h:.2f} {w:.2f} {h:.2f} re f Q"
+        )
+
+    def line(self, x1: float, y1: float, x2: float, y2: float, color, width: float):
+        self.ops.append(
+            f"q {color[0] / 255:.3f} {color[1] / 255:.3f} {color[2] / 255:.3f} RG {width:.2f} w "
+            f"{x1:.2f} {self.height - y1:.2f} m {x2:.2f} {self.height - y2:.2f} l S Q"
+        )
+
+    # ---------- flowing text ----------
+    def write_line(self, text: str, size: float, leading: float, **style):
+        self.ensure(leading)
+        self.y += leading
+        # Baseline sits roughly a quarter of the leading above the bottom of the line box
+        self.text(self.left, self.y - leading * 0.25, text, size, **style)
+
+    def paragraphs(self, text: str, size: float, leading: float, **style):
+        for line in iter_lines(text):
+            for wrapped in wrap_line(line, self.font, size, self.text_width):
+                self.write_line(wrapped, size, leading, **style)
+
+    def space(self, height: float):
+        self.y += height
+
+    def close(self):
+        if not self.open and self.writer.page_count == 0:
+            self.new_page()
+        self.flush()
+        self.writer.close()
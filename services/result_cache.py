@@ -0,0 +1,281 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+
+def normalise(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {k: normalise(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalise(v) for v in value]
+    return value
+
+
+def make_key(payload: dict) -> str:
+    blob = json.dumps(normalise(payload), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+# ----------------------------
+# Optional on-disk tier (SQLite)
+# ----------------------------
+class SQLiteTier:
+    def __init__(self, path: str, table: str):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, cost REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at, cost FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row and row[1] < time.time():
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+        if not row:
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def put(self, key: str, value, expires_at: float, cost: float):
+        blob = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, cost) VALUES (?, ?, ?, ?)",
+                (key, blob, expires_at, cost),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cur = self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+            return cur.rowcount
+
+
+# ----------------------------
+# In-memory LRU + TTL cache with single-flight fill
+# ----------------------------
+class ResultCache:
+    """Bounded LRU/TTL cache. Concurrent misses for one key share a single compute call, which
+    is cancelled once every caller waiting on it has been cancelled."""
+
+    def __init__(self, name: str, max_entries: int = 512, ttl: float = 3600, sqlite_path: str | None = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk = SQLiteTier(sqlite_path, name) if sqlite_path else None
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: dict = {}
+        # key -> [generation, fills in flight]; only kept while a fill for the key is running
+        self._generations: dict = {}
+        # fill task -> callers awaiting it
+        self._waiting: dict = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.shared = 0
+        self.misses = 0
+        self.errors = 0
+        self.abandoned = 0
+        self.saved_seconds = 0.0
+        self.compute_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, max_entries: int = 512, ttl: float = 3600) -> "ResultCache":
+        return cls(
+            name,
+            max_entries=int(os.getenv(f"{prefix}_CACHE_SIZE", max_entries)),
+            ttl=float(os.getenv(f"{prefix}_CACHE_TTL", ttl)),
+            sqlite_path=os.getenv(f"{prefix}_CACHE_DB") or None,
+        )
+
+    # ---------- memory tier ----------
+    def _get_memory(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put_memory(self, key: str, value, expires_at: float, cost: float):
+        self._entries[key] = (expires_at, value, cost)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        for key in list(self._generations):
+            self._bump(key)
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+        self._bump(key)
+        if self.disk:
+            self.disk.delete(key)
+
+    def _bump(self, key: str):
+        """A fill already running for `key` read pre-invalidation data: its result is dropped,
+        and later callers start a fresh fill instead of joining it."""
+        gen = self._generations.get(key)
+        if gen is not None:
+            gen[0] += 1
+            self._inflight.pop(key, None)
+
+    # ---------- lookup ----------
+    def _hit(self, entry) -> Any:
+        self.hits += 1
+        self.saved_seconds += entry[2]
+        return entry[1]
+
+    async def get(self, key: str):
+        """get/put are get_or_compute split in two, for values assembled outside it (e.g. from
+        a stream); lookups and computes are counted the same way."""
+        entry = self._get_memory(key)
+        if entry is not None:
+            return self._hit(entry)
+        if self.disk:
+            row = await asyncio.to_thread(self.disk.get, key)
+            if row is not None:
+                value, expires_at, cost = row
+                self._put_memory(key, value, expires_at, cost)
+                self.disk_hits += 1
+                self.saved_seconds += cost
+                return value
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, value, cost: float = 0.0):
+        """Store a value computed after a get() miss; cost is the compute time in seconds."""
+        self.compute_seconds += cost
+        expires_at = time.time() + self.ttl
+        self._put_memory(key, value, expires_at, cost)
+        if self.disk:
+            try:
+                await asyncio.to_thread(self.disk.put, key, value, expires_at, cost)
+            except Exception as e:
+                print(f"⚠️ {self.name} cache disk write failed:", e)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> tuple[Any, str]:
+        """Return (value, status) where status is "hit", "disk", "shared" or "miss"."""
+        entry = self._get_memory(key)
+        if entry is not None:
+            return self._hit(entry), "hit"
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+            value, _ = await self._wait(task)
+            return value, "shared"
+
+        gen = self._generations.setdefault(key, [0, 0])
+        gen[1] += 1
+        task = asyncio.create_task(self._fill(key, compute, gen[0]))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return await self._wait(task)
+
+    async def _wait(self, task: asyncio.Task):
+        """Shielded, so one caller giving up doesn't fail the others; when the last one gives
+        up the fill is cancelled too, rather than computing (and paying for) an unread result."""
+        self._waiting[task] = self._waiting.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiting.get(task) == 1 and not task.done():
+                self.abandoned += 1
+                task.cancel()
+            raise
+        finally:
+            if task in self._waiting:
+                self._waiting[task] -= 1
+                if not self._waiting[task]:
+                    del self._waiting[task]
+
+    def _current(self, key: str, generation: int) -> bool:
+        return self._generations[key][0] == generation
+
+    async def _fill(self, key: str, compute, generation: int):
+        if self.disk:
+            row = await asyncio.to_thread(self.disk.get, key)
+            if row is not None and self._current(key, generation):
+                value, expires_at, cost = row
+                self._put_memory(key, value, expires_at, cost)
+                self.disk_hits += 1
+                self.saved_seconds += cost
+                return value, "disk"
+
+        self.misses += 1
+        start = time.perf_counter()
+        value = await compute()
+        cost = time.perf_counter() - start
+        self.compute_seconds += cost
+
+        if not self._current(key, generation):
+            # Invalidated while computing: serve this caller, but don't cache what may be stale
+            return value, "miss"
+        expires_at = time.time() + self.ttl
+        self._put_memory(key, value, expires_at, cost)
+        if self.disk:
+            try:
+                await asyncio.to_thread(self.disk.put, key, value, expires_at, cost)
+            except Exception as e:
+                print(f"⚠️ {self.name} cache disk write failed:", e)
+        return value, "miss"
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        gen = self._generations[key]
+        gen[1] -= 1
+        if gen[1] == 0:
+            del self._generations[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    # ---------- stats ----------
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.shared + self.misses
+        avg_compute = self.compute_seconds / self.misses if self.misses else 0.0
+        return {
+            "name": self.name,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "disk_tier": bool(self.disk),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "shared": self.shared,
+            "misses": self.misses,
+            "errors": self.errors,
+            "abandoned": self.abandoned,
+            "hit_ratio": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+            "avg_compute_ms": round(avg_compute * 1000, 1),
+            "saved_seconds": round(self.saved_seconds + self.shared * avg_compute, 3),
+        }
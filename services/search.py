@@ -0,0 +1,136 @@
+import html
+import re
+from typing import NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+# The database marks matches with private-use characters; the snippet is HTML-escaped
+# before they are swapped for the tags, so document text can never inject markup
+MATCH_START = "\ue000"
+MATCH_STOP = "\ue001"
+
+# Postgres caps a tsvector at 1 MB; index the head of very long contracts
+MAX_INDEXED_CHARS = 500000
+
+PG_VECTOR = (
+    "setweight(to_tsvector('english', coalesce({t}title, '')), 'A') || "
+    f"setweight(to_tsvector('english', left(coalesce({{t}}content, ''), {MAX_INDEXED_CHARS})), 'B')"
+)
+
+# Adding the stored column rewrites the whole table under an ACCESS EXCLUSIVE lock, so it is
+# a one-off migration (python -m tools.migrate_search_index), never startup DDL
+PG_MIGRATION = [
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    + PG_VECTOR.format(t="") + ") STORED",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_search_vector ON documents USING GIN (search_vector)",
+]
+
+# External-content FTS5 table kept in sync by triggers
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5("
+    "title, content, content='documents', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS documents_fts_ai AFTER INSERT ON documents BEGIN "
+    "INSERT INTO documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS documents_fts_ad AFTER DELETE ON documents BEGIN "
+    "INSERT INTO documents_fts(documents_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS documents_fts_au AFTER UPDATE OF title, content ON documents BEGIN "
+    "INSERT INTO documents_fts(documents_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+]
+
+
+# ----------------------------
+# Index setup (called from init_db)
+# ----------------------------
+# Until the Postgres migration has run, search computes the vector per row (correct, unindexed)
+pg_vector_column = False
+
+
+def ensure_search_index(sync_conn):
+    global pg_vector_column
+    dialect = sync_conn.dialect.name
+    if dialect == "postgresql":
+        pg_vector_column = sync_conn.execute(
+            text("SELECT 1 FROM information_schema.columns WHERE table_name = 'documents' AND column_name = 'search_vector'")
+        ).first() is not None
+        if not pg_vector_column:
+            print("⚠️ documents.search_vector missing, search is unindexed: run python -m tools.migrate_search_index")
+    elif dialect == "sqlite":
+        existed = sync_conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'documents_fts'")
+        ).first()
+        for ddl in SQLITE_DDL:
+            sync_conn.execute(text(ddl))
+        if not existed:
+            # Backfill rows saved before the index existed
+            sync_conn.execute(text("INSERT INTO documents_fts(documents_fts) VALUES ('rebuild')"))
+
+
+# ----------------------------
+# Ranked search with snippets
+# ----------------------------
+PG_SEARCH = """
+WITH q AS (SELECT websearch_to_tsquery('english', :q) AS query),
+hits AS (
+    SELECT d.id, d.title, d.created_at, d.content, ts_rank_cd({vector}, q.query) AS rank
+    FROM documents d, q
+    WHERE {vector} @@ q.query {user_filter}
+    ORDER BY rank DESC, d.id DESC
+    LIMIT :limit OFFSET :offset
+)
+SELECT hits.id, hits.title, hits.created_at, hits.rank,
+       ts_headline('english', hits.content, q.query,
+                   'StartSel={start}, StopSel={stop}, MaxWords=30, MinWords=10, MaxFragments=2') AS snippet
+FROM hits, q
+ORDER BY hits.rank DESC, hits.id DESC
+"""
+
+SQLITE_SEARCH = """
+SELECT d.id, d.title, d.created_at, -bm25(documents_fts, 10.0, 1.0) AS rank,
+       snippet(documents_fts, 1, '{start}', '{stop}', '…', 24) AS snippet
+FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid
+WHERE documents_fts MATCH :q {user_filter}
+ORDER BY bm25(documents_fts, 10.0, 1.0), d.id DESC
+LIMIT :limit OFFSET :offset
+"""
+
+
+def fts5_query(q: str) -> str:
+    # Quote each term so user input can't hit FTS5 query syntax; terms are ANDed
+    return " ".join(f'"{term}"' for term in re.findall(r"\w+", q))
+
+
+class SearchHit(NamedTuple):
+    id: int
+    title: str
+    created_at: object
+    rank: float
+    snippet: str
+
+
+def highlight(snippet: str | None) -> str:
+    escaped = html.escape(snippet or "", quote=False)
+    return escaped.replace(MATCH_START, HIGHLIGHT_START).replace(MATCH_STOP, HIGHLIGHT_STOP)
+
+
+async def search_documents(db: AsyncSession, q: str, user_id: str | None, limit: int, offset: int) -> list[SearchHit]:
+    params = {"q": q, "limit": limit, "offset": offset}
+    user_filter = ""
+    if user_id:
+        user_filter = "AND d.user_id = :user_id"
+        params["user_id"] = user_id
+
+    if db.bind.dialect.name == "postgresql":
+        vector = "d.search_vector" if pg_vector_column else "(" + PG_VECTOR.format(t="d.") + ")"
+        sql = PG_SEARCH.format(user_filter=user_filter, vector=vector, start=MATCH_START, stop=MATCH_STOP)
+    else:
+        params["q"] = fts5_query(q)
+        if not params["q"]:
+            return []
+        sql = SQLITE_SEARCH.format(user_filter=user_filter, start=MATCH_START, stop=MATCH_STOP)
+
+    rows = (await db.execute(text(sql), params)).all()
+    return [SearchHit(r.id, r.title, r.created_at, r.rank, highlight(r.snippet)) for r in rows]
@@ -0,0 +1,131 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+
+
+# ----------------------------
+# Chat session stores
+# ----------------------------
+class SessionStore:
+    """In-process backend: ConversationMemory's own dict is the only copy, so nothing is written.
+
+    Persistent backends keep an append-only event log per session id ("turn", "summary",
+    "jurisdiction"); any worker can rebuild a session by replaying events after a known id.
+    """
+
+    name = "memory"
+    persistent = False
+
+    def append(self, sid: str, kind: str, payload: dict) -> int:
+        return 0
+
+    def events_since(self, sid: str, after: int, ttl: float) -> list:
+        return []
+
+    def delete(self, sid: str):
+        pass
+
+    def purge_expired(self, ttl: float) -> int:
+        return 0
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class SQLiteSessionStore(SessionStore):
+    """Shared by every worker on the host through one WAL database. Writes are single-row inserts."""
+
+    name = "sqlite"
+    persistent = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, sid TEXT NOT NULL, kind TEXT NOT NULL, "
+            "payload TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_chat_events_sid_id ON chat_events (sid, id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_sessions (sid TEXT PRIMARY KEY, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.appends = 0
+        self.replayed = 0
+
+    def append(self, sid: str, kind: str, payload: dict) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO chat_events (sid, kind, payload, created_at) VALUES (?, ?, ?, ?)",
+                (sid, kind, json.dumps(payload, ensure_ascii=False), now),
+            )
+            self._conn.execute(
+                "INSERT INTO chat_sessions (sid, last_used) VALUES (?, ?) "
+                "ON CONFLICT(sid) DO UPDATE SET last_used = excluded.last_used",
+                (sid, now),
+            )
+            self._conn.commit()
+            self.appends += 1
+            return cur.lastrowid
+
+    def events_since(self, sid: str, after: int, ttl: float) -> list:
+        with self._lock:
+            row = self._conn.execute("SELECT last_used FROM chat_sessions WHERE sid = ?", (sid,)).fetchone()
+            if row is None:
+                return []
+            if row[0] < time.time() - ttl:
+                # Expired: the id starts a fresh conversation
+                self._delete(sid)
+                return []
+            rows = self._conn.execute(
+                "SELECT id, kind, payload FROM chat_events WHERE sid = ? AND id > ? ORDER BY id",
+                (sid, after),
+            ).fetchall()
+        self.replayed += len(rows)
+        return [(event_id, kind, json.loads(payload)) for event_id, kind, payload in rows]
+
+    def _delete(self, sid: str):
+        self._conn.execute("DELETE FROM chat_events WHERE sid = ?", (sid,))
+        self._conn.execute("DELETE FROM chat_sessions WHERE sid = ?", (sid,))
+        self._conn.commit()
+
+    def delete(self, sid: str):
+        with self._lock:
+            self._delete(sid)
+
+    def purge_expired(self, ttl: float) -> int:
+        cutoff = time.time() - ttl
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM chat_events WHERE sid IN (SELECT sid FROM chat_sessions WHERE last_used < ?)",
+                (cutoff,),
+            )
+            cur = self._conn.execute("DELETE FROM chat_sessions WHERE last_used < ?", (cutoff,))
+            self._conn.commit()
+            return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = self._conn.execute("SELECT count(*) FROM chat_sessions").fetchone()[0]
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "stored_sessions": sessions,
+            "appends": self.appends,
+            "replayed_events": self.replayed,
+        }
+
+
+def session_store_from_env() -> SessionStore:
+    """CHAT_SESSION_STORE=memory (default) | sqlite, with CHAT_SESSION_DB as the shared file."""
+    if os.getenv("CHAT_SESSION_STORE", "memory").lower() == "sqlite":
+        return SQLiteSessionStore(os.getenv("CHAT_SESSION_DB", "cache/chat_sessions.db"))
+    return SessionStore()
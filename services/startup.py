@@ -0,0 +1,94 @@
+import os
+import sys
+import asyncio
+import importlib
+import time
+from contextlib import contextmanager
+
+# Heavy libraries that should only load on first use, not at boot
+HEAVY_MODULES = ("fitz", "docx", "fpdf", "openai", "httpx", "numpy")
+
+
+# ----------------------------
+# Boot timing report
+# ----------------------------
+class StartupReport:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+        self.ready_at: float | None = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, (time.perf_counter() - start) * 1000))
+
+    def mark_ready(self):
+        if self.ready_at is None:
+            self.ready_at = time.perf_counter()
+
+    def as_dict(self) -> dict:
+        return {
+            "phases_ms": {name: round(ms, 1) for name, ms in self.phases},
+            "ready": self.ready_at is not None,
+            "boot_to_ready_ms": round((self.ready_at - self.started) * 1000, 1) if self.ready_at else None,
+            "heavy_modules_loaded": [m for m in HEAVY_MODULES if m in sys.modules],
+        }
+
+    def print_summary(self):
+        print("🚀 Startup report:")
+        for name, ms in sorted(self.phases, key=lambda p: -p[1]):
+            print(f"   {ms:8.1f} ms  {name}")
+        loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+        print(f"   heavy modules loaded: {', '.join(loaded) or 'none'}")
+
+
+report = StartupReport()
+
+
+# ----------------------------
+# Lifecycle steps
+# ----------------------------
+async def init_schema(init_db, max_delay: float = 30):
+    """Run schema setup once, retrying with backoff until the database answers."""
+    delay = 1.0
+    with report.phase("schema init"):
+        while not await init_db():
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+    report.mark_ready()
+
+
+async def warm_up(engine, renderer):
+    """Optional (WARMUP=1): fill the DB pool, start PDF workers with fonts loaded and import the LLM SDK."""
+    loop = asyncio.get_running_loop()
+
+    async def open_connections():
+        size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+        conns = [await engine.connect() for _ in range(size)]
+        for conn in conns:
+            await conn.close()
+
+    def import_llm_sdk():
+        # Imported for the side effect only: pays the SDK's import cost here, off the event loop,
+        # instead of on the first chat request
+        for name in ("openai", "httpx"):
+            importlib.import_module(name)
+
+    with report.phase("warm-up"):
+        results = await asyncio.gather(
+            open_connections(),
+            loop.run_in_executor(None, import_llm_sdk),
+            renderer.warm_up(),
+            return_exceptions=True,
+        )
+    for result in results:
+        if isinstance(result, Exception):
+            print("⚠️ Warm-up step failed:", result)
+
+
+def warmup_enabled() -> bool:
+    return os.getenv("WARMUP", "0").lower() in ("1", "true", "yes")
@@ -0,0 +1,183 @@
+import os
+import asyncio
+import shutil
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+from services.metrics import stage
+
+load_dotenv()
+
+CHUNK_SIZE = 256 * 1024
+
+
+# ----------------------------
+# Storage backends for signing artifacts
+# ----------------------------
+class StorageBackend:
+    """put_bytes/put_file store an object under `path` and return the URL clients should use."""
+
+    name = "base"
+
+    def __init__(self):
+        self.uploads = 0
+        self.failures = 0
+        self.bytes_uploaded = 0
+        self.upload_ms_total = 0.0
+
+    async def put_bytes(self, path: str, data: bytes, content_type: str) -> str:
+        raise NotImplementedError
+
+    async def put_file(self, path: str, local_path: str, content_type: str) -> str:
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+    def _record(self, size: int, started: float):
+        self.uploads += 1
+        self.bytes_uploaded += size
+        self.upload_ms_total += (time.perf_counter() - started) * 1000
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "uploads": self.uploads,
+            "failures": self.failures,
+            "bytes_uploaded": self.bytes_uploaded,
+            "avg_upload_ms": round(self.upload_ms_total / self.uploads, 1) if self.uploads else 0.0,
+        }
+
+
+class SupabaseStorage(StorageBackend):
+    """Supabase Storage REST API over one pooled httpx client; files are streamed from disk."""
+
+    name = "supabase"
+
+    def __init__(self, url: str, key: str, bucket: str, timeout: float = 60, max_connections: int = 20):
+        super().__init__()
+        self.url = url.rstrip("/")
+        self.key = key
+        self.bucket = bucket
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+
+    def client(self):
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=10),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                headers={"Authorization": f"Bearer {self.key}", "apikey": self.key},
+            )
+        return self._client
+
+    def public_url(self, path: str) -> str:
+        return f"{self.url}/storage/v1/object/public/{self.bucket}/{path}"
+
+    async def _upload(self, path: str, content, size: int, content_type: str) -> str:
+        started = time.perf_counter()
+        try:
+            with stage("storage"):
+                r = await self.client().post(
+                    f"{self.url}/storage/v1/object/{self.bucket}/{path}",
+                    content=content,
+                    # x-upsert: re-signing a document replaces its earlier signed PDF
+                    headers={"Content-Type": content_type, "Content-Length": str(size), "x-upsert": "true"},
+                )
+            if r.status_code not in (200, 201):
+                raise RuntimeError(f"Supabase upload error: {r.text}")
+        except BaseException:
+            self.failures += 1
+            raise
+        self._record(size, started)
+        return self.public_url(path)
+
+    async def put_bytes(self, path: str, data: bytes, content_type: str) -> str:
+        return await self._upload(path, data, len(data), content_type)
+
+    async def put_file(self, path: str, local_path: str, content_type: str) -> str:
+        async def chunks():
+            with open(local_path, "rb") as f:
+                while chunk := await asyncio.to_thread(f.read, CHUNK_SIZE):
+                    yield chunk
+
+        return await self._upload(path, chunks(), os.path.getsize(local_path), content_type)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class LocalStorage(StorageBackend):
+    """Files under `root`, served back by the sign router at `base_url`."""
+
+    name = "local"
+
+    def __init__(self, root: str, base_url: str):
+        super().__init__()
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+
+    def resolve(self, path: str) -> str | None:
+        full = os.path.abspath(os.path.join(self.root, path))
+        if os.path.commonpath([full, self.root]) != self.root:
+            return None
+        return full
+
+    def _write(self, path: str, writer) -> int:
+        full = self.resolve(path)
+        if full is None:
+            raise ValueError(f"Invalid storage path: {path}")
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        tmp = f"{full}.{uuid.uuid4().hex}.tmp"
+        try:
+            writer(tmp)
+            os.replace(tmp, full)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return os.path.getsize(full)
+
+    async def _store(self, path: str, writer) -> str:
+        started = time.perf_counter()
+        try:
+            with stage("storage"):
+                size = await asyncio.to_thread(self._write, path, writer)
+        except BaseException:
+            self.failures += 1
+            raise
+        self._record(size, started)
+        return f"{self.base_url}/{path}"
+
+    async def put_bytes(self, path: str, data: bytes, content_type: str) -> str:
+        def writer(tmp):
+            with open(tmp, "wb") as f:
+                f.write(data)
+
+        return await self._store(path, writer)
+
+    async def put_file(self, path: str, local_path: str, content_type: str) -> str:
+        return await self._store(path, lambda tmp: shutil.copyfile(local_path, tmp))
+
+
+def storage_from_env() -> StorageBackend:
+    """STORAGE_BACKEND=supabase|local; defaults to Supabase when its credentials are set."""
+    url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+    backend = os.getenv("STORAGE_BACKEND") or ("supabase" if url and key else "local")
+    if backend == "supabase":
+        if not url or not key:
+            raise RuntimeError("STORAGE_BACKEND=supabase needs SUPABASE_URL and SUPABASE_KEY.")
+        return SupabaseStorage(
+            url,
+            key,
+            os.getenv("SUPABASE_BUCKET", "signed_documents"),
+            timeout=float(os.getenv("STORAGE_TIMEOUT", 60)),
+            max_connections=int(os.getenv("STORAGE_MAX_CONNECTIONS", 20)),
+        )
+    return LocalStorage(os.getenv("STORAGE_DIR", "signed_files"), os.getenv("STORAGE_BASE_URL", "/api/sign/files"))
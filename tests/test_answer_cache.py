@@ -0,0 +1,51 @@
+import json
+import threading
+
+from services.answer_cache import SemanticAnswerCache
+
+QUESTION = "What are the notice requirements to terminate a residential tenancy in {}?"
+
+
+def test_answers_stay_in_their_jurisdiction():
+    cache = SemanticAnswerCache(None)
+    cache.store(QUESTION.format("the UK"), "UK answer", "United Kingdom")
+
+    assert cache.lookup(QUESTION.format("the UK"), "United Kingdom")["answer"] == "UK answer"
+    assert cache.lookup(QUESTION.format("the UK"), "Australia") is None
+
+
+def test_unresolved_jurisdiction_is_never_cached():
+    cache = SemanticAnswerCache(None)
+    cache.store(QUESTION.format("France"), "French answer", None)
+
+    assert len(cache) == 0
+    assert cache.lookup(QUESTION.format("Italy"), None) is None
+    assert cache.lookup(QUESTION.format("Italy"), "") is None
+    assert cache.stats()["skipped_no_jurisdiction"] == 2
+
+
+def test_near_duplicate_hits_within_partition():
+    cache = SemanticAnswerCache(None, threshold=0.8)
+    cache.store("How do I terminate a residential lease in the UK?", "answer", "United Kingdom")
+
+    hit = cache.lookup("How can I terminate a residential lease in the UK?", "United Kingdom")
+    assert hit is not None and hit["similarity"] >= 0.8
+
+
+def test_concurrent_saves_leave_a_valid_file(tmp_path):
+    path = tmp_path / "answers.json"
+    cache = SemanticAnswerCache(str(path))
+    for i in range(20):
+        cache.store(f"question {i} about leases", f"answer {i}", "United Kingdom")
+
+    threads = [threading.Thread(target=cache.save) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(json.loads(path.read_text())["entries"]) == 20
+    assert list(tmp_path.iterdir()) == [path]
+
+    reloaded = SemanticAnswerCache(str(path))
+    assert reloaded.lookup("question 3 about leases", "United Kingdom")["answer"] == "answer 3"
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from services.artifacts import ArtifactStore, RangeNotSatisfiable, parse_range, serve_artifact, serve_rendering
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    # Ignored: the caller serves the whole file
+    for header in ("bytes=0-9,20-29", "bytes=abc", "bytes=9-0", "items=0-9", "bytes=10"):
+        assert parse_range(header, 100) is None
+    for header in ("bytes=100-", "bytes=200-300", "bytes=-0"):
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range(header, 100)
+
+
+def test_serve_artifact_ranges():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ArtifactStore(tmp, max_bytes=1 << 20)
+        with open(store.tmp_path("k"), "wb") as f:
+            f.write(bytes(range(100)))
+        store.commit("k", store.tmp_path("k"))
+
+        app = FastAPI()
+
+        @app.get("/a")
+        def artifact(request: Request):
+            return serve_artifact(request, store, "k")
+
+        client = TestClient(app)
+        partial = client.get("/a", headers={"Range": "bytes=10-19"})
+        assert partial.status_code == 206 and partial.content == bytes(range(10, 20))
+
+        for header in ("bytes=0-1,5-6", "bytes=garbage"):
+            full = client.get("/a", headers={"Range": header})
+            assert full.status_code == 200 and len(full.content) == 100
+
+        past_end = client.get("/a", headers={"Range": "bytes=100-"})
+        assert past_end.status_code == 416
+        assert past_end.headers["content-range"] == "bytes */100"
+
+
+def test_in_progress_stream_has_no_validator():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ArtifactStore(tmp, max_bytes=1 << 20)
+        tmp_path = store.tmp_path("k")
+        app = FastAPI()
+
+        async def failing_render():
+            with open(tmp_path, "wb") as f:
+                f.write(b"%PDF-1.4 partial")
+            await asyncio.sleep(0.05)
+            raise RuntimeError("render crashed")
+
+        @app.get("/a")
+        async def artifact(request: Request):
+            job = asyncio.create_task(failing_render())
+            await asyncio.sleep(0.01)
+            return await serve_rendering(request, store, "k", job, tmp_path)
+
+        response = TestClient(app).get("/a")
+        assert response.content == b"%PDF-1.4 partial"
+        assert "etag" not in response.headers
+        assert response.headers["cache-control"] == "no-store"
+        assert not store.exists("k")
+
+
+def put(store: ArtifactStore, key: str, size: int):
+    with open(store.tmp_path(key), "wb") as f:
+        f.write(b"x" * size)
+    store.commit(key, store.tmp_path(key))
+
+
+def test_budget_holds_across_workers_sharing_a_directory():
+    with tempfile.TemporaryDirectory() as tmp:
+        # Two workers' stores over one directory, 300 bytes between them
+        first, second = ArtifactStore(tmp, max_bytes=300), ArtifactStore(tmp, max_bytes=300)
+        put(first, "a", 100)
+        put(second, "b", 100)
+        put(first, "c", 100)
+        assert second.exists("a") and first.exists("b")
+
+        # "a" is the oldest, but the other worker just served it
+        for age, key in enumerate(("a", "b", "c"), start=1):
+            os.utime(first.path(key), (age, age))
+        second.touch("a")
+        put(second, "d", 100)
+
+        on_disk = sorted(name for name in os.listdir(tmp))
+        assert on_disk == ["a.pdf", "c.pdf", "d.pdf"]
+        assert sum(os.path.getsize(os.path.join(tmp, n)) for n in on_disk) <= 300
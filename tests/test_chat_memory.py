@@ -0,0 +1,113 @@
+import asyncio
+
+from services.chat_memory import ConversationMemory
+from services.session_store import SessionStore, SQLiteSessionStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def shared_pair(tmp_path, **kwargs):
+    """Two memories on one store file: stand-ins for two uvicorn workers."""
+    path = str(tmp_path / "sessions.db")
+    return (
+        ConversationMemory("system", store=SQLiteSessionStore(path), **kwargs),
+        ConversationMemory("system", store=SQLiteSessionStore(path), **kwargs),
+    )
+
+
+def test_resume_on_another_worker(tmp_path):
+    a, b = shared_pair(tmp_path)
+
+    async def scenario():
+        await a.resume("session-1")
+        await a.append("session-1", "user", "Can I end my lease early?")
+        await a.set_jurisdiction("session-1", "United Kingdom")
+        await a.append("session-1", "assistant", "Usually with notice.")
+        return await b.resume("session-1")
+
+    mem = run(scenario())
+    assert [t["content"] for t in mem.turns] == ["Can I end my lease early?", "Usually with notice."]
+    assert mem.jurisdiction == "United Kingdom"
+
+
+def test_resume_replays_only_new_events(tmp_path):
+    a, b = shared_pair(tmp_path)
+
+    async def scenario():
+        await a.append("session-1", "user", "first")
+        await b.resume("session-1")
+        await b.append("session-1", "assistant", "from b")
+        await a.append("session-1", "user", "second")
+        return await a.resume("session-1"), await b.resume("session-1")
+
+    mem_a, mem_b = run(scenario())
+    expected = ["first", "from b", "second"]
+    assert [t["content"] for t in mem_a.turns] == expected
+    assert [t["content"] for t in mem_b.turns] == expected
+
+
+def test_summary_event_folds_turns_everywhere(tmp_path):
+    async def summarizer(summary, turns):
+        return f"{len(turns)} turns"
+
+    a, b = shared_pair(tmp_path, window_messages=2, summarizer=summarizer)
+
+    async def scenario():
+        for i in range(4):
+            await a.append("session-1", "user", f"m{i}")
+        await a.compact("session-1")
+        return await b.resume("session-1")
+
+    mem = run(scenario())
+    assert [t["content"] for t in mem.turns] == ["m2", "m3"]
+    assert mem.summary == "2 turns"
+    assert mem.summarised_messages == 2
+
+
+def test_expired_session_starts_fresh(tmp_path):
+    a, b = shared_pair(tmp_path, idle_ttl=0)
+
+    async def scenario():
+        await a.append("session-1", "user", "old")
+        await asyncio.sleep(0.01)
+        return await b.resume("session-1")
+
+    assert run(scenario()).turns == []
+
+
+def test_memory_store_keeps_state_in_process():
+    memory = ConversationMemory("system", store=SessionStore())
+
+    async def scenario():
+        await memory.append("session-1", "user", "hello")
+        return await memory.resume("session-1")
+
+    assert [t["content"] for t in run(scenario()).turns] == ["hello"]
+
+
+def test_stats_do_not_list_session_ids():
+    memory = ConversationMemory("system")
+    run(memory.append("secret-session-id", "user", "hello"))
+    stats = memory.stats()
+    assert stats["active_sessions"] == 1
+    assert "secret-session-id" not in repr(stats)
+
+
+def test_session_stats_for_the_id_holder():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from routes import chat
+
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/api")
+    run(chat.memory.append("held-session-id", "user", "What is a lease?"))
+    client = TestClient(app)
+
+    stats = client.get("/api/chat/stats/held-session-id").json()
+    assert stats["messages"] == 1 and stats["turn_tokens"] > 0
+    assert "last_prompt_tokens" in stats and "memory_bytes" in stats
+    assert client.get("/api/chat/stats/unknown").status_code == 404
+    assert "held-session-id" not in client.get("/api/chat/stats").text
@@ -0,0 +1,43 @@
+import asyncio
+
+from sqlalchemy import event
+
+from database import Document, SessionLocal, engine, init_db
+from services.documents import estimate_total, list_page
+
+
+def test_keyset_pages_and_cursor_boundary():
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async def scenario():
+        await init_db()
+        async with SessionLocal() as db:
+            docs = [Document(title=f"Doc {n}", content="x" * 1000, user_id="pager") for n in range(4)]
+            db.add_all(docs + [Document(title="Other", content="y", user_id="someone-else")])
+            await db.commit()
+            ids = sorted((d.id for d in docs), reverse=True)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            async with SessionLocal() as db:
+                first, cursor = await list_page(db, "pager", None, 2)
+                second, end = await list_page(db, "pager", cursor, 2)
+                total = await estimate_total(db, "pager")
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", capture)
+        return ids, first, cursor, second, end, total
+
+    ids, first, cursor, second, end, total = asyncio.run(scenario())
+    assert [r.id for r in first] == ids[:2]
+    assert cursor == ids[1]
+    # The second page ends exactly at the last row: no cursor to a page that would be empty
+    assert [r.id for r in second] == ids[2:]
+    assert end is None
+    assert total == 4
+
+    listing = [s for s in statements if s.lstrip().upper().startswith("SELECT") and "documents" in s]
+    assert listing
+    assert not any("content" in s for s in listing)
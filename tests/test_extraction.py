@@ -0,0 +1,61 @@
+import asyncio
+import multiprocessing
+import time
+
+import fitz
+import pytest
+from fastapi import HTTPException
+
+from services.extraction import ExtractionService
+from services.ingest import IngestedFile
+
+
+def make_pdf(path, pages: int) -> IngestedFile:
+    with fitz.open() as pdf:
+        for n in range(pages):
+            pdf.new_page().insert_text((72, 72), f"Page marker {n:03d}")
+        pdf.save(str(path))
+    return IngestedFile.from_path(str(path), "doc.pdf", "")
+
+
+def test_page_ranges_come_back_in_document_order(tmp_path):
+    upload = make_pdf(tmp_path / "doc.pdf", 25)
+    service = ExtractionService(workers=3, pages_per_task=2, timeout=60)
+    try:
+        text = asyncio.run(service.extract(upload))
+    finally:
+        service.shutdown()
+    markers = [line for line in text.splitlines() if line.startswith("Page marker")]
+    assert markers == [f"Page marker {n:03d}" for n in range(25)]
+    assert service.stats()["pages"] == 25
+
+
+def test_timeout_recycles_the_pool(tmp_path):
+    upload = make_pdf(tmp_path / "doc.pdf", 3)
+    # Too short for a spawned worker to even start: the first call overruns
+    service = ExtractionService(workers=1, timeout=0.01)
+    try:
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(service.extract(upload))
+        assert raised.value.status_code == 504
+        stats = service.stats()
+        assert stats["timeouts"] == 1 and stats["recycles"] == 1
+        assert stats["running"] is False
+
+        # The killed workers go away, and the next extraction gets a fresh pool
+        for _ in range(50):
+            if not multiprocessing.active_children():
+                break
+            time.sleep(0.1)
+        assert not multiprocessing.active_children()
+        service.timeout = 60
+        assert "Page marker 002" in asyncio.run(service.extract(upload))
+    finally:
+        service.shutdown()
+
+
+def test_txt_upload_is_returned_as_text(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("plain text upload")
+    upload = IngestedFile.from_path(str(path), "doc.txt", "")
+    assert asyncio.run(ExtractionService(workers=1).extract(upload)) == "plain text upload"
@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import generate
+
+app = FastAPI()
+app.include_router(generate.router, prefix="/api")
+
+
+def item(n: int) -> dict:
+    return {"type": "NDA", "partyA": f"A{n}", "partyB": "B", "effectiveDate": "2024-01-01", "country": "France"}
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    generate.generate_cache.clear()
+    yield
+    generate.generate_cache.clear()
+
+
+def test_batch_streams_items_as_they_complete_within_the_limit(monkeypatch):
+    running = {"now": 0, "peak": 0}
+
+    async def fake_draft(req):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        n = int(req.partyA[1:])
+        # Later items finish first
+        await asyncio.sleep(0.03 * (6 - n))
+        running["now"] -= 1
+        if n == 3:
+            raise RuntimeError("upstream 500")
+        return f"draft {n}"
+
+    monkeypatch.setattr(generate, "draft_document", fake_draft)
+    monkeypatch.setattr(generate, "BATCH_CONCURRENCY", 8)
+    response = TestClient(app).post("/api/generate/batch", json={"items": [item(n) for n in range(6)], "concurrency": 2})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    items, summary = lines[:-1], lines[-1]
+    assert sorted(i["index"] for i in items) == list(range(6))
+    # Completion order, not request order: items 0 and 1 start together and 1 is quicker
+    assert items[0]["index"] == 1
+    assert next(i for i in items if i["index"] == 3)["error"] == "Document generation failed: upstream 500"
+    assert next(i for i in items if i["index"] == 5)["content"] == "draft 5"
+    assert summary["done"] is True
+    assert (summary["total"], summary["succeeded"], summary["failed"], summary["concurrency"]) == (6, 5, 1, 2)
+    assert running["peak"] == 2
+
+
+def test_batch_concurrency_is_capped_by_the_server(monkeypatch):
+    monkeypatch.setattr(generate, "BATCH_CONCURRENCY", 3)
+
+    async def fake_draft(req):
+        return "x"
+
+    monkeypatch.setattr(generate, "draft_document", fake_draft)
+    response = TestClient(app).post("/api/generate/batch", json={"items": [item(0)], "concurrency": 50})
+    assert json.loads(response.text.splitlines()[-1])["concurrency"] == 3
+
+
+def parse_sse(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_stream_framing_and_cached_replay(monkeypatch):
+    async def fake_stream(messages, usage=None, **kwargs):
+        for token in ("Mutual ", "NDA"):
+            await asyncio.sleep(0.01)
+            yield token
+        usage["total_tokens"] = 12
+
+    monkeypatch.setattr(generate.gateway, "stream", fake_stream)
+    client = TestClient(app)
+    before = client.get("/api/generate/stats").json()
+
+    events = parse_sse(client.post("/api/generate", params={"stream": "true"}, json=item(1)).text)
+    assert [e for e, _ in events] == ["delta", "delta", "done"]
+    assert "".join(d["text"] for e, d in events if e == "delta") == "Mutual NDA"
+    done = events[-1][1]
+    assert (done["content"], done["cached"], done["usage"]) == ("Mutual NDA", False, {"total_tokens": 12})
+
+    replay = parse_sse(client.post("/api/generate", params={"stream": "true"}, json=item(1)).text)
+    assert replay == [("delta", {"text": "Mutual NDA"}), ("done", {"content": "Mutual NDA", "cached": True, "usage": None})]
+    stats = client.get("/api/generate/stats").json()
+    assert (stats["hits"] - before["hits"], stats["misses"] - before["misses"]) == (1, 1)
+    assert stats["saved_seconds"] > before["saved_seconds"]
+
+
+def test_stream_error_event(monkeypatch):
+    async def failing_stream(messages, usage=None, **kwargs):
+        yield "Partial "
+        raise RuntimeError("upstream reset")
+
+    monkeypatch.setattr(generate.gateway, "stream", failing_stream)
+    events = parse_sse(TestClient(app).post("/api/generate", params={"stream": "true"}, json=item(2)).text)
+    assert events == [("delta", {"text": "Partial "}), ("error", {"detail": "Document generation failed: upstream reset"})]
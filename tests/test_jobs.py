@@ -0,0 +1,122 @@
+import asyncio
+import os
+import tempfile
+
+from services.jobs import DONE, JobQueue, JobStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_queue(path: str, handler, **kwargs) -> JobQueue:
+    return JobQueue("test", handler, JobStore(path), workers=1, poll=0.05, **kwargs)
+
+
+def test_two_queues_on_one_store_run_each_job_once():
+    async def scenario(path):
+        ran = []
+
+        async def handler(payload, progress):
+            ran.append(payload["n"])
+            await asyncio.sleep(0.05)
+            return {"n": payload["n"]}
+
+        first, second = make_queue(path, handler), make_queue(path, handler)
+        await first.start()
+        await second.start()
+        jobs = [await first.submit({"n": n}) for n in range(6)]
+        for _ in range(100):
+            states = [(await second.get(job["id"]))["status"] for job in jobs]
+            if all(state == DONE for state in states):
+                break
+            await asyncio.sleep(0.05)
+        await first.stop()
+        await second.stop()
+        return ran, first.completed + second.completed
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ran, completed = run(scenario(os.path.join(tmp, "jobs.db")))
+    assert sorted(ran) == list(range(6))
+    assert completed == 6
+
+
+def test_progress_is_visible_from_another_worker():
+    async def scenario(path):
+        release = asyncio.Event()
+
+        async def handler(payload, progress):
+            progress("parse", 0.5)
+            await release.wait()
+            return {}
+
+        worker = make_queue(path, handler)
+        observer = make_queue(path, handler)  # never started: reads the store only
+        await worker.start()
+        job = await worker.submit({})
+        seen = None
+        for _ in range(100):
+            seen = await asyncio.to_thread(observer.store.get, job["id"])
+            if seen["stage"] == "parse":
+                break
+            await asyncio.sleep(0.05)
+        release.set()
+        await worker.stop()
+        return seen
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seen = run(scenario(os.path.join(tmp, "jobs.db")))
+    assert seen["status"] == "running"
+    assert seen["stage"] == "parse"
+    assert seen["progress"] == 0.5
+
+
+def test_expired_lease_is_reclaimed_and_live_lease_is_not():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JobStore(os.path.join(tmp, "jobs.db"))
+        store.put({
+            "id": "a", "status": "queued", "stage": None, "progress": 0.0, "payload": {}, "result": None,
+            "error": None, "created_at": 1.0, "updated_at": 1.0, "owner": None, "lease_until": None, "attempts": 0,
+        })
+        assert store.claim("w1", lease=30, max_attempts=3)[0]["owner"] == "w1"
+        assert store.claim("w2", lease=30, max_attempts=3) == (None, 0)
+
+        store._conn.execute("UPDATE jobs SET lease_until = 0 WHERE id = 'a'")
+        claimed, _ = store.claim("w2", lease=30, max_attempts=3)
+        assert claimed["owner"] == "w2" and claimed["attempts"] == 2
+
+        # The old owner's writes are rejected once the job has been taken over
+        assert not store.update(dict(claimed, status="done", updated_at=2.0), "w1")
+        assert store.update(dict(claimed, status="done", updated_at=2.0), "w2")
+
+
+def test_job_that_keeps_killing_its_worker_is_failed():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JobStore(os.path.join(tmp, "jobs.db"))
+        store.put({
+            "id": "poison", "status": "queued", "stage": None, "progress": 0.0, "payload": {}, "result": None,
+            "error": None, "created_at": 1.0, "updated_at": 1.0, "owner": None, "lease_until": None, "attempts": 0,
+        })
+        for attempt in range(1, 3):
+            job, abandoned = store.claim(f"w{attempt}", lease=30, max_attempts=2)
+            assert (job["attempts"], abandoned) == (attempt, 0)
+            # The worker dies mid-job: its lease runs out
+            store._conn.execute("UPDATE jobs SET lease_until = 0")
+
+        assert store.claim("w3", lease=30, max_attempts=2) == (None, 1)
+        job = store.get("poison")
+        assert job["status"] == "failed"
+        assert job["error"].startswith("Gave up after 2 attempts")
+
+
+def test_clean_shutdown_does_not_use_up_an_attempt():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JobStore(os.path.join(tmp, "jobs.db"))
+        store.put({
+            "id": "a", "status": "queued", "stage": None, "progress": 0.0, "payload": {}, "result": None,
+            "error": None, "created_at": 1.0, "updated_at": 1.0, "owner": None, "lease_until": None, "attempts": 0,
+        })
+        store.claim("w1", lease=30, max_attempts=1)
+        assert store.release("w1") == 1
+        job, abandoned = store.claim("w2", lease=30, max_attempts=1)
+        assert (job["attempts"], abandoned) == (1, 0)
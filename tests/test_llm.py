@@ -0,0 +1,125 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+
+from services import llm
+from services.llm import LLMGateway
+from tools import fake_openai
+
+MESSAGES = [{"role": "user", "content": "Draft a short NDA"}]
+
+
+@pytest.fixture(scope="module")
+def fake_server():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(fake_openai.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}/v1"
+    server.should_exit = True
+    thread.join(5)
+
+
+@pytest.fixture
+def make_gateway(fake_server, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "fake")
+    monkeypatch.setenv("OPENAI_BASE_URL", fake_server)
+    monkeypatch.setitem(fake_openai.config, "ttft", 0.0)
+    monkeypatch.setitem(fake_openai.config, "token_delay", 0.0)
+    monkeypatch.setitem(fake_openai.config, "tokens", 5)
+    fake_openai.faults.clear()
+    fake_openai.received["requests"] = 0
+    yield lambda **kwargs: LLMGateway(**{"retry_base": 0.01, **kwargs})
+    fake_openai.faults.clear()
+
+
+def run(gateway: LLMGateway, coro):
+    async def scenario():
+        try:
+            return await coro
+        finally:
+            await gateway.aclose()
+
+    return asyncio.run(scenario())
+
+
+def test_retries_with_full_jitter(make_gateway, monkeypatch):
+    bounds = []
+    monkeypatch.setattr(llm.random, "uniform", lambda low, high: bounds.append((low, high)) or 0.0)
+    gateway = make_gateway(max_retries=3, retry_base=0.5, retry_cap=1.5)
+    fake_openai.faults.extend([{"status": 503}] * 3)
+
+    text = run(gateway, gateway.complete(MESSAGES))
+    assert text.startswith("[fake]")
+    # Uniform over [0, min(cap, base * 2^attempt)]
+    assert bounds == [(0, 0.5), (0, 1.0), (0, 1.5)]
+    assert gateway.stats()["retries"] == 3
+    assert fake_openai.received["requests"] == 4
+
+
+def test_gives_up_after_max_retries(make_gateway):
+    from openai import InternalServerError
+
+    gateway = make_gateway(max_retries=1)
+    fake_openai.faults.extend([{"status": 503}] * 2)
+    with pytest.raises(InternalServerError):
+        run(gateway, gateway.complete(MESSAGES))
+    assert (gateway.stats()["retries"], gateway.stats()["failures"]) == (1, 1)
+
+
+def test_hedge_wins_over_a_slow_primary(make_gateway):
+    gateway = make_gateway(hedge_after=0.1)
+    fake_openai.faults.append({"ttft": 2.0})
+
+    started = time.perf_counter()
+    run(gateway, gateway.complete(MESSAGES))
+    assert time.perf_counter() - started < 1.5
+    stats = gateway.stats()
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+    assert stats["in_flight"] == {"gpt-4o-mini": 0}
+
+
+def test_no_hedge_when_the_model_is_saturated(make_gateway):
+    gateway = make_gateway(hedge_after=0.05, max_concurrency=1)
+    fake_openai.faults.append({"ttft": 0.3})
+
+    run(gateway, gateway.complete(MESSAGES))
+    assert gateway.stats()["hedges"] == 0
+    assert fake_openai.received["requests"] == 1
+
+
+def test_stream_retries_before_the_first_token(make_gateway):
+    gateway = make_gateway()
+    fake_openai.faults.append({"status": 503})
+
+    async def collect():
+        return [delta async for delta in gateway.stream(MESSAGES)]
+
+    assert len(run(gateway, collect())) == 5
+    assert gateway.stats()["retries"] == 1
+    assert fake_openai.received["requests"] == 2
+
+
+def test_stream_never_retries_after_the_first_token(make_gateway):
+    gateway = make_gateway()
+    fake_openai.faults.append({"break_after": 2})
+    received = []
+
+    async def collect():
+        async for delta in gateway.stream(MESSAGES):
+            received.append(delta)
+
+    with pytest.raises(Exception):
+        run(gateway, collect())
+    assert len(received) == 2
+    assert gateway.stats()["retries"] == 0
+    assert fake_openai.received["requests"] == 1
+    assert gateway.stats()["in_flight"] == {"gpt-4o-mini": 0}
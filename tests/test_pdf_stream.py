@@ -0,0 +1,66 @@
+import asyncio
+import os
+import tempfile
+
+import fitz
+
+from services.artifacts import ArtifactStore
+from services.pdf_render import RenderService, render_paged_document
+
+LONG_WORD = "Supercalifragilistic" * 12
+NON_ASCII = "Überweisung à café — naïve façade, Ελληνικά, Жалоба"
+
+
+def document() -> str:
+    clause = "The tenant shall pay the rent on the first day of each month without deduction. "
+    paragraphs = [f"{n}. " + clause * 6 for n in range(1, 60)]
+    paragraphs.insert(10, NON_ASCII)
+    paragraphs.insert(20, LONG_WORD)
+    return "\n\n".join(paragraphs)
+
+
+def test_paged_render_is_readable_and_embeds_a_subset_font(tmp_path):
+    path = str(tmp_path / "doc.pdf")
+    result = render_paged_document(path, "Lease Agreement", document(), "u1", "2024-01-01 10:00:00 UTC")
+
+    with fitz.open(path) as pdf:
+        assert pdf.page_count == result["pages"] > 1
+        text = "".join(page.get_text() for page in pdf)
+        fonts = pdf[0].get_fonts()
+        font_bytes = pdf.extract_font(fonts[0][0])[-1]
+
+    flat = "".join(text.split())
+    assert "Document Title: Lease Agreement" in text
+    assert NON_ASCII in text
+    # The long word is broken across lines but no characters are lost
+    assert LONG_WORD in flat
+    assert "59.Thetenant" in flat
+    assert f"Page {result['pages']}" in text
+
+    assert len(fonts) == 1
+    name, ext = fonts[0][3], fonts[0][1]
+    assert ext == "ttf"
+    assert len(name.split("+")[0]) == 6  # subset tag
+    # DejaVuSans.ttf is ~740 KB; the subset only carries the glyphs used
+    assert 0 < len(font_bytes) < 100_000
+    assert os.path.getsize(path) < 150_000
+
+
+def test_failed_render_commits_nothing():
+    async def scenario(store):
+        service = RenderService(workers=1)
+        try:
+            job = service.submit("k", render_paged_document, "Title", None, None, "now", store=store)
+            try:
+                await job
+            except Exception as e:
+                return e
+        finally:
+            service.shutdown()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ArtifactStore(tmp, max_bytes=1 << 20)
+        error = asyncio.run(scenario(store))
+        assert error is not None
+        assert not store.exists("k")
+        assert os.listdir(tmp) == []
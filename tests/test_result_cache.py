@@ -0,0 +1,106 @@
+import asyncio
+
+from services.result_cache import ResultCache
+
+
+def test_fill_started_before_invalidate_is_not_cached():
+    cache = ResultCache("test")
+    source = {"value": "old"}
+
+    async def slow_read():
+        value = source["value"]
+        await asyncio.sleep(0.05)
+        return value
+
+    async def scenario():
+        reader = asyncio.create_task(cache.get_or_compute("k", slow_read))
+        await asyncio.sleep(0.01)
+        source["value"] = "new"
+        cache.invalidate("k")
+        stale, _ = await reader
+        fresh, status = await cache.get_or_compute("k", slow_read)
+        return stale, fresh, status
+
+    stale, fresh, status = asyncio.run(scenario())
+    assert stale == "old"
+    assert (fresh, status) == ("new", "miss")
+
+
+def test_callers_after_invalidate_do_not_join_the_stale_fill():
+    cache = ResultCache("test")
+    calls = []
+
+    async def read():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return len(calls)
+
+    async def scenario():
+        first = asyncio.create_task(cache.get_or_compute("k", read))
+        await asyncio.sleep(0)
+        cache.invalidate("k")
+        second = await cache.get_or_compute("k", read)
+        await first
+        return second, await cache.get_or_compute("k", read)
+
+    second, third = asyncio.run(scenario())
+    assert second == (2, "miss")
+    assert third == (2, "hit")
+    assert cache._generations == {}
+
+
+def test_concurrent_misses_share_one_fill():
+    cache = ResultCache("test")
+    calls = []
+
+    async def read():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "v"
+
+    async def scenario():
+        return await asyncio.gather(*[cache.get_or_compute("k", read) for _ in range(5)])
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert sorted(status for _, status in results) == ["miss"] + ["shared"] * 4
+
+
+def test_fill_is_cancelled_when_its_only_caller_gives_up():
+    cache = ResultCache("test")
+    state = {"started": 0, "finished": 0}
+
+    async def slow():
+        state["started"] += 1
+        await asyncio.sleep(0.2)
+        state["finished"] += 1
+        return "value"
+
+    async def scenario():
+        caller = asyncio.create_task(cache.get_or_compute("k", slow))
+        await asyncio.sleep(0.02)
+        caller.cancel()
+        await asyncio.sleep(0.3)
+
+    asyncio.run(scenario())
+    assert state == {"started": 1, "finished": 0}
+    assert cache.stats()["abandoned"] == 1
+    assert cache.stats()["inflight"] == 0
+
+
+def test_fill_keeps_running_for_the_remaining_caller():
+    cache = ResultCache("test")
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        return "value"
+
+    async def scenario():
+        first = asyncio.create_task(cache.get_or_compute("k", slow))
+        second = asyncio.create_task(cache.get_or_compute("k", slow))
+        await asyncio.sleep(0.02)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == ("value", "shared")
+    assert cache.stats()["abandoned"] == 0
@@ -0,0 +1,39 @@
+import asyncio
+import os
+import tempfile
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from services.search import ensure_search_index, highlight, search_documents
+
+
+def test_highlight_escapes_content_but_keeps_marks():
+    raw = "<img src=x onerror=alert(1)> the termination clause & more"
+    assert highlight(raw) == "&lt;img src=x onerror=alert(1)&gt; the <mark>termination</mark> clause &amp; more"
+
+
+def test_sqlite_snippets_are_escaped():
+    async def scenario(path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE documents (id INTEGER PRIMARY KEY, title TEXT, content TEXT, "
+                "user_id TEXT, created_at TEXT)"
+            ))
+            await conn.run_sync(ensure_search_index)
+            await conn.execute(text(
+                "INSERT INTO documents (title, content, user_id) VALUES "
+                "('Lease', 'Either party may <script>alert(1)</script> terminate this lease.', 'u1')"
+            ))
+        async with AsyncSession(engine) as db:
+            hits = await search_documents(db, "terminate", "u1", 10, 0)
+        await engine.dispose()
+        return hits
+
+    with tempfile.TemporaryDirectory() as tmp:
+        hits = asyncio.run(scenario(os.path.join(tmp, "search.db")))
+    assert len(hits) == 1
+    assert "<script>" not in hits[0].snippet
+    assert "&lt;script&gt;" in hits[0].snippet
+    assert "<mark>terminate</mark>" in hits[0].snippet
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from database import DATABASE_URL, _create_schema, init_db
+from routes.settings import router, settings_cache
+from tools.migrate_user_settings import migrate_user_settings
+
+app = FastAPI()
+app.include_router(router, prefix="/api/settings")
+asyncio.run(init_db())
+
+
+def settings_rows(user_id=None):
+    engine = create_engine(DATABASE_URL.replace("+aiosqlite", ""))
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT user_id, theme FROM user_settings WHERE user_id IS :u OR :u IS NULL"), {"u": user_id}
+        ).fetchall()
+
+
+def test_post_without_user_id_updates_one_default_row():
+    client = TestClient(app)
+    for theme in ("light", "t2", "t3"):
+        assert client.post("/api/settings/", json={"theme": theme}).status_code == 200
+
+    rows = [r for r in settings_rows() if r[0] in (None, "default_user")]
+    assert rows == [("default_user", "t3")]
+    assert client.get("/api/settings/").json()["theme"] == "t3"
+
+
+def test_post_invalidates_cached_read():
+    client = TestClient(app)
+    client.post("/api/settings/", json={"user_id": "u1", "theme": "dark"})
+    assert client.get("/api/settings/", params={"user_id": "u1"}).json()["theme"] == "dark"
+    client.post("/api/settings/", json={"user_id": "u1", "theme": "light"})
+    assert client.get("/api/settings/", params={"user_id": "u1"}).json()["theme"] == "light"
+    assert len(settings_rows("u1")) == 1
+
+
+def test_null_user_id_is_rejected():
+    client = TestClient(app)
+    assert client.post("/api/settings/", json={"user_id": None, "theme": "x"}).status_code == 422
+
+
+def legacy_table(path):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE user_settings (id INTEGER PRIMARY KEY, user_id VARCHAR(255), "
+            "openai_model VARCHAR(255), theme VARCHAR(50), api_key TEXT, supabase_url TEXT, updated_at DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO user_settings (user_id, theme, api_key, updated_at) VALUES "
+            "('u1', 'edited', 'sk-u1', '2024-05-01 10:00:00'), "
+            "('u1', 'stale', NULL, '2024-01-01 10:00:00'), "
+            "('u2', 'first', NULL, '2024-03-01 10:00:00'), "
+            "('u2', 'tie', NULL, '2024-03-01 10:00:00'), "
+            "(NULL, 'guest', 'sk-guest', '2024-02-01 10:00:00')"
+        ))
+    return engine
+
+
+def test_startup_refuses_legacy_duplicates_without_deleting_them(tmp_path):
+    engine = legacy_table(tmp_path / "legacy.db")
+    with pytest.raises(RuntimeError, match="migrate_user_settings"):
+        with engine.begin() as conn:
+            _create_schema(conn)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM user_settings")).scalar() == 5
+
+
+def test_migration_keeps_the_latest_row_per_user(tmp_path):
+    engine = legacy_table(tmp_path / "legacy.db")
+    with engine.begin() as conn:
+        result = migrate_user_settings(conn)
+    with engine.begin() as conn:
+        _create_schema(conn)
+        rows = conn.execute(text("SELECT user_id, theme, api_key FROM user_settings ORDER BY user_id")).fetchall()
+        indexes = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars().all()
+    assert result == {"moved_to_default": 1, "removed": 2}
+    # Newest updated_at wins even though it has the lower id; equal timestamps fall back to id
+    assert rows == [("default_user", "guest", "sk-guest"), ("u1", "edited", "sk-u1"), ("u2", "tie", None)]
+    assert "ux_user_settings_user_id" in indexes
@@ -0,0 +1,153 @@
+"""Local stand-in for the OpenAI chat completions API, for offline development and benchmarks.
+
+    python -m tools.fake_openai --port 8765 --ttft 0.3 --token-delay 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake uvicorn main:app
+"""
+import os
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import deque
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Fake OpenAI")
+
+# Latency profile, overridable via env or CLI flags
+config = {
+    "ttft": float(os.getenv("FAKE_OPENAI_TTFT", 0.2)),
+    "token_delay": float(os.getenv("FAKE_OPENAI_TOKEN_DELAY", 0.01)),
+    "jitter": float(os.getenv("FAKE_OPENAI_JITTER", 0.0)),
+    "tokens": int(os.getenv("FAKE_OPENAI_TOKENS", 120)),
+    "error_rate": float(os.getenv("FAKE_OPENAI_ERROR_RATE", 0.0)),
+}
+
+# Scripted faults for tests: one dict per incoming request, consumed in arrival order.
+# {"status": 503} fails the request, {"ttft": 1.0} overrides its latency,
+# {"break_after": 2} drops a stream after that many tokens.
+faults: deque = deque()
+received = {"requests": 0}
+
+FILLER = (
+    "This Agreement is entered into by the parties named above and shall be governed "
+    "by the laws of the stated jurisdiction. Each party shall perform its obligations "
+    "in good faith and in accordance with the terms set out in the numbered clauses below."
+).split()
+
+
+def build_reply(messages: list, max_tokens: int | None) -> list:
+    last = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    head = f"[fake] {' '.join(str(last).split()[:12])}".split()
+    count = min(config["tokens"], max_tokens or config["tokens"])
+    words = head + [FILLER[i % len(FILLER)] for i in range(max(0, count - len(head)))]
+    return [w if i == 0 else f" {w}" for i, w in enumerate(words[:count])]
+
+
+def usage_for(messages: list, tokens: list) -> dict:
+    prompt = sum(len(str(m.get("content", ""))) // 4 + 4 for m in messages)
+    return {"prompt_tokens": prompt, "completion_tokens": len(tokens), "total_tokens": prompt + len(tokens)}
+
+
+async def delay(seconds: float):
+    if config["jitter"]:
+        seconds += random.uniform(0, config["jitter"])
+    if seconds > 0:
+        await asyncio.sleep(seconds)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    model = body.get("model", "gpt-4o-mini")
+    tokens = build_reply(messages, body.get("max_tokens"))
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    received["requests"] += 1
+    fault = faults.popleft() if faults else {}
+    ttft = fault.get("ttft", config["ttft"])
+
+    if fault.get("status") or (config["error_rate"] and random.random() < config["error_rate"]):
+        return JSONResponse(
+            status_code=fault.get("status", 503),
+            content={"error": {"message": "fake upstream overloaded", "type": "server_error"}},
+        )
+
+    if not body.get("stream"):
+        await delay(ttft + config["token_delay"] * len(tokens))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "stop",
+            }],
+            "usage": usage_for(messages, tokens),
+        }
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+    def chunk(delta: dict, finish_reason=None, usage=None, choices=True) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if choices else [],
+        }
+        if usage is not None:
+            payload["usage"] = usage
+        return f"data: {json.dumps(payload)}\n\n"
+
+    async def events():
+        await delay(ttft)
+        yield chunk({"role": "assistant", "content": ""})
+        for i, token in enumerate(tokens):
+            if i == fault.get("break_after"):
+                raise ConnectionResetError("fake upstream dropped the stream")
+            yield chunk({"content": token})
+            await delay(config["token_delay"])
+        yield chunk({}, finish_reason="stop")
+        if include_usage:
+            yield chunk({}, usage=usage_for(messages, tokens), choices=False)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/v1/models")
+def models():
+    return {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "fake"}]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=config["ttft"])
+    parser.add_argument("--token-delay", type=float, default=config["token_delay"])
+    parser.add_argument("--jitter", type=float, default=config["jitter"])
+    parser.add_argument("--tokens", type=int, default=config["tokens"])
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"])
+    args = parser.parse_args()
+
+    config.update(
+        ttft=args.ttft,
+        token_delay=args.token_delay,
+        jitter=args.jitter,
+        tokens=args.tokens,
+        error_rate=args.error_rate,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
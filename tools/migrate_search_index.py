@@ -0,0 +1,40 @@
+"""One-off migration: add the stored full-text search column and its GIN index on Postgres.
+
+    SUPABASE_DB_URL=postgresql://... python -m tools.migrate_search_index
+
+Adding the generated column rewrites the documents table under an ACCESS EXCLUSIVE lock, so
+run it in a quiet window; the index is then built CONCURRENTLY. Restart the app afterwards so
+search switches from per-row vectors to the indexed column. SQLite needs nothing (FTS5 is
+created at startup).
+"""
+import asyncio
+import os
+
+from sqlalchemy import text
+
+from database import engine
+from services.search import PG_MIGRATION
+
+# Give up instead of queueing every other query behind the table lock
+LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "5s")
+
+
+async def main():
+    if engine.dialect.name != "postgresql":
+        print("⚠️ Not a Postgres database, nothing to migrate")
+        return
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        # The app's statement_timeout would cancel the table rewrite
+        await conn.execute(text("SET statement_timeout = 0"))
+        await conn.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT}'"))
+        for ddl in PG_MIGRATION:
+            print("⏳", ddl.split(" (")[0])
+            await conn.execute(text(ddl))
+    await engine.dispose()
+    print("✅ Search index ready")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+"""One-off migration: make user_settings hold one row per user so its unique index can be built.
+
+    SUPABASE_DB_URL=postgresql://... python -m tools.migrate_user_settings
+
+Rows saved without a user_id move to the default user that POST/GET now use when none is
+given. Where a user has several rows, the most recently updated one is kept (highest id on a
+tie) and the rest are deleted; each deleted row is printed first. Startup refuses to build
+the index while duplicates remain, so run this once before deploying.
+"""
+import asyncio
+
+from sqlalchemy import text
+
+from database import engine, UserSettings
+from routes.settings import DEFAULT_USER_ID
+
+RANKED = (
+    "SELECT id, user_id, theme, openai_model, updated_at, row_number() OVER ("
+    "PARTITION BY user_id ORDER BY updated_at DESC NULLS LAST, id DESC) AS rn FROM user_settings"
+)
+
+
+def migrate_user_settings(sync_conn) -> dict:
+    moved = sync_conn.execute(
+        text("UPDATE user_settings SET user_id = :default WHERE user_id IS NULL"), {"default": DEFAULT_USER_ID}
+    ).rowcount
+    stale = sync_conn.execute(text(f"SELECT id, user_id, theme, openai_model, updated_at FROM ({RANKED}) ranked WHERE rn > 1")).all()
+    for row in stale:
+        print(f"🗑️ Dropping user_settings row {row.id} for {row.user_id} (updated {row.updated_at})")
+    if stale:
+        sync_conn.execute(text(f"DELETE FROM user_settings WHERE id IN (SELECT id FROM ({RANKED}) ranked WHERE rn > 1)"))
+    for index in UserSettings.__table__.indexes:
+        index.create(sync_conn, checkfirst=True)
+    return {"moved_to_default": moved, "removed": len(stale)}
+
+
+async def main():
+    async with engine.begin() as conn:
+        result = await conn.run_sync(migrate_user_settings)
+    await engine.dispose()
+    print(f"✅ user_settings migrated: {result}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())